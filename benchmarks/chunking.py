@@ -0,0 +1,73 @@
+"""
+Benchmark of the chunking strategies, in MB/s of input text.
+
+Usage: python -m benchmarks.chunking --size-mb 20
+"""
+
+import time
+import random
+import argparse
+
+from rag.chunking import get_chunker
+
+
+def make_markdown(size: int, seed: int = 0) -> str:
+    """Generate a markdown document of about `size` characters with headings, paragraphs and sentences."""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    parts, length = [], 0
+    while length < size:
+        if rng.random() < 0.05:
+            part = f"\n## {' '.join(rng.choices(vocabulary, k=4))}\n\n"
+        else:
+            sentences = [" ".join(rng.choices(vocabulary, k=rng.randint(5, 25))) + "." for _ in range(rng.randint(2, 6))]
+            part = " ".join(sentences) + "\n\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def split_on_spaces(text: str, chunk_size: int, chunk_overlap: int) -> list[str]:
+    """The previous chunking of Vectorizer._split_document, as a baseline."""
+    chunks = []
+    words = text.split(" ")
+    for i in range(0, len(words), chunk_size - chunk_overlap):
+        chunks.append(" ".join(words[i:i + chunk_size]))
+    return chunks
+
+
+def measure(split, text: str, repeat: int) -> tuple[float, int]:
+    """Best throughput in MB/s over `repeat` runs, and the number of chunks."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = split(text)
+        best = min(best, time.perf_counter() - start)
+    return len(text) / best / 1e6, len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_markdown(int(args.size_mb * 1e6))
+
+    throughput, n_chunks = measure(lambda t: split_on_spaces(t, args.chunk_size, args.chunk_overlap), text, args.repeat)
+    print(f"{'baseline (split on spaces)':<28} {throughput:8.1f} MB/s {n_chunks:8d} chunks")
+
+    for strategy in ["word", "sentence", "markdown", "token"]:
+        try:
+            chunker = get_chunker(strategy, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+        except Exception as e:
+            print(f"{strategy:<28} skipped ({e})")
+            continue
+        throughput, n_chunks = measure(chunker.split, text, args.repeat)
+        print(f"{strategy:<28} {throughput:8.1f} MB/s {n_chunks:8d} chunks")
+
+
+if __name__ == "__main__":
+    main()
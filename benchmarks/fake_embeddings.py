@@ -0,0 +1,104 @@
+"""
+Offline stand-in for the embedding endpoint, so ingestion and retrieval can be benchmarked
+without an API key or network access.
+
+The embedding of a text is the signed feature hashing of its words: deterministic across runs
+and processes, and texts sharing words are similar, so retrieval results stay meaningful.
+"""
+
+import time
+import asyncio
+import hashlib
+import numpy as np
+from types import SimpleNamespace
+
+from rag.llm_config import LLMConfig
+
+
+class HashEmbeddings:
+    """Serves `embeddings.create` requests with hash-based embeddings"""
+
+    def __init__(self, dim: int = 384, latency: float = 0.0):
+        """
+        Initialize the HashEmbeddings class.
+
+        Args:
+            dim (int): The dimension of the embeddings.
+            latency (float): The simulated latency of a request in seconds.
+        """
+        self.dim = dim
+        self.latency = latency
+        self.n_requests = 0
+        self.n_texts = 0
+        # the (dimension, sign) of every word seen so far
+        self._buckets: dict[str, tuple[int, float]] = {}
+
+    def _bucket(self, word: str) -> tuple[int, float]:
+        bucket = self._buckets.get(word)
+        if bucket is None:
+            value = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            bucket = self._buckets[word] = (value % self.dim, 1.0 if value >> 63 else -1.0)
+        return bucket
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """The (len(texts), dim) normalized embeddings of texts."""
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                column, sign = self._bucket(word)
+                rows.append(row)
+                columns.append(column)
+                signs.append(sign)
+
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(columns, dtype=np.int64)
+        embeddings = np.bincount(flat, weights=signs, minlength=len(texts) * self.dim)
+        embeddings = embeddings.reshape(len(texts), self.dim).astype(np.float32)
+        # texts without words get a fixed unit vector
+        embeddings[~embeddings.any(axis=1), 0] = 1.0
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+
+    def create(self, input: str | list[str], model: str, **kwargs):
+        """Embed texts, with the response shape of the OpenAI client."""
+        if self.latency:
+            time.sleep(self.latency)
+        return self.response(input, model)
+
+    def response(self, input: str | list[str], model: str):
+        """The response to a request, without the simulated latency."""
+        texts = [input] if isinstance(input, str) else list(input)
+        self.n_requests += 1
+        self.n_texts += len(texts)
+        return SimpleNamespace(
+            data=[SimpleNamespace(index=i, embedding=embedding) for i, embedding in enumerate(self.embed(texts).tolist())],
+            model=model,
+        )
+
+
+class _AsyncHashEmbeddings:
+    """The asynchronous `embeddings.create` of HashEmbeddings"""
+
+    def __init__(self, embeddings: HashEmbeddings):
+        self._embeddings = embeddings
+
+    async def create(self, input: str | list[str], model: str, **kwargs):
+        if self._embeddings.latency:
+            await asyncio.sleep(self._embeddings.latency)
+        return self._embeddings.response(input, model)
+
+
+def install(llm_config: LLMConfig, dim: int = 384, latency: float = 0.0) -> HashEmbeddings:
+    """Serve the embeddings of an LLMConfig (sync and async clients) from a HashEmbeddings.
+
+    Args:
+        llm_config (LLMConfig): The LLM config, e.g. `Vectorizer.llm_client` or the `llm_client` of a Retriever.
+        dim (int): The dimension of the embeddings.
+        latency (float): The simulated latency of a request in seconds.
+
+    Returns:
+        HashEmbeddings: The stand-in, counting the requests and texts it served.
+    """
+    embeddings = HashEmbeddings(dim=dim, latency=latency)
+    llm_config.client = SimpleNamespace(embeddings=embeddings)
+    llm_config.async_client = SimpleNamespace(embeddings=_AsyncHashEmbeddings(embeddings))
+    return embeddings
@@ -0,0 +1,68 @@
+"""
+Benchmark of the embedding quantizations: memory per chunk, recall against exact float32 search
+with and without exact re-ranking, query throughput, and the memory a 10M-chunk corpus would need.
+
+Usage: python -m benchmarks.quantization --n-chunks 100000 --dim 384
+"""
+
+import time
+import shutil
+import argparse
+import tempfile
+
+from rag.vector_index import VectorIndex, QuantizedIndex
+from benchmarks.vector_index import make_embeddings, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--n-queries", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--n-subvectors", type=int, default=48)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[0, 4, 16])
+    args = parser.parse_args()
+
+    embeddings = make_embeddings(args.n_chunks + args.n_queries, args.dim, n_clusters=200)
+    ids = [f"chunk_{i}" for i in range(args.n_chunks)]
+    queries = embeddings[args.n_chunks:]
+    embeddings = embeddings[:args.n_chunks]
+
+    exact_index = VectorIndex(ids, embeddings)
+    exact_ids, _ = exact_index.search(queries, args.top_k)
+    float32_bytes = exact_index.embeddings.nbytes / args.n_chunks
+    print(f"{'float32':<10} {float32_bytes:8.0f} B/chunk {float32_bytes * 1e7 / 2**30:8.1f} GiB/10M chunks")
+
+    index_dir = tempfile.mkdtemp()
+    try:
+        for quantization in ["float16", "int8", "pq"]:
+            kwargs = {"n_subvectors": args.n_subvectors} if quantization == "pq" else {}
+            start = time.perf_counter()
+            index = QuantizedIndex(ids, embeddings, quantization=quantization, rerank_factor=max(args.rerank_factors), **kwargs)
+            build = time.perf_counter() - start
+
+            # reload, so the full-precision embeddings used for re-ranking are memory-mapped
+            index.save(index_dir)
+            index = QuantizedIndex.load(index_dir)
+            code_bytes = index.codes.nbytes / args.n_chunks
+            print(
+                f"{quantization:<10} {code_bytes:8.0f} B/chunk {code_bytes * 1e7 / 2**30:8.1f} GiB/10M chunks "
+                f"(build {build:.1f}s)"
+            )
+
+            for rerank_factor in args.rerank_factors:
+                index.rerank_factor = rerank_factor
+                start = time.perf_counter()
+                found_ids, _ = index.search(queries, args.top_k)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"    rerank x{rerank_factor:<3} recall@{args.top_k}={recall(found_ids, exact_ids):.3f} "
+                    f"{args.n_queries / elapsed:10,.0f} queries/s"
+                )
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
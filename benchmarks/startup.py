@@ -0,0 +1,72 @@
+"""
+Benchmark of the start-up time of the package: the time a fresh interpreter takes to import
+a module or run a snippet, and which heavy dependencies it pulls in.
+
+Usage: python -m benchmarks.startup --repeat 10
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+# the snippets measured, each in a fresh interpreter
+SNIPPETS = {
+    "python": "pass",
+    "import rag": "import rag",
+    "import rag.loader": "import rag.loader",
+    "import rag.querying": "import rag.querying",
+    "Retriever(keyword_based)": "from rag import Retriever; Retriever(method='keyword_based')",
+    "import rag.indexer": "import rag.indexer",
+}
+
+HEAVY_MODULES = ["chromadb", "openai", "pandas", "pypdf", "bm25s"]
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+exec({snippet!r})
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure(snippet: str, repeat: int) -> tuple[list[float], list[float], str]:
+    """Run a snippet in `repeat` fresh interpreters.
+
+    Returns:
+        tuple[list[float], list[float], str]: The wall-clock times of the processes, the times of the
+            snippet itself and the heavy modules it imported.
+    """
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"))
+    code = _PROBE.format(snippet=snippet, heavy=HEAVY_MODULES)
+    process_times, snippet_times, imported = [], [], ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+        ).stdout.split()
+        process_times.append(time.perf_counter() - start)
+        snippet_times.append(float(output[0]))
+        imported = output[1] if len(output) > 1 else ""
+    return process_times, snippet_times, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'snippet':<28} {'process':>10} {'snippet':>10}  heavy modules imported")
+    for name, snippet in SNIPPETS.items():
+        process_times, snippet_times, imported = measure(snippet, args.repeat)
+        print(
+            f"{name:<28} {statistics.median(process_times) * 1e3:8.1f}ms {statistics.median(snippet_times) * 1e3:8.1f}ms"
+            f"  {imported or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
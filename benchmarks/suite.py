@@ -0,0 +1,228 @@
+"""
+End-to-end benchmark suite of ingestion and retrieval, offline: the embeddings are served by a
+deterministic hash-based stand-in (`benchmarks.fake_embeddings`) and the corpus is synthetic.
+
+Scenarios:
+    load        Loader.load_files over the corpus directory            docs/s, MB/s
+    split       Vectorizer._split_document over every document         chunks/s
+    vectorize   Vectorizer.vectorize_docs into a fresh vector store    docs/s, chunks/s
+    <method>    Retriever.retrieve, one query at a time (uncached)     p50/p95/p99 latency, queries/s
+                and Retriever.retrieve_many over all queries           batch queries/s
+
+Every scenario reports the peak RSS of the process when it ends (a high-water mark, so it
+includes the scenarios before it). The results can be saved as JSON and compared with a
+previous run to catch regressions.
+
+Usage: python -m benchmarks.suite --n-docs 200 --doc-kb 50 --output results.json
+       python -m benchmarks.suite --compare results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import statistics
+
+# the embeddings are served offline, the key only satisfies the configuration check
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from rag.loader import Loader
+from rag.indexer import Vectorizer
+from rag.querying import Retriever
+from rag.keyword_index import KeywordIndex
+from rag.embedding_cache import EmbeddingCache
+from rag.llm_config import LLMConfig
+from rag.registry import registry
+from rag.vector_store import get_vector_store
+from benchmarks.chunking import make_markdown
+from benchmarks.fake_embeddings import install
+
+METHODS = ["keyword_based", "semantic_search", "hybrid"]
+
+# metrics where a lower value is better, for the comparison with a previous run
+LOWER_IS_BETTER = ("_ms", "_mb", "seconds")
+
+
+def make_corpus(data_dir: str, n_docs: int, doc_size: int, seed: int = 0) -> int:
+    """Write `n_docs` synthetic markdown and text documents of about `doc_size` characters.
+
+    Returns:
+        int: The total size of the corpus in bytes.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    total = 0
+    for i in range(n_docs):
+        text = make_markdown(doc_size, seed=seed + i)
+        path = os.path.join(data_dir, f"doc_{i:05d}.{'md' if i % 2 else 'txt'}")
+        with open(path, "w") as f:
+            f.write(text)
+        total += len(text)
+    return total
+
+
+def make_queries(n_queries: int, seed: int = 0) -> list[str]:
+    """Generate queries of 2 to 5 words of the vocabulary of the synthetic corpus."""
+    rng = random.Random(seed)
+    return [" ".join(f"word{rng.randrange(5000)}" for _ in range(rng.randint(2, 5))) for _ in range(n_queries)]
+
+
+def peak_rss_mb() -> float:
+    """The peak resident set size of the process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def latency_stats(latencies: list[float]) -> dict[str, float]:
+    """The p50, p95 and p99 of latencies in milliseconds, and the throughput of running them back to back."""
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "p50_ms": percentiles[49] * 1e3,
+        "p95_ms": percentiles[94] * 1e3,
+        "p99_ms": percentiles[98] * 1e3,
+        "queries_per_s": len(latencies) / sum(latencies),
+    }
+
+
+def bench_load(data_dir: str, corpus_bytes: int) -> tuple[dict, dict]:
+    start = time.perf_counter()
+    data = Loader(data_dir=data_dir).load_files()
+    elapsed = time.perf_counter() - start
+    return data, {"seconds": elapsed, "docs_per_s": len(data) / elapsed, "mb_per_s": corpus_bytes / elapsed / 1e6}
+
+
+def bench_split(vectorizer: Vectorizer, data: dict) -> dict:
+    start = time.perf_counter()
+    n_chunks = sum(len(vectorizer._split_document(content)) for content in data.values())
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "chunks": n_chunks, "chunks_per_s": n_chunks / elapsed}
+
+
+def bench_vectorize(vectorizer: Vectorizer, n_docs: int, n_chunks: int) -> dict:
+    start = time.perf_counter()
+    vectorizer.vectorize_docs()
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "docs_per_s": n_docs / elapsed, "chunks_per_s": n_chunks / elapsed}
+
+
+def bench_retrieve(retriever: Retriever, queries: list[str]) -> dict:
+    # a first query loads the indexes, which is not part of the latency
+    retriever.retrieve(queries[0])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        retriever.retrieve(query)
+        latencies.append(time.perf_counter() - start)
+    results = latency_stats(latencies)
+
+    start = time.perf_counter()
+    retriever.retrieve_many(queries)
+    results["batch_queries_per_s"] = len(queries) / (time.perf_counter() - start)
+    return results
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Run every scenario on a fresh corpus and store in a temporary directory."""
+    work_dir = tempfile.mkdtemp(prefix="rag-benchmark-")
+    results = {}
+    try:
+        data_dir = os.path.join(work_dir, "data")
+        corpus_bytes = make_corpus(data_dir, args.n_docs, args.doc_kb * 1000)
+        queries = make_queries(args.n_queries)
+
+        data, results["load"] = bench_load(data_dir, corpus_bytes)
+        results["load"]["peak_rss_mb"] = peak_rss_mb()
+
+        store = get_vector_store(args.backend, path=os.path.join(work_dir, "store"), collection_name="benchmark")
+        keyword_dir = os.path.join(work_dir, "bm25_index")
+        vectorizer = Vectorizer(
+            data,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            keyword_index=KeywordIndex(keyword_dir),
+            embedding_cache=EmbeddingCache(os.path.join(work_dir, "embedding_cache.db")),
+            db_client=store,
+        )
+        install(vectorizer.llm_client, dim=args.dim, latency=args.latency_ms / 1e3)
+
+        results["split"] = bench_split(vectorizer, data)
+        results["split"]["peak_rss_mb"] = peak_rss_mb()
+
+        results["vectorize"] = bench_vectorize(vectorizer, len(data), results["split"]["chunks"])
+        results["vectorize"]["peak_rss_mb"] = peak_rss_mb()
+        del vectorizer, data
+
+        llm_client = LLMConfig(client_name="openai")
+        install(llm_client, dim=args.dim, latency=args.latency_ms / 1e3)
+        for method in METHODS:
+            retriever = Retriever(
+                method=method,
+                top_k=args.top_k,
+                llm_client=llm_client,
+                db_client=store,
+                keyword_index=KeywordIndex(keyword_dir),
+                # every query is scored, the caches would only measure dictionary lookups
+                cache_size=0,
+            )
+            results[method] = bench_retrieve(retriever, queries)
+            results[method]["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        registry.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    """Print the metrics of every scenario, with their change from a baseline run."""
+    for scenario, metrics in results.items():
+        print(scenario)
+        for metric, value in metrics.items():
+            line = f"    {metric:<22} {value:14,.2f}"
+            previous = (baseline or {}).get(scenario, {}).get(metric)
+            if previous:
+                change = (value - previous) / previous
+                worse = change > 0 if metric.endswith(LOWER_IS_BETTER) else change < 0
+                line += f"   {change:+8.1%} vs baseline{' (worse)' if worse and abs(change) > 0.1 else ''}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-docs", type=int, default=200)
+    parser.add_argument("--doc-kb", type=int, default=50, help="The size of every document in kB")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--backend", default="local", help="The vector store backend: local or chroma")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="The simulated latency of an embedding request")
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--compare", help="Compare the results with a JSON file saved by a previous run")
+    args = parser.parse_args()
+
+    # the per-batch progress logs of the package would drown the results
+    logging.disable(logging.INFO)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = run(args)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"Saved the results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
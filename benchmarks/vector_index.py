@@ -0,0 +1,74 @@
+"""
+Benchmark of the in-process vector indexes: query throughput of exact search and
+recall of the IVF index against exact search.
+
+Usage: python -m benchmarks.vector_index --n-chunks 100000 --dim 384
+"""
+
+import time
+import argparse
+import numpy as np
+
+from rag.vector_index import VectorIndex, IVFIndex
+
+
+def make_embeddings(n: int, dim: int, n_clusters: int, seed: int = 0) -> np.ndarray:
+    """Generate clustered embeddings, closer to real embedding distributions than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    assignments = rng.integers(n_clusters, size=n)
+    return centers[assignments] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def recall(approximate: list[list[str]], exact: list[list[str]]) -> float:
+    """Fraction of the exact top-k found by the approximate search."""
+    found = sum(len(set(a) & set(e)) for a, e in zip(approximate, exact))
+    return found / sum(len(e) for e in exact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--n-queries", type=int, default=256)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    embeddings = make_embeddings(args.n_chunks + args.n_queries, args.dim, n_clusters=200)
+    ids = [f"chunk_{i}" for i in range(args.n_chunks)]
+    queries = embeddings[args.n_chunks:]
+    embeddings = embeddings[:args.n_chunks]
+
+    start = time.perf_counter()
+    exact_index = VectorIndex(ids, embeddings)
+    print(f"exact build: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    exact_ids, _ = exact_index.search(queries, args.top_k)
+    elapsed = time.perf_counter() - start
+    print(f"exact search: {args.n_queries / elapsed:,.0f} queries/s (batched)")
+
+    start = time.perf_counter()
+    for query in queries[:32]:
+        exact_index.search(query, args.top_k)
+    elapsed = time.perf_counter() - start
+    print(f"exact search: {32 / elapsed:,.0f} queries/s (one at a time)")
+
+    start = time.perf_counter()
+    ivf_index = IVFIndex(ids, embeddings)
+    print(f"ivf build ({len(ivf_index.lists)} lists): {time.perf_counter() - start:.2f}s")
+
+    for n_probe in args.n_probe:
+        ivf_index.n_probe = n_probe
+        start = time.perf_counter()
+        ivf_ids, _ = ivf_index.search(queries, args.top_k)
+        elapsed = time.perf_counter() - start
+        print(
+            f"ivf n_probe={n_probe}: {args.n_queries / elapsed:,.0f} queries/s, "
+            f"recall@{args.top_k}={recall(ivf_ids, exact_ids):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
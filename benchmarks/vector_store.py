@@ -0,0 +1,73 @@
+"""
+Benchmark of the vector store backends: ingestion throughput, time to open a collection and
+answer a first query, and query latency.
+
+Usage: python -m benchmarks.vector_store --n-chunks 50000 --dim 384
+"""
+
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import numpy as np
+
+from rag.registry import registry
+from rag.vector_store import get_vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-chunks", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--n-queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=["local", "chroma"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(args.n_chunks, args.dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    ids = [f"file{i // 100}.md_chunk_{i % 100}" for i in range(args.n_chunks)]
+    documents = [f"chunk {i}" for i in range(args.n_chunks)]
+    metadatas = [{"file_name": f"file{i // 100}.md", "start": 0, "end": 0} for i in range(args.n_chunks)]
+    queries = rng.normal(size=(args.n_queries, args.dim)).astype(np.float32)
+
+    print(f"{'backend':<10} {'ingest':>12} {'open + query':>14} {'p50 query':>11} {'p95 query':>11}")
+    for backend in args.backends:
+        path = tempfile.mkdtemp()
+        try:
+            store = get_vector_store(backend, path=path, collection_name="benchmark")
+            start = time.perf_counter()
+            for i in range(0, args.n_chunks, args.batch_size):
+                batch = slice(i, i + args.batch_size)
+                store.upsert(ids[batch], documents[batch], embeddings[batch], metadatas[batch])
+            store.bump_version()
+            ingest = args.n_chunks / (time.perf_counter() - start)
+
+            # forget the shared clients, so the collection is opened again like in a new process
+            registry.close()
+
+            start = time.perf_counter()
+            store = get_vector_store(backend, path=path, collection_name="benchmark")
+            store.query(queries[:1], args.top_k)
+            open_time = time.perf_counter() - start
+
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                store.query(query[None, :], args.top_k)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+
+            print(
+                f"{backend:<10} {ingest:8.0f} ch/s {open_time * 1e3:11.1f}ms "
+                f"{statistics.median(latencies) * 1e3:9.2f}ms {latencies[int(0.95 * len(latencies))] * 1e3:9.2f}ms"
+            )
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
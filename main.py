@@ -1,5 +1,8 @@
+import sys
 import logging
 from rag import Loader, Vectorizer
+from rag.manifest import Manifest
+from rag.ingestion import IngestionService
 
 # Configure logging to display INFO messages
 logging.basicConfig(level=logging.INFO, format='%(levelname)s [%(filename)s]: %(message)s')
@@ -10,14 +13,25 @@ if __name__ == "__main__":
     # LOAD DATA
     # ------------------------------------------------------------
     loader = Loader(data_dir="data", exclude_file_types=["csv", "pdf"])
-    data = loader.load_files()
 
-    print(f"Loaded {len(data)} files")
+    # python main.py --watch: keep ingesting the changes of the data directory in the background
+    if "--watch" in sys.argv:
+        vectorizer = Vectorizer(data=[], chunk_size=300, chunk_overlap=100, manifest=Manifest())
+        IngestionService(loader, vectorizer).run_forever()
+        sys.exit(0)
+
+    # only load the files that changed since the last run, one at a time
+    manifest = Manifest()
+    changes = manifest.diff(loader.scan())
+    data = loader.iter_documents(file_names=changes.changed)
+
+    print(f"Loading {len(changes.changed)} files ({len(changes.unchanged)} unchanged, {len(changes.deleted)} deleted)")
 
     # ------------------------------------------------------------
     # VECTORIZE DATA
     # ------------------------------------------------------------
     file_name = "history_of_cricket.md"
     
-    vectorizer = Vectorizer(data=data, chunk_size=300, chunk_overlap=100)
-    vectorizer.vectorize_docs()
\ No newline at end of file
+    vectorizer = Vectorizer(data=data, chunk_size=300, chunk_overlap=100, manifest=manifest)
+    vectorizer.delete_docs(changes.deleted)
+    vectorizer.vectorize_docs()
@@ -1,3 +1,28 @@
-from .indexer import Vectorizer
-from .loader import Loader
-from .llm_config import LLMConfig
\ No newline at end of file
+"""
+The public classes are imported on first access, so importing the package (or one of its
+lightweight modules) does not pay for chromadb, openai, pandas or pypdf.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "Vectorizer": ".indexer",
+    "Loader": ".loader",
+    "LLMConfig": ".llm_config",
+    "Retriever": ".querying",
+    "AnswerGenerator": ".generation",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,104 @@
+"""
+Compact records of the chunks on their way from the chunker to the vector store.
+
+The chunks are kept column-wise (texts, offsets, one embedding matrix per batch), so a batch is
+handed to the store without validating or copying every float of its embeddings.
+"""
+
+import numpy as np
+
+
+class FileChunks:
+    """The chunks of a split file, or of a part of a file too large for a batch, and their character offsets"""
+
+    __slots__ = ("file_name", "tenant", "first", "last", "chunks", "starts", "ends")
+
+    def __init__(self, file_name: str, tenant: str = None, first: int = 0):
+        """
+        Initialize the FileChunks class.
+
+        Args:
+            file_name (str): The name of the file.
+            tenant (str): The tenant the file belongs to, None for a single-tenant store.
+            first (int): The number of the first chunk, the number of chunks of the previous parts of the file.
+        """
+        self.file_name = file_name
+        self.tenant = tenant
+        self.first = first
+        # whether the part ends the file
+        self.last = True
+        self.chunks = []
+        self.starts = []
+        self.ends = []
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def append(self, chunk: str, start: int, end: int) -> None:
+        """Add a chunk with its (start, end) character offsets in the file."""
+        self.chunks.append(chunk)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def next_part(self) -> "FileChunks":
+        """End the part and start the next part of the file, numbered on from this one."""
+        self.last = False
+        return FileChunks(self.file_name, self.tenant, first=self.first + len(self.chunks))
+
+    def ids(self) -> list[str]:
+        """The IDs of the chunks in the database."""
+        return self._ids(self.first, self.first + len(self.chunks))
+
+    def file_ids(self) -> list[str]:
+        """The IDs of the chunks of the file up to the end of this part, including the previous parts."""
+        return self._ids(0, self.first + len(self.chunks))
+
+    def _ids(self, start: int, end: int) -> list[str]:
+        prefix = f"{self.tenant}/{self.file_name}" if self.tenant is not None else self.file_name
+        return [f"{prefix}_chunk_{i}" for i in range(start, end)]
+
+    def metadatas(self) -> list[dict]:
+        """The metadata of every chunk, as stored in the database."""
+        file_name, file_type = self.file_name, self.file_name.split(".")[-1]
+        tenant = {"tenant": self.tenant} if self.tenant is not None else {}
+        return [
+            {"file_name": file_name, "file_type": file_type, "start": start, "end": end, **tenant}
+            for start, end in zip(self.starts, self.ends)
+        ]
+
+
+class ChunkBatch:
+    """The chunks of a batch of files, embedded together into a single matrix"""
+
+    __slots__ = ("files", "n_chunks", "embeddings")
+
+    def __init__(self):
+        self.files = []
+        self.n_chunks = 0
+        self.embeddings = None
+
+    def __len__(self) -> int:
+        return self.n_chunks
+
+    def add(self, file: FileChunks) -> None:
+        """Add the chunks of a file to the batch."""
+        self.files.append(file)
+        self.n_chunks += len(file)
+
+    @property
+    def chunks(self) -> list[str]:
+        """The chunks of all files of the batch, in order."""
+        return [chunk for file in self.files for chunk in file.chunks]
+
+    def __iter__(self):
+        """Iterate over the files of the batch with their embeddings, views of the batch's matrix."""
+        offset = 0
+        for file in self.files:
+            yield file, self.embeddings[offset:offset + len(file)]
+            offset += len(file)
+
+    def set_embeddings(self, embeddings: np.ndarray) -> None:
+        """Attach the (n_chunks, dim) embeddings of the chunks of the batch."""
+        if len(embeddings) != self.n_chunks:
+            raise ValueError(f"Got {len(embeddings)} embeddings for {self.n_chunks} chunks")
+        self.embeddings = embeddings
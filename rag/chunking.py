@@ -0,0 +1,306 @@
+"""
+This module is responsible for splitting documents into chunks.
+It supports the following strategies: word, sentence, token, markdown.
+
+Chunkers work on character offsets over the original text: they compute (start, end)
+spans and the only copies made are the final chunk slices.
+"""
+
+import re
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+# the punctuation ending a sentence is part of the break, pieces are trimmed to whole words
+SENTENCE_BREAK_PATTERN = re.compile(r"[.!?]\s+|\n\s*\n\s*")
+
+# markdown separators, from the coarsest to the finest
+MARKDOWN_SEPARATORS = [
+    re.compile(r"\n(?=#{1,6} )"),
+    re.compile(r"\n\s*\n"),
+    re.compile(r"\n"),
+    SENTENCE_BREAK_PATTERN,
+]
+
+# the code points str.isspace() treats as whitespace, with a lookup table for the first 256
+# (listed rather than computed, a scan of all code points is slow at import)
+_WHITESPACE = np.array([
+    0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x1C, 0x1D, 0x1E, 0x1F, 0x20, 0x85, 0xA0, 0x1680,
+    0x2000, 0x2001, 0x2002, 0x2003, 0x2004, 0x2005, 0x2006, 0x2007, 0x2008, 0x2009, 0x200A,
+    0x2028, 0x2029, 0x202F, 0x205F, 0x3000,
+], dtype=np.uint32)
+_WHITESPACE_TABLE = np.zeros(256, dtype=bool)
+_WHITESPACE_TABLE[_WHITESPACE[_WHITESPACE < 256]] = True
+
+
+def word_offsets(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the character offsets of the whitespace-separated words of a text, vectorized.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The start and end offsets of every word.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    if len(codes) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    space = _WHITESPACE_TABLE[np.minimum(codes, 255)]
+    wide = np.flatnonzero(codes > 255)
+    if len(wide):
+        space[wide] = np.isin(codes[wide], _WHITESPACE)
+
+    # the text alternates between runs of words and runs of whitespace
+    bounds = np.concatenate(([0], np.flatnonzero(space[1:] != space[:-1]) + 1, [len(codes)]))
+    first_word = 1 if space[0] else 0
+    return bounds[:-1][first_word::2], bounds[1:][first_word::2]
+
+
+class Chunker:
+    """Splits a text into overlapping chunks"""
+
+    def __init__(self, chunk_size: int = 500, chunk_overlap: int = 150):
+        """
+        Initialize the Chunker class.
+
+        Args:
+            chunk_size (int): The size of each chunk, in the unit of the strategy (words or tokens).
+            chunk_overlap (int): The overlap between chunks, in the same unit.
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def spans(self, text: str) -> list[tuple[int, int]]:
+        """Compute the (start, end) character offsets of the chunks of a text."""
+        raise NotImplementedError
+
+    def split(self, text: str) -> list[tuple[str, int, int]]:
+        """Split a text into chunks.
+
+        Returns:
+            list[tuple[str, int, int]]: The chunks with their (start, end) character offsets.
+        """
+        return [(text[start:end], start, end) for start, end in self.spans(text)]
+
+    def _windows(self, starts: np.ndarray, ends: np.ndarray, text_end: int = None) -> list[tuple[int, int]]:
+        """Slide a window of chunk_size units over unit offsets, stepping by chunk_size - chunk_overlap.
+
+        The last window is the first one reaching the end, so no chunk is entirely overlap.
+        """
+        n = len(starts)
+        if n == 0:
+            return []
+
+        first = np.arange(0, n, self.chunk_size - self.chunk_overlap)
+        last = np.minimum(first + self.chunk_size, n) - 1
+        n_windows = int(np.argmax(last == n - 1)) + 1
+        span_starts = starts[first[:n_windows]]
+        span_ends = ends[last[:n_windows]]
+        if text_end is not None:
+            span_ends[-1] = text_end
+        return list(zip(span_starts.tolist(), span_ends.tolist()))
+
+
+class WordChunker(Chunker):
+    """Chunks of chunk_size whitespace-separated words"""
+
+    def spans(self, text: str) -> list[tuple[int, int]]:
+        return self._windows(*word_offsets(text))
+
+
+class SentenceChunker(Chunker):
+    """Chunks of whole sentences, up to chunk_size words, overlapping by up to chunk_overlap words"""
+
+    def spans(self, text: str) -> list[tuple[int, int]]:
+        words = word_offsets(text)
+
+        sentences, counts = [], []
+        for start, end, count in _split_spans(text, words, SENTENCE_BREAK_PATTERN, 0, len(text)):
+            if count <= self.chunk_size:
+                sentences.append((start, end))
+                counts.append(count)
+                continue
+            # sentences longer than a chunk are split into word windows
+            for span in _word_windows(self, words, start, end):
+                sentences.append(span)
+                counts.append(_count_words(words, *span))
+
+        spans = []
+        i = 0
+        while i < len(sentences):
+            j, n_words = i, 0
+            while j < len(sentences) and (j == i or n_words + counts[j] <= self.chunk_size):
+                n_words += counts[j]
+                j += 1
+            spans.append((sentences[i][0], sentences[j - 1][1]))
+            if j == len(sentences):
+                break
+
+            # start the next chunk with the trailing sentences that fit in the overlap,
+            # leaving room for at least one new sentence
+            next_i, overlap = j, 0
+            while (
+                next_i - 1 > i
+                and overlap + counts[next_i - 1] <= self.chunk_overlap
+                and overlap + counts[next_i - 1] + counts[j] <= self.chunk_size
+            ):
+                next_i -= 1
+                overlap += counts[next_i]
+            i = next_i
+
+        return spans
+
+
+class TokenChunker(Chunker):
+    """Chunks of chunk_size tokens of the embedding model's tokenizer"""
+
+    def __init__(
+            self,
+            chunk_size: int = 500,
+            chunk_overlap: int = 150,
+            model: str = "text-embedding-3-small",
+            tokenizer=None
+        ):
+        """
+        Initialize the TokenChunker class.
+
+        Args:
+            chunk_size (int): The number of tokens of each chunk.
+            chunk_overlap (int): The number of tokens shared by consecutive chunks.
+            model (str): The model whose tokenizer is used, requires the optional `tiktoken` package.
+            tokenizer: A tokenizer with tiktoken's `encode` and `decode_with_offsets` methods, used instead
+                of the model's tokenizer.
+        """
+        super().__init__(chunk_size, chunk_overlap)
+
+        if tokenizer is None:
+            try:
+                import tiktoken
+            except ImportError as e:
+                raise ImportError("The token chunking strategy requires tiktoken: pip install tiktoken") from e
+            tokenizer = tiktoken.encoding_for_model(model)
+        self.tokenizer = tokenizer
+
+    def spans(self, text: str) -> list[tuple[int, int]]:
+        tokens = self.tokenizer.encode(text)
+        if not tokens:
+            return []
+        _, starts = self.tokenizer.decode_with_offsets(tokens)
+        starts = np.asarray(starts, dtype=np.int64)
+        # a token ends where the next one starts
+        ends = np.append(starts[1:], len(text))
+        return self._windows(starts, ends, text_end=len(text))
+
+
+class MarkdownChunker(Chunker):
+    """Chunks of up to chunk_size words, split recursively at headings, paragraphs, lines and sentences"""
+
+    def spans(self, text: str) -> list[tuple[int, int]]:
+        words = word_offsets(text)
+        pieces = self._split(text, words, 0, len(text), 0)
+
+        # merge adjacent pieces back up to the chunk size
+        spans = []
+        current, n_words = None, 0
+        for start, end, count in pieces:
+            if current is not None and n_words + count <= self.chunk_size:
+                current = (current[0], end)
+                n_words += count
+            else:
+                if current is not None:
+                    spans.append(current)
+                current, n_words = (start, end), count
+        if current is not None:
+            spans.append(current)
+        return spans
+
+    def _split(self, text: str, words: tuple[np.ndarray, np.ndarray], start: int, end: int, level: int) -> list[tuple[int, int, int]]:
+        """Split a span with the separator of the given level until every piece fits in a chunk."""
+        count = _count_words(words, start, end)
+        if count == 0:
+            return []
+        if count <= self.chunk_size:
+            return [(start, end, count)]
+
+        if level == len(MARKDOWN_SEPARATORS):
+            # no separator left, fall back to word windows
+            return [
+                (span_start, span_end, _count_words(words, span_start, span_end))
+                for span_start, span_end in _word_windows(self, words, start, end)
+            ]
+
+        pieces = []
+        for piece_start, piece_end, _ in _split_spans(text, words, MARKDOWN_SEPARATORS[level], start, end):
+            pieces.extend(self._split(text, words, piece_start, piece_end, level + 1))
+        return pieces
+
+
+def _count_words(words: tuple[np.ndarray, np.ndarray], start: int, end: int) -> int:
+    """Count the words starting within [start, end)."""
+    starts, _ = words
+    return int(np.searchsorted(starts, end) - np.searchsorted(starts, start))
+
+
+def _word_windows(chunker: Chunker, words: tuple[np.ndarray, np.ndarray], start: int, end: int) -> list[tuple[int, int]]:
+    """Split the words within [start, end) into windows of the chunker's size."""
+    starts, ends = words
+    first, last = np.searchsorted(starts, start), np.searchsorted(starts, end)
+    return chunker._windows(starts[first:last], ends[first:last])
+
+
+def _split_spans(
+        text: str,
+        words: tuple[np.ndarray, np.ndarray],
+        separator: re.Pattern,
+        start: int,
+        end: int
+    ) -> list[tuple[int, int, int]]:
+    """Split [start, end) at a separator.
+
+    Returns:
+        list[tuple[int, int, int]]: The pieces extended or trimmed to the words starting within them,
+            with their word counts.
+    """
+    starts, ends = words
+    bounds = [start]
+    for match in separator.finditer(text, start, end):
+        bounds.extend((match.start(), match.end()))
+    bounds.append(end)
+
+    bounds = np.asarray(bounds, dtype=np.int64)
+    piece_starts, piece_ends = bounds[::2], bounds[1::2]
+    first, last = np.searchsorted(starts, piece_starts), np.searchsorted(starts, piece_ends)
+    keep = first < last
+    spans = zip(
+        starts[first[keep]].tolist(),
+        ends[last[keep] - 1].tolist(),
+        (last - first)[keep].tolist()
+    )
+    return list(spans)
+
+CHUNKERS = {
+    "word": WordChunker,
+    "sentence": SentenceChunker,
+    "token": TokenChunker,
+    "markdown": MarkdownChunker,
+}
+
+
+def get_chunker(strategy: str = "word", chunk_size: int = 500, chunk_overlap: int = 150, **kwargs) -> Chunker:
+    """Create the chunker of a strategy.
+
+    Args:
+        strategy (str): The chunking strategy. Options: word, sentence, token, markdown
+        chunk_size (int): The size of each chunk.
+        chunk_overlap (int): The overlap between chunks.
+        **kwargs: Extra arguments of the chunker, e.g. `model` or `tokenizer` for the token strategy.
+
+    Returns:
+        Chunker: The chunker.
+    """
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unsupported chunking strategy: {strategy}. Supported strategies are: {list(CHUNKERS.keys())}")
+    return CHUNKERS[strategy](chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
@@ -1,26 +1,73 @@
-import chromadb
 import logging
 
+from .registry import registry
+from .vector_store import VectorStore, DEFAULT_COLLECTION_NAME
+
 logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
 logger = logging.getLogger(__name__)
 
 
-class ChromaDatabase:
+class ChromaDatabase(VectorStore):
     """Stores the vectorized data in a chroma database"""
 
-    def __init__(self):
+    def __init__(self, path: str = "./chroma_db", collection_name: str = DEFAULT_COLLECTION_NAME):
         """
         Initialize the ChromaDatabase class.
 
+        The database is opened on first use through the process-wide client registry, so
+        every ChromaDatabase of a process shares one client per database path.
+
         Args:
-            data (dict[str, any]): The data to store in the database.
+            path (str): The directory of the database.
+            collection_name (str): The name of the collection.
         """
-        self.collection_name = "rag_collection"
+        super().__init__(path, collection_name)
 
+    @property
+    def collection(self):
+        """The chroma collection, opened on first use."""
         try:
-            self._db_client = chromadb.PersistentClient(path="./chroma_db")
-            self.collection = self._db_client.get_or_create_collection(name=self.collection_name)
-            logger.info(f"ChromaDatabase initialized with collection: {self.collection_name}")
+            return registry.chroma_collection(self.path, self.collection_name)
         except Exception as e:
             logger.error(f"Error initializing ChromaDatabase: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def upsert(self, ids: list[str], documents: list[str], embeddings, metadatas: list[dict]) -> None:
+        self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def delete(self, ids: list[str]) -> None:
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = ("documents", "metadatas")) -> dict:
+        results = self.collection.get(ids=ids, where=where or None, include=list(include))
+        return {"ids": results["ids"], **{field: results[field] for field in include}}
+
+    def query(
+            self,
+            query_embeddings,
+            top_k: int,
+            where: dict = None,
+            include: list[str] = ("documents", "metadatas")
+        ) -> dict:
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            where=where or None,
+            include=[*include, "distances"]
+        )
+        scale = self._distance_scale()
+        return {
+            "ids": results["ids"],
+            "scores": [[1.0 - distance * scale for distance in row] for row in results["distances"]],
+            **{field: results[field] for field in include},
+        }
+
+    def _distance_scale(self) -> float:
+        """The factor converting a distance of the collection into a similarity score: 1 - distance * scale."""
+        space = (self.collection.configuration.get("hnsw") or {}).get("space", "l2")
+        # squared l2 distance between normalized embeddings is 2 - 2 * cosine
+        return 0.5 if space == "l2" else 1.0
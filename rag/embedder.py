@@ -0,0 +1,210 @@
+import time
+import random
+import logging
+import numpy as np
+from functools import cache
+from concurrent.futures import ThreadPoolExecutor
+
+from .embedding_cache import EmbeddingCache
+from .llm_config import LLMConfig
+from .metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@cache
+def retryable_errors() -> tuple[type[Exception], ...]:
+    """The errors worth retrying, everything else (bad input, authentication) fails the batch immediately.
+
+    openai is slow to import, so it is only imported when the first request is made.
+    """
+    from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+    return (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text (about 4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+class Embedder:
+    """Embeds texts in batches packed by item and token limits, sent concurrently"""
+
+    def __init__(
+            self,
+            llm_client: LLMConfig = None,
+            embedding_model: str = "text-embedding-3-small",
+            max_batch_items: int = 2048,
+            max_batch_tokens: int = 250_000,
+            max_workers: int = 4,
+            max_retries: int = 6,
+            initial_backoff: float = 1.0,
+            cache: EmbeddingCache = None,
+            client_name: str = "openai",
+        ) -> None:
+        """
+        Initialize the Embedder class.
+
+        Args:
+            llm_client (LLMConfig): The LLM client to use, defaults to the `client_name` client created on first use.
+            embedding_model (str): The embedding model to use.
+            max_batch_items (int): The maximum number of texts per request.
+            max_batch_tokens (int): The maximum (estimated) number of tokens per request.
+            max_workers (int): The maximum number of requests in flight.
+            max_retries (int): The number of retries of a request on rate limits and transient errors.
+            initial_backoff (float): The delay before the first retry in seconds, doubled on every retry.
+            cache (EmbeddingCache): The cache consulted before requesting embeddings, None to disable caching.
+            client_name (str): The name of the default LLM client.
+        """
+        self._llm_client = llm_client
+        self.client_name = client_name
+        self.embedding_model = embedding_model
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.cache = cache
+        # the client of the LLM client, and its copy without the retries of the SDK
+        self._sdk_client = None
+        self._request_client = None
+
+    @property
+    def llm_client(self) -> LLMConfig:
+        """The LLM client embedding the texts, created on first use."""
+        if self._llm_client is None:
+            self._llm_client = LLMConfig(client_name=self.client_name)
+        return self._llm_client
+
+    @llm_client.setter
+    def llm_client(self, llm_client: LLMConfig) -> None:
+        self._llm_client = llm_client
+
+    @property
+    def client(self):
+        """The client the requests are sent with.
+
+        The requests are retried by the Embedder, with backoff, so the retries of the OpenAI SDK are
+        disabled: they would multiply the attempts of a request. The copy shares the connection pool.
+        """
+        client = self.llm_client.client
+        if client is not self._sdk_client:
+            with_options = getattr(client, "with_options", None)
+            self._request_client = with_options(max_retries=0) if with_options is not None else client
+            self._sdk_client = client
+        return self._request_client
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed the texts, preserving their order.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            list[list[float]]: The embeddings, one per text.
+        """
+        if self.cache is None:
+            return self._embed(texts)
+
+        embeddings = self.cache.get_many(self.embedding_model, texts)
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} texts cached")
+        if not missing:
+            return embeddings
+
+        computed = dict(zip(missing, self._embed(missing)))
+        self.cache.put_many(self.embedding_model, missing, [computed[text] for text in missing])
+        return [embedding if embedding is not None else computed[text] for text, embedding in zip(texts, embeddings)]
+
+    def embed_array(self, texts: list[str]) -> np.ndarray:
+        """Embed the texts into a single float32 array, preserving their order.
+
+        Unlike `embed`, cached embeddings are copied straight from the cache into the array and are
+        never converted to lists of floats.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            np.ndarray: The (len(texts), dim) embeddings.
+        """
+        if self.cache is None:
+            found, cached = np.zeros(len(texts), dtype=bool), np.empty((0, 0), dtype=np.float32)
+        else:
+            found, cached = self.cache.get_array(self.embedding_model, texts)
+        missing_texts = [text for text, hit in zip(texts, found) if not hit]
+        missing = list(dict.fromkeys(missing_texts))
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} texts cached")
+
+        computed = np.asarray(self._embed(missing), dtype=np.float32) if missing else None
+        if computed is not None and self.cache is not None:
+            self.cache.put_many(self.embedding_model, missing, computed)
+
+        dim = computed.shape[1] if computed is not None else cached.shape[1]
+        embeddings = np.empty((len(texts), dim), dtype=np.float32)
+        if len(cached):
+            embeddings[found] = cached
+        if computed is not None:
+            position = {text: i for i, text in enumerate(missing)}
+            embeddings[~found] = computed[[position[text] for text in missing_texts]]
+        return embeddings
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        """Request the embeddings of the texts from the API, preserving their order."""
+        batches = self._pack(texts)
+        if not batches:
+            return []
+        logger.info(f"Embedding {len(texts)} texts in {len(batches)} requests")
+
+        if len(batches) == 1 or self.max_workers <= 1:
+            results = [self._embed_batch(texts[start:end]) for start, end in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                # map yields the results in submission order
+                results = list(executor.map(lambda bounds: self._embed_batch(texts[bounds[0]:bounds[1]]), batches))
+
+        return [embedding for batch in results for embedding in batch]
+
+    def _pack(self, texts: list[str]) -> list[tuple[int, int]]:
+        """Split the texts into contiguous batches within the item and token limits.
+
+        Returns:
+            list[tuple[int, int]]: The (start, end) bounds of every batch.
+        """
+        batches = []
+        start, batch_tokens = 0, 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if i > start and (i - start >= self.max_batch_items or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append((start, i))
+                start, batch_tokens = i, 0
+            batch_tokens += tokens
+
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        """Embed a single batch, retrying with exponential backoff on rate limits and transient errors."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.span("embedder.request"):
+                    response = self.client.embeddings.create(
+                        input=batch,
+                        model=self.embedding_model
+                    )
+                usage = getattr(response, "usage", None)
+                metrics.increment("embedder.requests")
+                metrics.increment("embedder.texts", len(batch))
+                metrics.increment("embedder.tokens", usage.total_tokens if usage is not None else sum(map(estimate_tokens, batch)))
+                # the response items carry the position of their input
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except retryable_errors() as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Giving up embedding batch of {len(batch)} texts after {attempt + 1} attempts: {e}")
+                    raise
+                metrics.increment("embedder.retries")
+                delay = self.initial_backoff * 2 ** attempt * (1 + random.random())
+                logger.warning(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
@@ -0,0 +1,182 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+
+from .metrics import metrics
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "./embedding_cache.db"
+
+# sqlite limits the number of parameters of a single statement
+_MAX_PARAMS = 500
+
+
+def text_hash(text: str) -> bytes:
+    """Content address of a text."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Persistent, size-bounded LRU cache of embeddings keyed by (embedding model, text hash)"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 1_000_000):
+        """
+        Initialize the EmbeddingCache class.
+
+        Args:
+            path (str): The path of the SQLite database, ":memory:" for an in-process cache.
+            max_entries (int): The maximum number of cached embeddings, the least recently used are evicted.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        try:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash BLOB NOT NULL,
+                    embedding BLOB NOT NULL,
+                    last_used INTEGER NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                ) WITHOUT ROWID"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error opening embedding cache at {path}: {e}")
+            raise e
+
+    def __len__(self) -> int:
+        return self._entries
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """The hit/miss statistics of the cache since it was opened."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._entries,
+        }
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Look up the embeddings of texts.
+
+        Args:
+            model (str): The embedding model.
+            texts (list[str]): The texts.
+
+        Returns:
+            list[list[float] | None]: The cached embedding of every text, None on a miss.
+        """
+        return [np.frombuffer(blob, dtype=np.float32).tolist() if blob is not None else None for blob in self._lookup(model, texts)]
+
+    def get_array(self, model: str, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Look up the embeddings of texts as a single array, without converting them to lists.
+
+        Args:
+            model (str): The embedding model.
+            texts (list[str]): The texts.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The mask of the cached texts and the (n_cached, dim) float32
+                embeddings of the cached texts, in order.
+        """
+        blobs = self._lookup(model, texts)
+        found = np.fromiter((blob is not None for blob in blobs), dtype=bool, count=len(blobs))
+        hits = [blob for blob in blobs if blob is not None]
+        if not hits:
+            return found, np.empty((0, 0), dtype=np.float32)
+        return found, np.frombuffer(b"".join(hits), dtype=np.float32).reshape(len(hits), -1)
+
+    def _lookup(self, model: str, texts: list[str]) -> list[bytes | None]:
+        """The stored embedding of every text, None on a miss."""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with metrics.span("embedding_cache.lookup"), self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique), _MAX_PARAMS):
+                batch = unique[i:i + _MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, embedding FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time_ns()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found]
+                )
+                self._conn.commit()
+
+            results = [found.get(key) for key in hashes]
+            hits = len(results) - results.count(None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        metrics.increment("embedding_cache.hits", hits)
+        metrics.increment("embedding_cache.misses", len(results) - hits)
+        return results
+
+    def put_many(self, model: str, texts: list[str], embeddings: list[list[float]] | np.ndarray) -> None:
+        """Store the embeddings of texts, evicting the least recently used entries over the size limit.
+
+        Args:
+            model (str): The embedding model.
+            texts (list[str]): The texts.
+            embeddings (list[list[float]] | np.ndarray): The embeddings, one per text.
+        """
+        now = time.time_ns()
+        rows = {
+            text_hash(text): np.asarray(embedding, dtype=np.float32).tobytes()
+            for text, embedding in zip(texts, embeddings)
+        }
+        with self._lock:
+            keys = list(rows)
+            existing = 0
+            for i in range(0, len(keys), _MAX_PARAMS):
+                batch = keys[i:i + _MAX_PARAMS]
+                existing += self._conn.execute(
+                    f"SELECT COUNT(*) FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchone()[0]
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, embedding, last_used) VALUES (?, ?, ?, ?)",
+                [(model, key, blob, now) for key, blob in rows.items()]
+            )
+            self._entries += len(keys) - existing
+
+            if self._entries > self.max_entries:
+                evicted = self._entries - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE (model, text_hash) IN "
+                    "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (evicted,)
+                )
+                self._entries -= evicted
+                logger.info(f"Evicted {evicted} embeddings from the cache")
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove every cached embedding."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._entries = 0
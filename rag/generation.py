@@ -0,0 +1,286 @@
+"""
+This module answers questions with the chat model, grounded in the retrieved chunks.
+
+The retrieved chunks are packed into a token budget: chunks repeating text already packed
+(the `chunk_overlap` of the Vectorizer) only cost their new text, and neighbouring chunks of a
+file are merged back into a single passage. The answer is streamed as the model generates it.
+"""
+
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+from .embedder import estimate_tokens
+from .llm_config import LLMConfig
+from .metrics import metrics
+from .querying import Retriever
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+ANSWER_PROMPT = """Answer the question using only the numbered passages below.
+Cite the passages you use as [1], [2], ... If the passages do not contain the answer, say so.
+
+{context}"""
+
+
+def _uncovered(start: int, end: int, spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """The parts of [start, end) not covered by the spans, sorted by start."""
+    parts = []
+    for span_start, span_end in sorted(spans):
+        if span_end <= start or span_start >= end:
+            continue
+        if span_start > start:
+            parts.append((start, span_start))
+        start = max(start, span_end)
+        if start >= end:
+            return parts
+    parts.append((start, end))
+    return parts
+
+
+def pack_context(
+        docs: list[dict],
+        max_tokens: int,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        merge_gap: int = 2
+    ) -> list[dict]:
+    """Pack retrieved chunks into a token budget, as passages without duplicated text.
+
+    Chunks are taken in their retrieval order while they fit. A chunk only costs the text not
+    already covered by the packed chunks of its file, and a chunk with no new text is dropped.
+    The packed chunks of a file that overlap, or are at most `merge_gap` characters apart, are
+    merged into one passage. The files of different tenants (see `Vectorizer(tenant=...)`) are
+    packed apart, even under the same name. Chunks without (start, end) offsets are only
+    deduplicated by text.
+
+    Args:
+        docs (list[dict]): The retrieved documents, with their `document` and `metadata`.
+        max_tokens (int): The token budget of the passages.
+        count_tokens (Callable[[str], int]): Counts the tokens of a text, estimated by default.
+        merge_gap (int): The largest number of characters between two chunks merged together,
+            the whitespace the chunkers leave between consecutive chunks.
+
+    Returns:
+        list[dict]: The passages, with their `file_name`, `tenant` (None without tenants), `start`, `end`,
+            `text`, the `ids` of the chunks they contain and the `rank` of their best chunk, in the order
+            of their best chunk.
+    """
+    # (tenant, file name) -> the (start, end, text, rank, id) of its packed chunks
+    packed: dict[tuple, list[tuple[int, int, str, int, str]]] = {}
+    seen_texts = set()
+    used = 0
+    for rank, doc in enumerate(docs, start=1):
+        text = doc["document"] or ""
+        metadata = doc.get("metadata") or {}
+        # tenants can share file names, the offsets of their files are unrelated
+        source = (metadata.get("tenant"), metadata.get("file_name"))
+        start, end = metadata.get("start"), metadata.get("end")
+
+        if start is None or end is None or end - start != len(text):
+            if text in seen_texts:
+                continue
+            new_text, source, start, end = text, (*source, rank), 0, len(text)
+        else:
+            chunks = packed.get(source, [])
+            new_text = " ".join(text[s - start:e - start] for s, e in _uncovered(start, end, [c[:2] for c in chunks]))
+            if not new_text:
+                continue
+
+        cost = count_tokens(new_text)
+        if used + cost > max_tokens:
+            continue
+        used += cost
+        seen_texts.add(text)
+        packed.setdefault(source, []).append((start, end, text, rank, doc.get("id")))
+
+    passages = []
+    for source, chunks in packed.items():
+        chunks.sort()
+        passage = None
+        for start, end, text, rank, chunk_id in chunks:
+            if passage is not None and start <= passage["end"] + merge_gap:
+                if end > passage["end"]:
+                    # the gap is whitespace, the overlap is already in the passage
+                    separator = " " if start > passage["end"] else ""
+                    passage["text"] += separator + text[max(passage["end"] - start, 0):]
+                    passage["end"] = end
+                passage["ids"].append(chunk_id)
+                passage["rank"] = min(passage["rank"], rank)
+                continue
+            passage = {
+                "file_name": source[1],
+                "tenant": source[0],
+                "start": start,
+                "end": end,
+                "text": text,
+                "ids": [chunk_id],
+                "rank": rank,
+            }
+            passages.append(passage)
+
+    passages.sort(key=lambda passage: passage["rank"])
+    return passages
+
+
+class AnswerGenerator:
+    """Answers questions with the chat model, from the chunks of a Retriever"""
+
+    def __init__(
+            self,
+            retriever: Retriever = None,
+            llm_client: LLMConfig = None,
+            model: str = None,
+            max_context_tokens: int = 3000,
+            max_answer_tokens: int = None,
+            temperature: float = 0,
+            prompt: str = ANSWER_PROMPT,
+            count_tokens: Callable[[str], int] = estimate_tokens
+        ):
+        """
+        Initialize the AnswerGenerator class.
+
+        Args:
+            retriever (Retriever): The retriever of the chunks, hybrid retrieval from the chroma database by default.
+            llm_client (LLMConfig): The LLM client of the chat model, defaults to the client of the retriever.
+            model (str): The chat model, defaults to the model of the client's configuration.
+            max_context_tokens (int): The token budget of the retrieved passages in the prompt.
+            max_answer_tokens (int): The maximum number of tokens of an answer, None for the model's limit.
+            temperature (float): The sampling temperature of the chat model.
+            prompt (str): The system prompt, with a `{context}` placeholder for the passages.
+            count_tokens (Callable[[str], int]): Counts the tokens of a text, estimated by default; e.g. the
+                length of tiktoken's encoding for an exact budget.
+        """
+        self.retriever = retriever if retriever is not None else Retriever(method="hybrid", llm_client=llm_client)
+        self._llm_client = llm_client
+        self._model = model
+        self.max_context_tokens = max_context_tokens
+        self.max_answer_tokens = max_answer_tokens
+        self.temperature = temperature
+        self.prompt = prompt
+        self.count_tokens = count_tokens
+
+    @property
+    def llm_client(self) -> LLMConfig:
+        return self._llm_client if self._llm_client is not None else self.retriever.llm_client
+
+    @property
+    def model(self) -> str:
+        return self._model or self.llm_client.config["model"]
+
+    def build_messages(self, question: str, docs: list[dict]) -> tuple[list[dict], list[dict]]:
+        """Pack the retrieved documents and build the chat messages of a question.
+
+        Returns:
+            tuple[list[dict], list[dict]]: The messages, and the passages they cite by number.
+        """
+        with metrics.span("generator.pack"):
+            passages = pack_context(docs, self.max_context_tokens, self.count_tokens)
+        context = "\n\n".join(
+            f"[{i}] ({passage['file_name']})\n{passage['text']}" for i, passage in enumerate(passages, start=1)
+        )
+        messages = [
+            {"role": "system", "content": self.prompt.format(context=context)},
+            {"role": "user", "content": question},
+        ]
+        return messages, passages
+
+    def _request(self, messages: list[dict]) -> dict:
+        request = {"model": self.model, "messages": messages, "temperature": self.temperature, "stream": True}
+        if self.max_answer_tokens is not None:
+            request["max_tokens"] = self.max_answer_tokens
+        return request
+
+    @staticmethod
+    def _delta(chunk) -> str:
+        """The text of a streamed chunk, empty for chunks carrying no text (role, usage, finish reason)."""
+        return (chunk.choices[0].delta.content or "") if chunk.choices else ""
+
+    def generate(self, question: str, docs: list[dict]) -> Iterator[str]:
+        """Stream the answer to a question from documents retrieved already.
+
+        Args:
+            question (str): The question.
+            docs (list[dict]): The retrieved documents, e.g. the results of `Retriever.retrieve`.
+
+        Yields:
+            str: The pieces of the answer as the model generates them.
+        """
+        messages, _ = self.build_messages(question, docs)
+        start = time.perf_counter()
+        first = True
+        with metrics.span("generator.generate", model=self.model):
+            for chunk in self.llm_client.client.chat.completions.create(**self._request(messages)):
+                text = self._delta(chunk)
+                if not text:
+                    continue
+                if first:
+                    metrics.observe("generator.first_token", time.perf_counter() - start)
+                    first = False
+                yield text
+        metrics.increment("generator.answers")
+
+    def stream(self, question: str, where: dict = None) -> Iterator[str]:
+        """Retrieve the chunks of a question and stream the answer.
+
+        Args:
+            question (str): The question.
+            where (dict): A metadata filter the retrieved chunks must match, see `Retriever.retrieve`.
+
+        Yields:
+            str: The pieces of the answer as the model generates them.
+        """
+        with metrics.span("generator.retrieve"):
+            docs = self.retriever.retrieve(question, where=where)
+        yield from self.generate(question, docs)
+
+    def answer(self, question: str, where: dict = None) -> str:
+        """Answer a question, without streaming."""
+        return "".join(self.stream(question, where=where))
+
+    def stream_many(self, questions: list[str], where: dict = None) -> Iterator[Iterator[str]]:
+        """Stream the answers to several questions, one after the other.
+
+        The chunks of the next question are retrieved in a worker thread while the answer to the
+        current one streams, so its generation can start as soon as the current one ends.
+
+        Yields:
+            Iterator[str]: The answer stream of every question, in the order of the questions.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = executor.submit(self.retriever.retrieve, questions[0], where) if questions else None
+            for i, question in enumerate(questions):
+                docs = pending.result()
+                if i + 1 < len(questions):
+                    pending = executor.submit(self.retriever.retrieve, questions[i + 1], where)
+                yield self.generate(question, docs)
+
+    async def astream(self, question: str, where: dict = None) -> AsyncIterator[str]:
+        """Retrieve the chunks of a question and stream the answer without blocking the event loop.
+
+        A server streaming several answers from one event loop retrieves the chunks of new questions
+        while the answers of the others are generated.
+        """
+        with metrics.span("generator.retrieve"):
+            docs = await self.retriever.aretrieve(question, where=where)
+        messages, _ = await asyncio.to_thread(self.build_messages, question, docs)
+
+        start = time.perf_counter()
+        first = True
+        with metrics.span("generator.generate", model=self.model):
+            response = await self.llm_client.async_client.chat.completions.create(**self._request(messages))
+            async for chunk in response:
+                text = self._delta(chunk)
+                if not text:
+                    continue
+                if first:
+                    metrics.observe("generator.first_token", time.perf_counter() - start)
+                    first = False
+                yield text
+        metrics.increment("generator.answers")
+
+    async def aanswer(self, question: str, where: dict = None) -> str:
+        """Answer a question without streaming or blocking the event loop."""
+        return "".join([text async for text in self.astream(question, where=where)])
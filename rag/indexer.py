@@ -1,8 +1,19 @@
 import logging
+import numpy as np
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable
 from .llm_config import LLMConfig
 
+from .chunking import get_chunker
 from .database import ChromaDatabase
-from .schemas import DocumentSchema
+from .vector_store import VectorStore
+from .embedder import Embedder
+from .embedding_cache import EmbeddingCache
+from .keyword_index import KeywordIndex
+from .manifest import Manifest
+from .chunk_batch import ChunkBatch, FileChunks
+from .metrics import metrics
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s [%(filename)s]: %(message)s')
 logger = logging.getLogger(__name__)
@@ -13,102 +24,238 @@ class Vectorizer:
 
     def __init__(
             self,
-            data: dict[str, any],
+            data: dict[str, any] | Iterable[tuple[str, any]],
             chunk_size: int = 500,
             chunk_overlap: int = 150,
             client_name: str = "openai",
             embedding_model: str = "text-embedding-3-small",
+            llm_client: LLMConfig = None,
+            keyword_index: KeywordIndex = None,
+            max_workers: int = 4,
+            max_batch_tokens: int = 250_000,
+            embedding_cache: EmbeddingCache = None,
+            manifest: Manifest = None,
+            batch_size: int = 2048,
+            chunking_strategy: str = "word",
+            db_client: VectorStore = None,
+            tenant: str = None,
         ) -> None:
         """
         Initialize the Vectorizer class.
 
         Args:
-            data (dict[str, any]): The data to vectorize.
-            chunk_size (int): The size of each chunk.
-            chunk_overlap (int): The overlap between chunks.
+            data (dict[str, any] | Iterable[tuple[str, any]]): The data to vectorize, either a dict of file
+                names and contents or a stream of (file name, content) pairs such as `Loader.iter_documents`.
+                The pieces of a file in a stream must be consecutive.
+            chunk_size (int): The size of each chunk, in words (or tokens for the token chunking strategy).
+            chunk_overlap (int): The overlap between chunks, in the same unit.
             client_name (str): The name of the client to use.
             embedding_model (str): The embedding model to use.
+            llm_client (LLMConfig): The LLM client embedding the chunks, defaults to the `client_name` client
+                created on first use.
+            keyword_index (KeywordIndex): The BM25 index to keep in sync with the database, defaults to the
+                index of the collection in the directory of the store.
+            max_workers (int): The maximum number of embedding requests in flight.
+            max_batch_tokens (int): The maximum (estimated) number of tokens per embedding request.
+            embedding_cache (EmbeddingCache): The cache of embeddings of unchanged chunks, defaults to the cache
+                in the directory of the store.
+            manifest (Manifest): The manifest the vectorized files are recorded in, for incremental re-ingestion.
+            batch_size (int): The number of chunks embedded and stored together, bounding the memory used
+                when vectorizing a stream.
+            chunking_strategy (str): The chunking strategy. Options: word, sentence, token, markdown
+            db_client (VectorStore): The vector store the chunks are written to, defaults to the chroma database.
+            tenant (str): The tenant the documents belong to. It is stored in the `tenant` metadata of the chunks and
+                prefixes their IDs, so several tenants can share a store (e.g. a `ShardedVectorStore` sharded by
+                tenant) and file names. None for a single-tenant store.
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.data = data
         self.embedding_model = embedding_model
-        self.llm_client = LLMConfig(client_name=client_name)
-        self.db_client = ChromaDatabase()
+        self.db_client = db_client if db_client is not None else ChromaDatabase()
+        self.manifest = manifest
+        self.batch_size = batch_size
+        self.tenant = tenant
+        # the files a part of which could not be stored, their remaining parts are skipped
+        self._failed_files: set[str] = set()
+        self.chunker = get_chunker(
+            chunking_strategy, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            **({"model": embedding_model} if chunking_strategy == "token" else {})
+        )
+        self.keyword_index = keyword_index if keyword_index is not None else KeywordIndex(self.db_client.keyword_index_dir)
+        self.embedder = Embedder(
+            llm_client,
+            embedding_model=embedding_model,
+            max_batch_tokens=max_batch_tokens,
+            max_workers=max_workers,
+            cache=embedding_cache if embedding_cache is not None else EmbeddingCache(self.db_client.embedding_cache_path),
+            client_name=client_name
+        )
+
+    @property
+    def llm_client(self) -> LLMConfig:
+        """The LLM client embedding the chunks, created on first use."""
+        return self.embedder.llm_client
 
 
     def vectorize_docs(self):
         """
         Vectorize the documents, by splitting them, generating embeddings and storing them in the database.
         """
-        for file_name, file_content in self.data.items(): 
-            logger.info(f"Vectorizing file: {file_name}")
-
-            chunks = self._split_document(file_content)
-            logger.info(f"Number of chunks: {len(chunks)}")
-        
-            embeddings = self._get_embeddings(chunks)
-            logger.info(f"Number of embeddings: {len(embeddings)}")
-            
-            # create the document schema to store in the database
-            document_schema = DocumentSchema(
-                file_name = file_name,
-                metadata = {"file_name": file_name, "file_type": file_name.split(".")[-1]},
-                chunks = chunks,
-                embeddings = embeddings
-            )
-
-            # store the document schema in the database
-            document_dict = document_schema.model_dump()
+        with metrics.request("vectorizer.vectorize_docs"):
+            documents = self.data.items() if isinstance(self.data, dict) else self.data
+
+            # an index that is new or was built with another tokenizer is rebuilt before it is updated
+            self.keyword_index.build_from(self.db_client)
+
+            batch = ChunkBatch()
+            self._failed_files.clear()
+            for file_name, pieces in groupby(documents, key=itemgetter(0)):
+                logger.info(f"Vectorizing file: {file_name}")
+
+                # offsets are relative to the whole file, across its pieces
+                file, base, complete = FileChunks(file_name, self.tenant), 0, True
+                pieces = iter(pieces)
+                while True:
+                    # the pieces of a stream are loaded lazily, so the split includes their loading
+                    with metrics.span("vectorizer.split"):
+                        piece = next(pieces, None)
+                        # a None piece ends a file the loader could not read to the end
+                        complete = piece is None or piece[1] is not None
+                        chunks = self.chunker.split(piece[1]) if piece is not None and complete else []
+                        chunks = [(chunk, base + start, base + end) for chunk, start, end in chunks]
+                    if piece is None or not complete:
+                        break
+                    base += len(piece[1])
+
+                    for chunk, start, end in chunks:
+                        file.append(chunk, start, end)
+                        # a file larger than the batch is stored in parts, its chunks numbered across them
+                        if len(batch) + len(file) >= self.batch_size:
+                            batch.add(file)
+                            file = file.next_part()
+                            self._vectorize_batch(batch)
+                            batch = ChunkBatch()
+
+                if not complete:
+                    # the parts already stored are kept, but the chunks of the rest of the file are not
+                    # deleted as orphans and the file stays pending in the manifest, to be ingested again
+                    logger.error(f"File {file_name} was not loaded completely, skipping the rest of it")
+                    self._failed_files.discard(file_name)
+                    continue
+
+                n_chunks = file.first + len(file)
+                logger.info(f"Number of chunks: {n_chunks}")
+                metrics.increment("vectorizer.files")
+                metrics.increment("vectorizer.chunks", n_chunks)
+
+                batch.add(file)
+                if len(batch) >= self.batch_size:
+                    self._vectorize_batch(batch)
+                    batch = ChunkBatch()
+
+            if batch.files:
+                self._vectorize_batch(batch)
+
+            with metrics.span("vectorizer.save"):
+                self.keyword_index.save()
+                self.db_client.bump_version()
+                if self.manifest is not None:
+                    self.manifest.save()
+
+    def _vectorize_batch(self, batch: ChunkBatch):
+        """
+        Generate the embeddings of a batch of split files and store them in the database.
+
+        Args:
+            batch (ChunkBatch): The chunks of the files.
+        """
+        # embed the chunks of all files together, so requests are packed across files
+        with metrics.span("vectorizer.embed"):
+            batch.set_embeddings(self._get_embeddings(batch.chunks))
+        metrics.increment("vectorizer.batches")
+        logger.info(f"Number of embeddings: {len(batch.embeddings)}, cache stats: {self.embedder.cache.stats}")
+
+        for file, embeddings in batch:
             try:
-                # Create unique IDs for each chunk
-                chunk_ids = [f"{file_name}_chunk_{i}" for i in range(len(chunks))]
-                
+                if file.first > 0 and file.file_name in self._failed_files:
+                    # a previous part of the file could not be stored
+                    if file.last:
+                        self._failed_files.discard(file.file_name)
+                    continue
+
+                chunk_ids = file.ids()
                 logger.info(f"Storing {len(chunk_ids)} chunks in database")
-                
-                self.db_client.collection.add(
-                    documents = document_dict["chunks"],
-                    embeddings = document_dict["embeddings"],
-                    ids = chunk_ids,
-                    metadatas = [document_dict["metadata"]] * len(chunks)
-                )
+
+                # an emptied file has nothing to store, only its previous chunks to delete
+                if len(file) > 0:
+                    with metrics.span("vectorizer.store"):
+                        self.db_client.upsert(
+                            ids = chunk_ids,
+                            documents = file.chunks,
+                            embeddings = embeddings,
+                            metadatas = file.metadatas()
+                        )
+                    self.keyword_index.upsert(chunk_ids, file.chunks)
+
+                if not file.last:
+                    continue
+
+                # drop the chunks left over from a longer previous version of the file
+                file_ids = file.file_ids()
+                with metrics.span("vectorizer.delete_orphans"):
+                    existing_ids = self.db_client.get(where=self._file_where(file.file_name), include=[])["ids"]
+                    orphan_ids = sorted(set(existing_ids) - set(file_ids))
+                    if orphan_ids:
+                        logger.info(f"Deleting {len(orphan_ids)} orphaned chunks")
+                        self.db_client.delete(orphan_ids)
+                        self.keyword_index.delete(orphan_ids)
+
+                if self.manifest is not None:
+                    self.manifest.commit(file.file_name, len(file_ids))
                 logger.info("Successfully stored document in database")
             except Exception as e:
                 logger.error(f"Error storing document in database: {e}")
+                if not file.last:
+                    self._failed_files.add(file.file_name)
                 continue
 
+    def delete_docs(self, file_names: list[str]):
+        """
+        Delete the chunks of files from the database, e.g. the deleted files of a `Manifest.diff`.
 
-    def _split_document(self, file_content: str) -> dict[str, list[str]]:
+        Args:
+            file_names (list[str]): The names of the files to delete.
+        """
+        for file_name in file_names:
+            chunk_ids = self.db_client.get(where=self._file_where(file_name), include=[])["ids"]
+            logger.info(f"Deleting {len(chunk_ids)} chunks of file: {file_name}")
+
+            if chunk_ids:
+                self.db_client.delete(chunk_ids)
+                self.keyword_index.delete(chunk_ids)
+            if self.manifest is not None:
+                self.manifest.remove(file_name)
+
+        self.keyword_index.save()
+        self.db_client.bump_version()
+        if self.manifest is not None:
+            self.manifest.save()
+
+
+    def _split_document(self, file_content: str) -> list[str]:
         """
         Split the data into chunks.
 
         Returns:
-            dict[str, list[str]]: A dictionary of the split data.
+            list[str]: The chunks of the document.
         """
-        
-        chunks = []
-        file_content = file_content.split(" ")
-        
-        for i in range(0, len(file_content), self.chunk_size - self.chunk_overlap):
-            try:
-                chunk = file_content[i:i+self.chunk_size]
-            except IndexError:
-                chunk = file_content[i:]
-            except Exception as e:
-                logger.error(f"Error splitting document: {e}")
-                continue
-            chunks.append(" ".join(chunk))
-        
-        return chunks
+        return [chunk for chunk, _, _ in self.chunker.split(file_content)]
 
-    def _get_embeddings(self, chunks: list[str]):
-        """Get the embeddings of the chunks.
+    def _get_embeddings(self, chunks: list[str]) -> np.ndarray:
+        """Get the (n_chunks, dim) embeddings of the chunks, in batched concurrent requests.
         """
-        response = self.llm_client.client.embeddings.create(
-            input=chunks,
-            model=self.embedding_model
-        )
-        return [embedding.embedding for embedding in response.data]
+        return self.embedder.embed_array(chunks)
 
     def get_file_chunks(self, file_name: str) -> list[str]:
         """Get the chunks of a file from the database
@@ -117,22 +264,10 @@ class Vectorizer:
             file_name (str): The name of the file to get the chunks of.
 
         Returns:
-            list[str]: The chunks of the file.
+            list[str]: The chunks of the file, in the order of the file.
         """
-        # Get all items from the database and filter by file_name metadata
-        all_data = self.db_client.collection.get(include=["documents", "metadatas"])
-        
-        # Find chunks that belong to this file
-        file_chunks = []
-        for i, metadata in enumerate(all_data.get("metadatas", [])):
-            if metadata and metadata.get("file_name") == file_name:
-                file_chunks.append(all_data["documents"][i])
-        
-        if not file_chunks:
-            logger.error(f"File {file_name} not found in database")
-            raise ValueError(f"File {file_name} not found in database")
-        
-        return file_chunks
+        file_data = self._get_file(file_name, include=["documents", "metadatas"])
+        return [file_data["documents"][i] for i in file_data["order"]]
 
     def get_file_embeddings(self, file_name: str) -> list[list[float]]:
         """Get the embeddings of a file from the database
@@ -141,26 +276,28 @@ class Vectorizer:
             file_name (str): The name of the file to get the embeddings of.
 
         Returns:
-            list[list[float]]: The embeddings of the file.
+            list[list[float]]: The embeddings of the file, in the order of its chunks.
+        """
+        file_data = self._get_file(file_name, include=["embeddings", "metadatas"])
+        return [np.asarray(file_data["embeddings"][i]).tolist() for i in file_data["order"]]
+
+    def _file_where(self, file_name: str) -> dict:
+        """The metadata filter of the chunks of a file of the tenant."""
+        if self.tenant is None:
+            return {"file_name": file_name}
+        return {"$and": [{"file_name": file_name}, {"tenant": self.tenant}]}
+
+    def _get_file(self, file_name: str, include: list[str]) -> dict:
+        """Get the chunks of a file from the database, filtered by the store rather than by a scan of the collection.
+
+        Returns:
+            dict: The requested fields, and the order of the chunks in the file under "order".
         """
-        # Get all items from the database and filter by file_name metadata
-        all_data = self.db_client.collection.get(include=["embeddings", "metadatas", "documents"])
-        
-        # Check if embeddings exist in the data
-        embeddings_data = all_data.get("embeddings")
-        if embeddings_data is None or len(embeddings_data) == 0:
-            logger.error("No embeddings found in database")
-            raise ValueError("No embeddings found in database")
-        
-        # Find embeddings that belong to this file
-        file_embeddings = []
-        for i, metadata in enumerate(all_data.get("metadatas", [])):
-            if metadata and metadata.get("file_name") == file_name:
-                if i < len(all_data["embeddings"]):
-                    file_embeddings.append(all_data["embeddings"][i])
-        
-        if not file_embeddings:
+        file_data = self.db_client.get(where=self._file_where(file_name), include=include)
+        if not file_data["ids"]:
             logger.error(f"File {file_name} not found in database")
             raise ValueError(f"File {file_name} not found in database")
-        
-        return file_embeddings
\ No newline at end of file
+
+        # the store does not guarantee the order of the chunks, their start offsets do
+        file_data["order"] = sorted(range(len(file_data["ids"])), key=lambda i: (file_data["metadatas"][i] or {}).get("start", 0))
+        return file_data
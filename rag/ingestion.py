@@ -0,0 +1,215 @@
+"""
+Long-running ingestion service: new, modified and deleted files of the data directory become
+searchable within seconds, while the retrievers of other threads and processes keep serving.
+
+A watcher polls the data directory and queues the changed files in a persistent `WorkQueue`.
+A writer takes the queued files in batches and streams them from the Loader (parsed by its
+process pool, a bounded number of files ahead) into the Vectorizer (embedded by concurrent
+requests and written by the writer alone), so a slow stage holds back the ones before it.
+"""
+
+import os
+import time
+import logging
+import threading
+
+from .indexer import Vectorizer
+from .loader import Loader
+from .manifest import Manifest
+from .metrics import metrics
+from .work_queue import WorkQueue, UPSERT, DELETE
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class IngestionService:
+    """Watches the data directory and ingests its changes in the background"""
+
+    def __init__(
+            self,
+            loader: Loader,
+            vectorizer: Vectorizer,
+            queue: WorkQueue = None,
+            poll_interval: float = 1.0,
+            batch_size: int = 16
+        ):
+        """
+        Initialize the IngestionService class.
+
+        The parse workers are the processes of the loader (`Loader(num_workers=...)`) and the embed
+        workers the concurrent requests of the vectorizer (`Vectorizer(max_workers=...)`); the chunks
+        are written by a single writer thread, as the stores and the keyword index expect.
+
+        Args:
+            loader (Loader): The loader of the data directory.
+            vectorizer (Vectorizer): The vectorizer writing the chunks, its manifest records the ingested files
+                (a new manifest is created if it has none).
+            queue (WorkQueue): The queue of the changed files, at `./ingest_queue.db` by default.
+            poll_interval (float): The number of seconds between two scans of the data directory.
+            batch_size (int): The maximum number of files ingested together.
+        """
+        self.loader = loader
+        self.vectorizer = vectorizer
+        if vectorizer.manifest is None:
+            vectorizer.manifest = Manifest()
+        self.manifest = vectorizer.manifest
+        self.queue = queue if queue is not None else WorkQueue()
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+
+        # the (size, mtime) of the files seen by the watcher, starting from the ingested ones
+        self._seen = {file_name: (record.size, record.mtime) for file_name, record in self.manifest.records.items()}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self.last_poll_at = None
+        self.last_ingest_at = None
+
+    def poll(self) -> int:
+        """Scan the data directory once and queue the files changed since the last scan.
+
+        Returns:
+            int: The number of files queued.
+        """
+        with metrics.span("ingestion.poll"):
+            files = self.loader.scan()
+            changed = []
+            for file_name, path in files.items():
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime)
+                if self._seen.get(file_name) != signature:
+                    self._seen[file_name] = signature
+                    changed.append(file_name)
+            deleted = [file_name for file_name in self._seen if file_name not in files]
+            for file_name in deleted:
+                del self._seen[file_name]
+
+            self.queue.put(changed, UPSERT)
+            self.queue.put(deleted, DELETE)
+        self.last_poll_at = time.time()
+
+        if changed or deleted:
+            logger.info(f"Queued {len(changed)} changed and {len(deleted)} deleted files")
+            metrics.increment("ingestion.files_queued", len(changed) + len(deleted))
+            self._wake.set()
+        return len(changed) + len(deleted)
+
+    def process_once(self) -> int:
+        """Ingest a batch of queued files.
+
+        Returns:
+            int: The number of files taken from the queue.
+        """
+        items = self.queue.claim(self.batch_size)
+        if not items:
+            return 0
+
+        with metrics.request("ingestion.process", files=len(items)):
+            files = self.loader.scan()
+            # a file deleted since it was queued is deleted from the store
+            deletes = [item for item in items if item[1] == DELETE or item[0] not in files]
+            upserts = [item for item in items if item[1] == UPSERT and item[0] in files]
+
+            if deletes:
+                try:
+                    self.vectorizer.delete_docs([file_name for file_name, _, _ in deletes])
+                    self._done(deletes)
+                except Exception as e:
+                    logger.error(f"Error deleting {len(deletes)} files: {e}")
+                    self.queue.fail(deletes, str(e))
+
+            if upserts:
+                self._ingest(upserts, files)
+
+        self.last_ingest_at = time.time()
+        return len(items)
+
+    def _ingest(self, items: list[tuple[str, str, float]], files: dict[str, str]) -> None:
+        """Load, vectorize and store the changed files of a batch."""
+        try:
+            # files touched without changing their content are not ingested again
+            changes = self.manifest.diff({file_name: files[file_name] for file_name, _, _ in items})
+            changed = set(changes.added) | set(changes.modified)
+            if changed:
+                self.vectorizer.data = self.loader.iter_documents(file_names=sorted(changed), pieces=True)
+                self.vectorizer.vectorize_docs()
+        except Exception as e:
+            logger.error(f"Error ingesting {len(items)} files: {e}")
+            self.queue.fail(items, str(e))
+            return
+        finally:
+            self.vectorizer.data = []
+
+        # the files that could not be loaded or stored are not recorded in the manifest
+        failed = [item for item in items if self.manifest.is_pending(item[0])]
+        if failed:
+            self.queue.fail(failed, "not ingested, see the logs")
+            metrics.increment("ingestion.files_failed", len(failed))
+        self._done([item for item in items if not self.manifest.is_pending(item[0])])
+
+    def _done(self, items: list[tuple[str, str, float]]) -> None:
+        self.queue.done(items)
+        now = time.time()
+        for _, action, enqueued_at in items:
+            # the time a change took to become searchable
+            metrics.observe("ingestion.lag", now - enqueued_at, action=action)
+        metrics.increment("ingestion.files_ingested", len(items))
+
+    def stats(self) -> dict:
+        """The queue depth and lag (see `WorkQueue.stats`), and the times of the last scan and ingestion."""
+        return {**self.queue.stats(), "last_poll_at": self.last_poll_at, "last_ingest_at": self.last_ingest_at}
+
+    def start(self) -> None:
+        """Start the watcher and the writer threads."""
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._watch, name="ingestion-watcher", daemon=True),
+            threading.Thread(target=self._write, name="ingestion-writer", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Watching {self.loader.data_dir} every {self.poll_interval}s")
+
+    def stop(self, timeout: float = None) -> None:
+        """Stop the threads, after the batch being ingested."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self) -> None:
+        """Run the service in the calling thread until interrupted."""
+        self.start()
+        try:
+            while not self._stop.wait(60):
+                logger.info(f"Ingestion queue: {self.stats()}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _watch(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error scanning {self.loader.data_dir}: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def _write(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.process_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Error processing the ingestion queue: {e}")
+            # nothing to do, until the watcher queues files
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
@@ -0,0 +1,336 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+import threading
+import numpy as np
+
+from .metrics import metrics
+from .tokenization import Tokenizer
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = "./bm25_index"
+# the file naming the version directory of the current index
+CURRENT_FILE = "CURRENT"
+VERSION_PREFIX = "version-"
+
+
+class KeywordIndex:
+    """Persistent BM25 index over the chunks stored in the database"""
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR, mmap: bool = True, tokenizer: Tokenizer = None):
+        """
+        Initialize the KeywordIndex class.
+
+        The index is loaded from `index_dir` if it exists. The BM25 score matrix is
+        memory-mapped by default, the tokenized corpus (needed only for updates) is
+        loaded on first write.
+
+        Every save writes a new version directory and then points `index_dir/CURRENT` at it,
+        so the files a reader has memory-mapped are never rewritten. The index has a single
+        writer, which removes the previous versions.
+
+        The configuration of the tokenizer is saved with the index. An index saved with another
+        configuration is not loaded: it is empty until it is rebuilt (see `build_from`).
+
+        Args:
+            index_dir (str): The directory the index is persisted to.
+            mmap (bool): Whether to memory-map the BM25 score matrix on load.
+            tokenizer (Tokenizer): The tokenizer of the chunks and queries, English stemming and stopwords by default.
+        """
+        self.index_dir = index_dir
+        self.mmap = mmap
+        self.tokenizer = tokenizer if tokenizer is not None else Tokenizer()
+
+        self.ids: list[str] = []
+        self.vocab: dict[str, int] = {}
+        self._id_to_pos: dict[str, int] = {}
+        self._token_ids: list[np.ndarray] | None = []
+        # the bm25s.BM25 score matrix, bm25s is only imported when it is loaded or built
+        self._retriever = None
+        self._dirty = False
+        # the directory the index was loaded from or saved to, and its version
+        self._loaded_dir = None
+        self._loaded_version = None
+        # searches may run concurrently (e.g. from async retrieval), rebuilds and reloads must not
+        self._lock = threading.RLock()
+
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def tokenize(self, text: str) -> list[str]:
+        """Tokenize and stem a text, used for both the corpus and the query."""
+        return self.tokenizer.tokenize(text)
+
+    def upsert(self, ids: list[str], documents: list[str]) -> None:
+        """Add or replace chunks in the index.
+
+        Only the given documents are tokenized, the score matrix is rebuilt from the
+        stored token ids on the next search or save.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+            documents (list[str]): The chunk texts.
+        """
+        # the whole update holds the lock, so a concurrent search never sees half of it
+        with self._lock:
+            self._reload_if_stale()
+            self._load_token_ids()
+
+            with metrics.span("keyword_index.tokenize"):
+                all_token_ids = self.tokenizer.encode(documents, self.vocab)
+            metrics.increment("keyword_index.tokens", sum(map(len, all_token_ids)))
+
+            for chunk_id, token_ids in zip(ids, all_token_ids):
+                pos = self._id_to_pos.get(chunk_id)
+                if pos is None:
+                    self._id_to_pos[chunk_id] = len(self.ids)
+                    self.ids.append(chunk_id)
+                    self._token_ids.append(token_ids)
+                else:
+                    self._token_ids[pos] = token_ids
+            metrics.increment("keyword_index.chunks_tokenized", len(ids))
+
+            self._dirty = True
+
+    def delete(self, ids: list[str]) -> None:
+        """Remove chunks from the index.
+
+        Args:
+            ids (list[str]): The chunk IDs to remove.
+        """
+        with self._lock:
+            self._reload_if_stale()
+            to_delete = {pos for chunk_id in ids if (pos := self._id_to_pos.get(chunk_id)) is not None}
+            if not to_delete:
+                return
+
+            self._load_token_ids()
+            keep = [pos for pos in range(len(self.ids)) if pos not in to_delete]
+            self.ids = [self.ids[pos] for pos in keep]
+            self._token_ids = [self._token_ids[pos] for pos in keep]
+            self._id_to_pos = {chunk_id: pos for pos, chunk_id in enumerate(self.ids)}
+            self._dirty = True
+
+    def search(self, query: str, top_k: int, ids: list[str] = None) -> list[tuple[str, float]]:
+        """Score the query against the index.
+
+        Args:
+            query (str): The query.
+            top_k (int): The number of results to return.
+            ids (list[str]): The chunk IDs the results are restricted to, e.g. the matches of a metadata filter.
+
+        Returns:
+            list[tuple[str, float]]: The matching (chunk ID, score) pairs, best first.
+        """
+        return self.search_many([query], top_k, ids=ids)[0]
+
+    def search_many(self, queries: list[str], top_k: int, ids: list[str] = None) -> list[list[tuple[str, float]]]:
+        """Score a batch of queries against the index in a single pass.
+
+        Args:
+            queries (list[str]): The queries.
+            top_k (int): The number of results to return per query.
+            ids (list[str]): The chunk IDs the results are restricted to, e.g. the matches of a metadata filter.
+
+        Returns:
+            list[list[tuple[str, float]]]: The matching (chunk ID, score) pairs of every query, best first.
+        """
+        hits = [[] for _ in queries]
+        with self._lock:
+            self._reload_if_stale()
+            if self._dirty:
+                self._build()
+            if self._retriever is None or not self.ids:
+                return hits
+            retriever, all_ids = self._retriever, self.ids
+            mask = None
+            if ids is not None:
+                positions = [pos for chunk_id in ids if (pos := self._id_to_pos.get(chunk_id)) is not None]
+                if not positions:
+                    return hits
+                # chunks outside the mask score 0, like chunks sharing no term with the query
+                mask = np.zeros(len(all_ids), dtype=np.float32)
+                mask[positions] = 1.0
+            vocab = self.vocab
+
+        with metrics.span("keyword_index.tokenize_queries"):
+            query_tokens = [[token for token in tokens if token in vocab] for tokens in self.tokenizer.tokenize_many(queries)]
+
+        # queries sharing no term with the vocabulary have no matches and are not scored
+        scored = [i for i, tokens in enumerate(query_tokens) if tokens]
+        if not scored:
+            return hits
+
+        with metrics.span("keyword_index.score"):
+            results, scores = retriever.retrieve(
+                [query_tokens[i] for i in scored], k=min(top_k, len(all_ids)), show_progress=False, weight_mask=mask
+            )
+        for i, positions, row_scores in zip(scored, results, scores):
+            # chunks that share no term with the query score 0 and are not matches
+            hits[i] = [(all_ids[pos], float(score)) for pos, score in zip(positions, row_scores) if score > 0]
+        return hits
+
+    def save(self) -> None:
+        """Rebuild the score matrix if needed and persist the index to disk, as a new version."""
+        # the files are written from a snapshot, searches go on while they are written
+        with self._lock:
+            if self._dirty:
+                self._build()
+            self._load_token_ids()
+            ids, vocab, retriever = list(self.ids), dict(self.vocab), self._retriever
+            lengths = np.fromiter((len(tokens) for tokens in self._token_ids), dtype=np.int64, count=len(ids))
+            tokens = np.concatenate(self._token_ids) if self._token_ids else np.empty(0, dtype=np.int32)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+        os.makedirs(self.index_dir, exist_ok=True)
+
+        version_dir = tempfile.mkdtemp(prefix=VERSION_PREFIX, dir=self.index_dir)
+        np.save(os.path.join(version_dir, "tokens.npy"), tokens.astype(np.int32, copy=False))
+        np.save(os.path.join(version_dir, "offsets.npy"), offsets)
+        with open(os.path.join(version_dir, "vocab.json"), "w") as f:
+            json.dump(vocab, f)
+        with open(os.path.join(version_dir, "tokenizer.json"), "w") as f:
+            json.dump(self.tokenizer.config, f)
+        if retriever is not None:
+            retriever.save(os.path.join(version_dir, "bm25"), show_progress=False)
+        with open(os.path.join(version_dir, "ids.json"), "w") as f:
+            json.dump(ids, f)
+
+        # the new version becomes current at once, readers of the previous one reload on their next search
+        version = os.path.basename(version_dir)
+        current_path = os.path.join(self.index_dir, CURRENT_FILE)
+        with open(current_path + ".tmp", "w") as f:
+            f.write(version)
+        os.replace(current_path + ".tmp", current_path)
+        with self._lock:
+            self._loaded_dir, self._loaded_version = version_dir, version
+        self._remove_old_versions(version)
+        logger.info(f"Saved keyword index with {len(ids)} chunks to {version_dir}")
+
+    def load(self) -> None:
+        """Load the current version of the index from disk, if it exists."""
+        import bm25s
+        while True:
+            version = self._current_version()
+            # indexes saved before versioning have their files in `index_dir` itself
+            index_dir = os.path.join(self.index_dir, version) if version else self.index_dir
+            ids_path = os.path.join(index_dir, "ids.json")
+            if version is None and not os.path.exists(ids_path):
+                return
+
+            try:
+                with open(ids_path, "r") as f:
+                    ids = json.load(f)
+                tokenizer_config = self._load_tokenizer_config(index_dir)
+                if tokenizer_config != self.tokenizer.config:
+                    # the terms of the index cannot be compared with the terms of this tokenizer
+                    logger.warning(f"Keyword index at {index_dir} was built with another tokenizer, it needs to be rebuilt")
+                    self.ids, self.vocab, self._id_to_pos, self._token_ids = [], {}, {}, []
+                    self._retriever, self._dirty = None, False
+                    self._loaded_dir, self._loaded_version = index_dir, version
+                    return
+                with open(os.path.join(index_dir, "vocab.json"), "r") as f:
+                    vocab = json.load(f)
+                retriever = bm25s.BM25.load(
+                    os.path.join(index_dir, "bm25"), mmap=self.mmap, show_progress=False
+                ) if ids else None
+            except FileNotFoundError:
+                # the version was replaced and removed while it was being loaded
+                if version is not None and self._current_version() != version:
+                    continue
+                raise
+            except Exception as e:
+                logger.error(f"Error loading keyword index from {index_dir}: {e}")
+                raise e
+            break
+
+        self.ids, self.vocab, self._retriever = ids, vocab, retriever
+        self._id_to_pos = {chunk_id: pos for pos, chunk_id in enumerate(self.ids)}
+        self._token_ids = None
+        self._dirty = False
+        self._loaded_dir, self._loaded_version = index_dir, version
+        logger.info(f"Loaded keyword index with {len(self.ids)} chunks from {index_dir}")
+
+    def build_from(self, store) -> None:
+        """Index every chunk of a vector store if the index is empty, e.g. new or built with another tokenizer.
+
+        Args:
+            store (VectorStore): The store the chunks of the index are kept in.
+        """
+        if len(self) > 0 or store.count() == 0:
+            return
+
+        logger.info("Keyword index is empty, building it from the database")
+        all_data = store.get(include=["documents"])
+        self.upsert(all_data["ids"], all_data["documents"])
+        self.save()
+
+    @staticmethod
+    def _load_tokenizer_config(index_dir: str) -> dict | None:
+        """The configuration of the tokenizer an index was saved with, None if it was not recorded."""
+        try:
+            with open(os.path.join(index_dir, "tokenizer.json"), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _current_version(self) -> str | None:
+        """The name of the current version directory, None if the index was never saved as a version."""
+        try:
+            with open(os.path.join(self.index_dir, CURRENT_FILE), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _remove_old_versions(self, current: str) -> None:
+        """Remove the versions replaced by `current`.
+
+        The readers that have their files memory-mapped keep reading them, the files are only
+        released once they are unmapped.
+        """
+        for name in os.listdir(self.index_dir):
+            if name.startswith(VERSION_PREFIX) and name != current:
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+
+    def _reload_if_stale(self) -> None:
+        """Reload the index if another process saved a newer version."""
+        if self._dirty:
+            return
+        version = self._current_version()
+        if version is not None and version != self._loaded_version:
+            self.load()
+
+    def _load_token_ids(self) -> None:
+        """Load the tokenized corpus, which is only needed to update the index."""
+        if self._token_ids is not None:
+            return
+
+        tokens = np.load(os.path.join(self._loaded_dir, "tokens.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(self._loaded_dir, "offsets.npy"))
+        self._token_ids = [np.array(tokens[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def _build(self) -> None:
+        """Rebuild the BM25 score matrix from the stored token ids."""
+        self._load_token_ids()
+        if not self.ids:
+            self._retriever = None
+            self._dirty = False
+            return
+
+        import bm25s
+        with metrics.span("keyword_index.build"):
+            self._retriever = bm25s.BM25()
+            self._retriever.index(
+                bm25s.tokenization.Tokenized(
+                    ids=[tokens.tolist() for tokens in self._token_ids],
+                    vocab=dict(self.vocab)
+                ),
+                show_progress=False
+            )
+        self._dirty = False
@@ -1,8 +1,9 @@
-from openai import OpenAI, AuthenticationError, APIConnectionError
 import os
 import logging
 from dotenv import load_dotenv
 
+from .registry import registry
+
 logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
 logger = logging.getLogger(f"llm_config.{__name__}")
 
@@ -44,18 +45,32 @@ class LLMConfig:
         if not self.config["api_key"] or not self.config["base_url"]:
             raise ValueError(f"Invalid configuration for '{self.client_name}': API key or base URL missing")
 
+        # clients assigned explicitly, e.g. stubs, override the shared ones
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self):
+        """The OpenAI-compatible client of the endpoint, shared by every LLMConfig of the process."""
+        if self._client is not None:
+            return self._client
         try:
-            self.client = OpenAI(
-                base_url=self.config["base_url"],
-                api_key=self.config["api_key"]
-            )
-            logger.info(f"Successfully initialized LLM client for '{self.client_name}'")
-        except AuthenticationError as e:
-            logger.error(f"Authentication failed for '{self.client_name}': {e}")
-            raise
-        except APIConnectionError as e:
-            logger.error(f"Failed to connect to '{self.client_name}' API: {e}")
-            raise
+            return registry.llm_client(self.config["base_url"], self.config["api_key"])
         except Exception as e:
             logger.error(f"Unexpected error initializing LLM client for '{self.client_name}': {e}")
-            raise
\ No newline at end of file
+            raise
+
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
+
+    @property
+    def async_client(self):
+        """The asynchronous client of the endpoint, shared within the running event loop."""
+        if self._async_client is not None:
+            return self._async_client
+        return registry.async_llm_client(self.config["base_url"], self.config["api_key"])
+
+    @async_client.setter
+    def async_client(self, client) -> None:
+        self._async_client = client
@@ -5,8 +5,15 @@ It supports the following file types: PDF, TXT, CSV.
 
 import os
 import logging
-import pandas as pd
-from pypdf import PdfReader
+import fnmatch
+import multiprocessing
+from typing import Iterator, TYPE_CHECKING
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
 logger = logging.getLogger(__name__)
@@ -17,12 +24,40 @@ class Loader:
             self, 
             data_dir: str,
             exclude_file_types: list[str] = None,
-            exclude_file_names: list[str] = None
+            exclude_file_names: list[str] = None,
+            recursive: bool = False,
+            include_patterns: list[str] = None,
+            block_size: int = 1 << 20,
+            num_workers: int = 1,
+            pdf_pages_per_task: int = 50
             ):
+        """
+        Initialize the Loader class.
+
+        Args:
+            data_dir (str): The directory to load the files from.
+            exclude_file_types (list[str]): The file extensions to skip.
+            exclude_file_names (list[str]): The file names to skip.
+            recursive (bool): Whether to walk the sub-directories of the data directory. File names are
+                then paths relative to the data directory.
+            include_patterns (list[str]): Glob patterns (e.g. "*.md", "reports/*.pdf") matched against the
+                file names, only matching files are loaded.
+            block_size (int): The approximate size in characters of the blocks text files are split into
+                when loading pieces.
+            num_workers (int): The number of processes parsing files, 1 parses in the calling process.
+                Use os.cpu_count() to use all cores.
+            pdf_pages_per_task (int): PDFs with more pages are split into page ranges parsed by different
+                processes.
+        """
         
         self.data_dir = data_dir
         self.exclude_file_types = exclude_file_types
         self.exclude_file_names = exclude_file_names
+        self.recursive = recursive
+        self.include_patterns = include_patterns
+        self.block_size = block_size
+        self.num_workers = num_workers
+        self.pdf_pages_per_task = pdf_pages_per_task
 
     def peek_data(self, data: dict[str, str]):
 
@@ -33,13 +68,18 @@ class Loader:
             print("\n")
     
 
-    def load_files(self) -> dict[str, any]:
+    def scan(self) -> dict[str, str]:
+        """List the files of the data directory that pass the exclusion filters.
 
-        data = {}
+        Returns:
+            dict[str, str]: The file names and their paths.
+        """
 
-        for file in os.listdir(self.data_dir):
+        files = {}
 
-            if not os.path.isfile(os.path.join(self.data_dir, file)):
+        for file, path in self._walk():
+
+            if not os.path.isfile(path):
                 logger.info(f"Skipping file - Not a file {file}")
                 continue
 
@@ -47,35 +87,215 @@ class Loader:
                 logger.info(f"Skipping file - Excluded file type {file}")
                 continue
             
-            if self.exclude_file_names and file in self.exclude_file_names:
+            if self.exclude_file_names and os.path.basename(file) in self.exclude_file_names:
                 logger.info(f"Skipping file - Excluded file name {file}")
                 continue
 
+            if self.include_patterns and not any(fnmatch.fnmatch(file, pattern) for pattern in self.include_patterns):
+                logger.info(f"Skipping file - Not matching the include patterns {file}")
+                continue
+
+            files[file] = path
+
+        return files
+
+    def load_files(self, file_names: list[str] = None) -> dict[str, any]:
+        """Load the files of the data directory into memory.
+
+        Prefer `iter_documents` for large corpora, which holds a single document at a time.
+
+        Args:
+            file_names (list[str]): Only load these files, e.g. the changed files of a `Manifest.diff`.
+
+        Returns:
+            dict[str, any]: The file names and their content.
+        """
+        with metrics.request("loader.load_files"):
+            return dict(self.iter_documents(file_names=file_names))
+
+    def iter_documents(
+            self,
+            file_names: list[str] = None,
+            pieces: bool = False,
+            ordered: bool = True
+        ) -> Iterator[tuple[str, any]]:
+        """Lazily load the files of the data directory, one at a time.
+
+        Args:
+            file_names (list[str]): Only load these files, e.g. the changed files of a `Manifest.diff`.
+            pieces (bool): Yield PDFs page by page, text files in blocks of about `block_size` characters
+                (split at line ends) and CSVs in blocks of rows, instead of whole documents. The pieces of
+                a file are yielded consecutively under the same file name, an empty file is a single empty piece.
+                A file that fails to load after some of its pieces were yielded ends with a None piece, so it is
+                not mistaken for a complete (shorter) file.
+            ordered (bool): With several workers, yield the files in directory order rather than as soon
+                as they are parsed.
+
+        Yields:
+            tuple[str, any]: The file name and its content (or the content of one of its pieces).
+        """
+        files = self.scan()
+        if file_names is not None:
+            file_names = set(file_names)
+            files = {file: path for file, path in files.items() if file in file_names}
+
+        if self.num_workers > 1:
+            yield from self._iter_parallel(files, pieces, ordered)
+            return
+
+        for file, path in files.items():
+            logger.info(f"Reading file - {file}")
+
+            # pieces are read lazily, as they are consumed, so only whole documents are timed here
+            with metrics.span("loader.read"):
+                contents = self._read(file, path, pieces)
+            if contents is None:
+                continue
+
+            metrics.increment("loader.files")
+            contents, n_pieces = iter(contents), 0
+            while True:
+                try:
+                    content = next(contents)
+                except StopIteration:
+                    break
+                except Exception:
+                    # logged by the reader, the pieces already yielded are followed by a None piece
+                    if n_pieces:
+                        yield file, None
+                    break
+                if content is not None:
+                    n_pieces += 1
+                    yield file, content
+
+    def _read(self, file: str, path: str, pieces: bool) -> Iterator[any] | None:
+        """Read a file, as a single document or lazily in pieces. Returns None for unsupported files."""
+
+        if file.endswith('.pdf'):
+            return self._iter_pdf_pages(path) if pieces else [self._load_pdf(path)]
+        elif file.endswith('.txt') or file.endswith('.md'):
+            return self._iter_text_blocks(path) if pieces else [self._load_text(path)]
+        elif file.endswith('.csv'):
+            return self._iter_csv_blocks(path) if pieces else [self._load_csv(path)]
+
+        logger.warning(f"Unsupported file type {file}")
+        return None
+
+    def _read_task(self, file: str, path: str, pieces: bool, page_range: tuple[int, int] | None) -> list[any] | None:
+        """Read a file, or a page range of a PDF, in a worker process."""
+
+        if page_range is not None:
+            pages = self._load_pdf_pages(path, *page_range)
+            if pages is None or pieces:
+                return pages
+            return ["".join(pages)]
+
+        contents = self._read(file, path, pieces)
+        return list(contents) if contents is not None else None
+
+    def _iter_parallel(self, files: dict[str, str], pieces: bool, ordered: bool) -> Iterator[tuple[str, any]]:
+        """Parse the files in a process pool, splitting large PDFs into page ranges.
+
+        A failure to parse a file (or one of its page ranges) is logged and skips that file only.
+        """
+        tasks = []
+        for file, path in files.items():
+            n_pages = self._count_pdf_pages(path) if file.endswith('.pdf') else 0
+            if n_pages > self.pdf_pages_per_task:
+                tasks.extend(
+                    (file, path, (start, min(start + self.pdf_pages_per_task, n_pages)))
+                    for start in range(0, n_pages, self.pdf_pages_per_task)
+                )
             else:
-                logger.info(f"Reading file - {file}")
-                
-                if file.endswith('.pdf'):
-                    data[file] = self._load_pdf(os.path.join(self.data_dir, file))
-                elif file.endswith('.txt') or file.endswith('.md'):
-                    data[file] = self._load_text(os.path.join(self.data_dir, file))
-                elif file.endswith('.csv'):
-                    data[file] = self._load_csv(os.path.join(self.data_dir, file))     
+                tasks.append((file, path, None))
+
+        remaining = {}
+        for file, _, _ in tasks:
+            remaining[file] = remaining.get(file, 0) + 1
+        file_order = list(remaining)
+        n_tasks = dict(remaining)
+
+        parts, failed, completed = {}, set(), {}
+        # bound the number of parsed documents held in memory: the tasks being parsed and the
+        # parsed ones not yet yielded (e.g. waiting for an earlier file when ordered)
+        max_in_flight = self.num_workers * 2
+        in_flight, held, next_task, next_file = {}, 0, 0, 0
+
+        # spawned workers do not inherit the locks and threads of the caller (e.g. an ingestion service)
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=mp_context) as executor:
+            while next_task < len(tasks) or in_flight:
+
+                # a task is always submitted when none is running, so a file split into more
+                # page ranges than the bound can still be completed
+                while next_task < len(tasks) and (len(in_flight) + held < max_in_flight or not in_flight):
+                    file, path, page_range = tasks[next_task]
+                    if page_range is None or page_range[0] == 0:
+                        logger.info(f"Reading file - {file}")
+                    in_flight[executor.submit(self._read_task, file, path, pieces, page_range)] = next_task
+                    next_task += 1
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = in_flight.pop(future)
+                    file = tasks[task][0]
+                    try:
+                        contents = future.result()
+                    except Exception as e:
+                        logger.error(f"Error loading file {file} - {e}")
+                        contents = None
+                    if contents is None:
+                        failed.add(file)
+
+                    parts.setdefault(file, {})[task] = contents or []
+                    held += 1
+                    remaining[file] -= 1
+                    if remaining[file] == 0:
+                        file_parts = parts.pop(file)
+                        contents = [content for task in sorted(file_parts) for content in file_parts[task]]
+                        if not pieces and n_tasks[file] > 1:
+                            contents = ["".join(contents)]
+                        completed[file] = contents
+
+                emit = []
+                if ordered:
+                    while next_file < len(file_order) and file_order[next_file] in completed:
+                        emit.append(file_order[next_file])
+                        next_file += 1
                 else:
-                    logger.warning(f"Unsupported file type {file}")
-                    continue
+                    emit = list(completed)
+
+                for file in emit:
+                    contents = completed.pop(file)
+                    held -= n_tasks[file]
+                    if file in failed:
+                        continue
+                    metrics.increment("loader.files")
+                    for content in contents:
+                        if content is not None:
+                            yield file, content
+
+    def _walk(self) -> Iterator[tuple[str, str]]:
+        """Yield the file names (relative to the data directory) and paths of the data directory."""
 
-        return data
+        if not self.recursive:
+            for file in sorted(os.listdir(self.data_dir)):
+                yield file, os.path.join(self.data_dir, file)
+            return
+
+        for root, dirs, files in os.walk(self.data_dir):
+            dirs.sort()
+            for file in sorted(files):
+                path = os.path.join(root, file)
+                yield os.path.relpath(path, self.data_dir).replace(os.sep, "/"), path
     
     
     def _load_pdf(self, file: str) -> str:
+        from pypdf import PdfReader
 
         try:
             reader = PdfReader(file)
-            text = ''
-            for page in reader.pages:
-                text += page.extract_text()
-            
-            return text
+            return "".join(page.extract_text() or "" for page in reader.pages)
         
         except Exception as e:
             logger.error(f"Error loading PDF file {file} - {e}")
@@ -91,12 +311,76 @@ class Loader:
             logger.error(f"Error loading text file {file} - {e}")
             return None
 
-    def _load_csv(self, file: str) -> pd.DataFrame:
-        
+    def _load_csv(self, file: str) -> "pd.DataFrame":
+        import pandas as pd
+
         try:
             return pd.read_csv(file)
         
         except Exception as e:
             logger.error(f"Error loading CSV file {file} - {e}")
             return None
-    
\ No newline at end of file
+
+    def _count_pdf_pages(self, file: str) -> int:
+        from pypdf import PdfReader
+
+        try:
+            return len(PdfReader(file).pages)
+
+        except Exception as e:
+            logger.error(f"Error reading PDF file {file} - {e}")
+            return 0
+
+    def _load_pdf_pages(self, file: str, start: int, end: int) -> list[str]:
+        from pypdf import PdfReader
+
+        try:
+            reader = PdfReader(file)
+            return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+        except Exception as e:
+            logger.error(f"Error loading pages {start}-{end} of PDF file {file} - {e}")
+            return None
+
+    def _iter_pdf_pages(self, file: str) -> Iterator[str]:
+        from pypdf import PdfReader
+
+        try:
+            pages = PdfReader(file).pages
+            # a PDF without pages is an empty piece, like an empty document when loaded whole
+            if len(pages) == 0:
+                yield ""
+            for page in pages:
+                yield page.extract_text() or ""
+
+        except Exception as e:
+            logger.error(f"Error loading PDF file {file} - {e}")
+            # a file cut short must not pass for a complete one, see `iter_documents`
+            raise
+
+    def _iter_text_blocks(self, file: str) -> Iterator[str]:
+
+        try:
+            with open(file, 'r') as f:
+                block = f.read(self.block_size)
+                # an empty file is a single empty piece, so its previous chunks are replaced by none
+                yield block + f.readline()
+                while block := f.read(self.block_size):
+                    # complete the last line, so blocks are split at line ends
+                    yield block + f.readline()
+
+        except Exception as e:
+            logger.error(f"Error loading text file {file} - {e}")
+            # a file cut short must not pass for a complete one, see `iter_documents`
+            raise
+
+    def _iter_csv_blocks(self, file: str, rows: int = 10_000) -> Iterator["pd.DataFrame"]:
+        import pandas as pd
+
+        try:
+            yield from pd.read_csv(file, chunksize=rows)
+
+        except Exception as e:
+            logger.error(f"Error loading CSV file {file} - {e}")
+            # a file cut short must not pass for a complete one, see `iter_documents`
+            raise
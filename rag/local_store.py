@@ -0,0 +1,350 @@
+"""
+Local vector store: the embeddings of a collection are a raw float32 matrix memory-mapped
+from disk, the IDs, documents and metadata live in a SQLite table mapping every chunk to its
+row of the matrix. Opening a collection reads nothing but the list of used rows, and a query
+is a blocked matrix product over the memory-mapped rows.
+
+The store supports one writing process at a time and any number of readers, which reload
+the collection when its version changes.
+"""
+
+import os
+import re
+import json
+import sqlite3
+import logging
+import threading
+import numpy as np
+
+from .vector_index import _normalize, _top_k, _blocked_top_k
+from .vector_store import VectorStore, DEFAULT_COLLECTION_NAME
+from .metrics import metrics
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_STORE_PATH = "./local_store"
+
+# sqlite limits the number of parameters of a single statement
+_MAX_PARAMS = 500
+
+_METADATA_KEY = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_to_sql(where: dict) -> tuple[str, list]:
+    """Translate a chroma-style metadata filter into a SQL condition over the metadata column.
+
+    Supports equality ({"key": value}), the comparison operators ($eq, $ne, $gt, $gte, $lt, $lte),
+    $in and $nin, and nesting with $and and $or.
+
+    Returns:
+        tuple[str, list]: The condition and its parameters.
+    """
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(condition) for condition in value]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+
+        if not _METADATA_KEY.match(key):
+            raise ValueError(f"Unsupported metadata key in filter: {key!r}")
+        # a literal path, so the expression indexes of the table are used
+        field = f"json_extract(metadata, '$.{key}')"
+
+        operator, operand = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+        if operator in _OPERATORS:
+            clauses.append(f"{field} {_OPERATORS[operator]} ?")
+            params.append(operand)
+        elif operator in ("$in", "$nin"):
+            negation = "NOT " if operator == "$nin" else ""
+            clauses.append(f"{field} {negation}IN ({','.join('?' * len(operand))})")
+            params.extend(operand)
+        else:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+
+    return "(" + " AND ".join(clauses) + ")" if clauses else "1", params
+
+
+class LocalVectorStore(VectorStore):
+    """Vector store of memory-mapped float32 embeddings and a SQLite table of IDs, documents and metadata"""
+
+    def __init__(
+            self,
+            path: str = DEFAULT_LOCAL_STORE_PATH,
+            collection_name: str = DEFAULT_COLLECTION_NAME,
+            block_rows: int = 65536
+        ):
+        """
+        Initialize the LocalVectorStore class.
+
+        The embeddings are stored normalized, so similarity scores are cosine similarities.
+
+        Args:
+            path (str): The directory the collections are stored in.
+            collection_name (str): The name of the collection.
+            block_rows (int): The number of rows scored at once by a query, bounding its memory use.
+        """
+        super().__init__(path, collection_name)
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._dim = None
+        # the memory-mapped embedding matrix and the mask of the rows holding a chunk
+        self._matrix = None
+        self._alive = None
+        self._loaded_version = None
+
+    @property
+    def _embeddings_path(self) -> str:
+        return os.path.join(self.path, f"{self.collection_name}.f32")
+
+    @property
+    def _db_path(self) -> str:
+        return os.path.join(self.path, f"{self.collection_name}.sqlite3")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the table of the collection on first use, and again in a forked process."""
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            conn = sqlite3.connect(self._db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    row INTEGER NOT NULL UNIQUE,
+                    document TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_file_name ON chunks (json_extract(metadata, '$.file_name'))")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_file_type ON chunks (json_extract(metadata, '$.file_type'))")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_tenant ON chunks (json_extract(metadata, '$.tenant'))")
+            conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value)")
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Error opening local vector store at {self._db_path}: {e}")
+            raise e
+
+        self._conn, self._pid = conn, os.getpid()
+        self._dim = None
+        self._matrix, self._alive, self._loaded_version = None, None, None
+        return conn
+
+    def _read_dim(self, conn: sqlite3.Connection) -> int | None:
+        """The embedding dimension of the collection, set by its first upsert."""
+        row = conn.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        return int(row[0]) if row else None
+
+    def _n_rows(self) -> int:
+        """The number of rows of the embedding matrix on disk."""
+        if self._dim is None or not os.path.exists(self._embeddings_path):
+            return 0
+        return os.path.getsize(self._embeddings_path) // (self._dim * 4)
+
+    def _refresh(self) -> None:
+        """Load the mask of used rows and map the embedding matrix, if another process changed the collection."""
+        conn = self._connection()
+        version = self.version
+        if self._alive is not None and version == self._loaded_version:
+            return
+
+        self._dim = self._dim or self._read_dim(conn)
+        alive = np.zeros(self._n_rows(), dtype=bool)
+        rows = np.fromiter((row for (row,) in conn.execute("SELECT row FROM chunks")), dtype=np.int64)
+        alive[rows[rows < len(alive)]] = True
+        self._alive, self._matrix, self._loaded_version = alive, None, version
+        logger.info(f"Loaded local collection {self.collection_name} with {len(rows)} chunks")
+
+    def _embeddings(self) -> np.ndarray:
+        """The memory-mapped embedding matrix, remapped when it grew."""
+        n_rows = len(self._alive)
+        if self._matrix is None or self._matrix.shape[0] != n_rows:
+            if n_rows == 0:
+                self._matrix = np.empty((0, self._dim or 0), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self._embeddings_path, dtype=np.float32, mode="r", shape=(n_rows, self._dim))
+        return self._matrix
+
+    def _select(self, columns: str, ids: list[str] = None, where: dict = None) -> list[tuple]:
+        """Select the rows of the table matching IDs and a metadata filter."""
+        conn = self._connection()
+        condition, params = where_to_sql(where or {})
+        if ids is None:
+            return conn.execute(f"SELECT {columns} FROM chunks WHERE {condition} ORDER BY row", params).fetchall()
+
+        results = []
+        for i in range(0, len(ids), _MAX_PARAMS):
+            batch = ids[i:i + _MAX_PARAMS]
+            results.extend(conn.execute(
+                f"SELECT {columns} FROM chunks WHERE id IN ({','.join('?' * len(batch))}) AND {condition}",
+                [*batch, *params]
+            ).fetchall())
+        return results
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def upsert(self, ids: list[str], documents: list[str], embeddings, metadatas: list[dict]) -> None:
+        if not ids:
+            return
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate IDs in upsert")
+        embeddings = _normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        if embeddings.shape[0] != len(ids):
+            raise ValueError(f"Got {len(ids)} IDs for {embeddings.shape[0]} embeddings")
+
+        with self._lock:
+            conn = self._connection()
+            self._refresh()
+            if self._dim is None:
+                self._dim = embeddings.shape[1]
+                conn.execute("INSERT INTO settings (key, value) VALUES ('dim', ?)", (self._dim,))
+            elif embeddings.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match the collection's {self._dim}")
+
+            # existing chunks are overwritten in place, new chunks take the free rows, then new rows
+            existing = dict(self._select("id, row", ids=ids))
+            new = [chunk_id for chunk_id in ids if chunk_id not in existing]
+            free = np.flatnonzero(~self._alive)[:len(new)]
+            n_rows = len(self._alive)
+            appended = np.arange(n_rows, n_rows + len(new) - len(free))
+            existing.update(zip(new, np.concatenate([free, appended]).tolist()))
+            rows = np.fromiter((existing[chunk_id] for chunk_id in ids), dtype=np.int64, count=len(ids))
+
+            # the embeddings are written before the table, a chunk is only visible once both are
+            if len(appended):
+                with open(self._embeddings_path, "ab") as f:
+                    f.truncate((n_rows + len(appended)) * self._dim * 4)
+            matrix = np.memmap(self._embeddings_path, dtype=np.float32, mode="r+", shape=(n_rows + len(appended), self._dim))
+            matrix[rows] = embeddings
+            matrix.flush()
+            del matrix
+
+            conn.executemany(
+                "INSERT INTO chunks (id, row, document, metadata) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET document = excluded.document, metadata = excluded.metadata",
+                [
+                    (chunk_id, int(row), document, json.dumps(metadata))
+                    for chunk_id, row, document, metadata in zip(ids, rows.tolist(), documents, metadatas)
+                ]
+            )
+            conn.commit()
+
+            alive = np.zeros(n_rows + len(appended), dtype=bool)
+            alive[:n_rows] = self._alive
+            alive[rows] = True
+            self._alive = alive
+
+    def delete(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            conn = self._connection()
+            self._refresh()
+            rows = [row for (row,) in self._select("row", ids=ids)]
+            for i in range(0, len(ids), _MAX_PARAMS):
+                batch = ids[i:i + _MAX_PARAMS]
+                conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+            conn.commit()
+            # the rows are reused by the next upserts
+            self._alive[rows] = False
+
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = ("documents", "metadatas")) -> dict:
+        with self._lock:
+            self._refresh()
+            found = self._select("id, row, document, metadata", ids=ids, where=where)
+            if ids is not None:
+                # in the order of the requested IDs
+                positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+                found.sort(key=lambda item: positions[item[0]])
+
+            results = {"ids": [chunk_id for chunk_id, _, _, _ in found]}
+            if "documents" in include:
+                results["documents"] = [document for _, _, document, _ in found]
+            if "metadatas" in include:
+                results["metadatas"] = [json.loads(metadata) for _, _, _, metadata in found]
+            if "embeddings" in include:
+                rows = np.fromiter((row for _, row, _, _ in found), dtype=np.int64, count=len(found))
+                results["embeddings"] = np.array(self._embeddings()[rows]) if len(rows) else np.empty((0, self._dim or 0), dtype=np.float32)
+        return results
+
+    def query(
+            self,
+            query_embeddings,
+            top_k: int,
+            where: dict = None,
+            include: list[str] = ("documents", "metadatas")
+        ) -> dict:
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        with self._lock:
+            self._refresh()
+            matrix, alive = self._embeddings(), self._alive
+            candidates = None
+            if where:
+                candidates = np.fromiter((row for (row,) in self._select("row", where=where)), dtype=np.int64)
+
+        with metrics.span("local_store.score"):
+            if candidates is not None:
+                positions, scores = self._score_rows(queries, matrix, candidates, top_k)
+            else:
+                positions, scores = self._score_all(queries, matrix, alive, top_k)
+        n_scored = len(candidates) if candidates is not None else matrix.shape[0]
+        metrics.increment("local_store.rows_scored", n_scored * queries.shape[0])
+
+        # rows scored -inf are free rows, filling up the results of a collection smaller than top_k
+        hits = [[(int(row), float(score)) for row, score in zip(row_positions, row_scores) if np.isfinite(score)]
+                for row_positions, row_scores in zip(positions, scores)]
+
+        with self._lock:
+            unique_rows = list({row for query_hits in hits for row, _ in query_hits})
+            found = {}
+            for i in range(0, len(unique_rows), _MAX_PARAMS):
+                batch = unique_rows[i:i + _MAX_PARAMS]
+                for row, chunk_id, document, metadata in self._connection().execute(
+                    f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch
+                ):
+                    found[row] = (chunk_id, document, metadata)
+
+        # chunks deleted since the rows were scored are skipped
+        hits = [[(row, score) for row, score in query_hits if row in found] for query_hits in hits]
+        results = {
+            "ids": [[found[row][0] for row, _ in query_hits] for query_hits in hits],
+            "scores": [[score for _, score in query_hits] for query_hits in hits],
+        }
+        if "documents" in include:
+            results["documents"] = [[found[row][1] for row, _ in query_hits] for query_hits in hits]
+        if "metadatas" in include:
+            results["metadatas"] = [[json.loads(found[row][2]) for row, _ in query_hits] for query_hits in hits]
+        return results
+
+    def _score_all(self, queries: np.ndarray, matrix: np.ndarray, alive: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Score every used row in blocks, keeping the top_k of every block."""
+        def score_block(start: int, end: int) -> np.ndarray:
+            scores = queries @ matrix[start:end].T
+            scores[:, ~alive[start:end]] = -np.inf
+            return scores
+
+        return _blocked_top_k(score_block, matrix.shape[0], top_k, queries.shape[0], self.block_rows)
+
+    def _score_rows(self, queries: np.ndarray, matrix: np.ndarray, rows: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Score the given rows only."""
+        rows = rows[rows < matrix.shape[0]]
+        positions, scores = _top_k(queries @ matrix[rows].T, top_k)
+        return rows[positions], scores
+
+    def bump_version(self) -> int:
+        version = super().bump_version()
+        with self._lock:
+            # this process' view of the collection is up to date
+            if self._alive is not None:
+                self._loaded_version = version
+        return version
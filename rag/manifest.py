@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+import logging
+
+from .schemas import FileRecordSchema, ManifestDiffSchema
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = "./ingest_manifest.json"
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """Hash the content of a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Records the ingested files, so re-ingestion only processes the files that changed"""
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        """
+        Initialize the Manifest class.
+
+        Args:
+            path (str): The path of the manifest file.
+        """
+        self.path = path
+        self.records: dict[str, FileRecordSchema] = {}
+        self._pending: dict[str, FileRecordSchema] = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.records = {
+                        file_name: FileRecordSchema(**record) for file_name, record in json.load(f).items()
+                    }
+            except Exception as e:
+                logger.error(f"Error loading manifest {path}: {e}")
+                raise e
+
+    def diff(self, files: dict[str, str]) -> ManifestDiffSchema:
+        """Compare the files on disk with the manifest.
+
+        The content of a file is only hashed when its size or modification time changed.
+
+        Args:
+            files (dict[str, str]): The file names and paths on disk, as returned by `Loader.scan`.
+
+        Returns:
+            ManifestDiffSchema: The added, modified, deleted and unchanged files.
+        """
+        diff = ManifestDiffSchema(deleted=[file_name for file_name in self.records if file_name not in files])
+
+        for file_name, path in files.items():
+            stat = os.stat(path)
+            record = self.records.get(file_name)
+
+            if record and record.size == stat.st_size and record.mtime == stat.st_mtime:
+                diff.unchanged.append(file_name)
+                continue
+
+            content_hash = file_hash(path)
+            if record and record.content_hash == content_hash:
+                # touched but not changed
+                record.path, record.mtime = path, stat.st_mtime
+                diff.unchanged.append(file_name)
+                continue
+
+            self._pending[file_name] = FileRecordSchema(
+                path=path, size=stat.st_size, mtime=stat.st_mtime, content_hash=content_hash
+            )
+            (diff.modified if record else diff.added).append(file_name)
+
+        logger.info(
+            f"Manifest diff: {len(diff.added)} added, {len(diff.modified)} modified, "
+            f"{len(diff.deleted)} deleted, {len(diff.unchanged)} unchanged"
+        )
+        return diff
+
+    def commit(self, file_name: str, chunk_count: int) -> None:
+        """Record a file found by `diff` as ingested.
+
+        Args:
+            file_name (str): The name of the file.
+            chunk_count (int): The number of chunks stored for the file.
+        """
+        record = self._pending.pop(file_name, None)
+        if record is None:
+            logger.warning(f"File {file_name} was not found by the last diff, not recording it")
+            return
+        record.chunk_count = chunk_count
+        self.records[file_name] = record
+
+    def is_pending(self, file_name: str) -> bool:
+        """Whether a file found changed by the last `diff` has not been committed yet."""
+        return file_name in self._pending
+
+    def remove(self, file_name: str) -> None:
+        """Forget an ingested file."""
+        self.records.pop(file_name, None)
+        self._pending.pop(file_name, None)
+
+    def save(self) -> None:
+        """Persist the manifest to disk."""
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({file_name: record.model_dump() for file_name, record in self.records.items()}, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,191 @@
+"""
+Per-stage timing and counters of the ingestion and query pipeline.
+
+Every stage (embedding request, store lookup, stemming, BM25 build, scoring, ...) runs in a
+named span, and the pipeline counts what it processes (texts embedded, cache hits, chunks
+scored, ...). The process-wide `metrics` aggregates both, exports them as JSON or in the
+Prometheus text format, and forwards every event to the registered hooks:
+
+    from rag.metrics import metrics
+
+    metrics.add_hook(lambda event: print(event))
+    retriever.retrieve("what is cricket?")
+    print(metrics.to_prometheus())
+
+Requests (`Retriever.retrieve_many`, `Vectorizer.vectorize_docs`, ...) can also be profiled
+with cProfile, one stats file per request: `metrics.configure(profile_dir="./profiles")`.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Callable
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+_PROMETHEUS_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class Metrics:
+    """Thread-safe aggregation of timing spans and counters, with pluggable hooks"""
+
+    def __init__(self, profile_dir: str = None, prefix: str = "rag"):
+        """
+        Initialize the Metrics class.
+
+        Args:
+            profile_dir (str): The directory the cProfile stats of every request are written to,
+                None to disable profiling.
+            prefix (str): The prefix of the exported Prometheus metric names.
+        """
+        self.profile_dir = profile_dir
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hooks: list[Callable[[dict], None]] = []
+        # stage -> [count, total seconds, max seconds]
+        self._spans: dict[str, list] = {}
+        self._counters: dict[str, float] = {}
+        # one profiler can be active at a time in a process
+        self._profiling = threading.Lock()
+
+    def configure(self, profile_dir: str = None) -> None:
+        """Enable profiling of requests into `profile_dir`, or disable it with None."""
+        self.profile_dir = profile_dir
+
+    def add_hook(self, hook: Callable[[dict], None]) -> None:
+        """Call `hook` with every event: {"type": "span", "name", "seconds", "labels"} or
+        {"type": "counter", "name", "value", "labels"}."""
+        # the list is replaced rather than changed, so events are emitted without holding the lock
+        with self._lock:
+            self._hooks = [*self._hooks, hook]
+
+    def remove_hook(self, hook: Callable[[dict], None]) -> None:
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Time a stage of the pipeline.
+
+        Args:
+            name (str): The name of the stage, e.g. "retriever.fetch".
+            **labels: Extra labels passed to the hooks, e.g. the retrieval method.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def request(self, name: str, **labels):
+        """Time a whole request, profiled with cProfile if a profile directory is configured.
+
+        A single request is profiled at a time: nested requests, and requests of other threads
+        while one is being profiled, are plain spans.
+        """
+        profile_dir = self.profile_dir
+        if profile_dir is None or not self._profiling.acquire(blocking=False):
+            with self.span(name, **labels):
+                yield
+            return
+
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            with self.span(name, **labels):
+                profiler.enable()
+                try:
+                    yield
+                finally:
+                    profiler.disable()
+        finally:
+            self._profiling.release()
+            self._dump_profile(profiler, profile_dir, name)
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record the duration of a stage timed elsewhere."""
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            hooks = self._hooks
+        if hooks:
+            self._emit(hooks, {"type": "span", "name": name, "seconds": seconds, "labels": labels})
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Add to a counter, e.g. the number of texts embedded."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            hooks = self._hooks
+        if hooks:
+            self._emit(hooks, {"type": "counter", "name": name, "value": value, "labels": labels})
+
+    def snapshot(self) -> dict:
+        """The aggregated spans (count, total and max seconds) and counters."""
+        with self._lock:
+            return {
+                "spans": {
+                    name: {"count": count, "total_seconds": total, "max_seconds": longest}
+                    for name, (count, total, longest) in sorted(self._spans.items())
+                },
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def reset(self) -> None:
+        """Forget the aggregated spans and counters."""
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def to_json(self) -> str:
+        """The snapshot as JSON."""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """The snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        stage = f"{self.prefix}_stage_seconds"
+        lines = [
+            f"# HELP {stage} Time spent in a stage of the pipeline.",
+            f"# TYPE {stage} summary",
+        ]
+        for name, stats in snapshot["spans"].items():
+            lines.append(f'{stage}_sum{{stage="{name}"}} {stats["total_seconds"]:.9f}')
+            lines.append(f'{stage}_count{{stage="{name}"}} {stats["count"]}')
+        lines.append(f"# TYPE {stage}_max gauge")
+        for name, stats in snapshot["spans"].items():
+            lines.append(f'{stage}_max{{stage="{name}"}} {stats["max_seconds"]:.9f}')
+
+        for name, value in snapshot["counters"].items():
+            metric = f"{self.prefix}_{_PROMETHEUS_NAME.sub('_', name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _emit(self, hooks: list[Callable[[dict], None]], event: dict) -> None:
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                # a broken hook must not break the pipeline
+                logger.error(f"Error in metrics hook {hook!r}: {e}")
+
+    def _dump_profile(self, profiler, profile_dir: str, name: str) -> None:
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            path = os.path.join(profile_dir, f"{name}-{time.time_ns()}-{threading.get_ident()}.prof")
+            profiler.dump_stats(path)
+        except Exception as e:
+            logger.error(f"Error writing the profile of {name}: {e}")
+
+
+metrics = Metrics()
@@ -0,0 +1,217 @@
+"""
+This module compresses embeddings into compact codes that can be scored without decompressing them.
+It supports the following quantizations: float16, int8, pq.
+
+Bytes per dimension: float32 4, float16 2, int8 1, pq n_subvectors / dim (e.g. 0.125 for 48 sub-vectors
+of a 384-dimensional embedding).
+"""
+
+import os
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class Quantizer:
+    """Encodes normalized embeddings into codes and scores queries against the codes by inner product"""
+
+    name = None
+
+    def train(self, embeddings: np.ndarray) -> None:
+        """Fit the quantizer's parameters to a sample of embeddings."""
+
+    @property
+    def trained(self) -> bool:
+        return True
+
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        """Encode embeddings, one row of codes per embedding."""
+        raise NotImplementedError
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate the inner products of queries with encoded embeddings.
+
+        Args:
+            queries (np.ndarray): The (n_queries, dim) query embeddings.
+            codes (np.ndarray): The codes of the embeddings.
+
+        Returns:
+            np.ndarray: The (n_queries, n_codes) approximate scores.
+        """
+        raise NotImplementedError
+
+    def save(self, path: str) -> None:
+        """Persist the parameters of the quantizer."""
+        np.savez(path, **self._parameters())
+
+    @classmethod
+    def load(cls, path: str) -> "Quantizer":
+        """Load a quantizer saved with `save`."""
+        quantizer = cls()
+        if os.path.exists(path):
+            with np.load(path) as parameters:
+                for name in parameters.files:
+                    setattr(quantizer, name, parameters[name])
+        return quantizer
+
+    def _parameters(self) -> dict[str, np.ndarray]:
+        return {}
+
+
+class Float16Quantizer(Quantizer):
+    """Half-precision embeddings, 2 bytes per dimension"""
+
+    name = "float16"
+
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        return np.asarray(embeddings, dtype=np.float16)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return queries @ codes.astype(np.float32).T
+
+
+class Int8Quantizer(Quantizer):
+    """Scalar quantization to int8 with a scale per dimension, 1 byte per dimension"""
+
+    name = "int8"
+
+    def __init__(self):
+        self.scale = None
+
+    @property
+    def trained(self) -> bool:
+        return self.scale is not None
+
+    def train(self, embeddings: np.ndarray) -> None:
+        # a high percentile rather than the maximum, so outliers do not waste the code range
+        bound = np.percentile(np.abs(embeddings), 99.9, axis=0).astype(np.float32)
+        bound[bound == 0] = 1.0
+        self.scale = bound / 127.0
+
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(embeddings / self.scale), -127, 127).astype(np.int8)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # the scales are folded into the queries, so the codes are used as they are
+        return (queries * self.scale) @ codes.astype(np.float32).T
+
+    def _parameters(self) -> dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+
+class ProductQuantizer(Quantizer):
+    """Product quantization: every sub-vector is replaced by the index of its nearest of 256 centroids"""
+
+    name = "pq"
+
+    def __init__(self, n_subvectors: int = 48, n_iter: int = 15, max_samples: int = 16384, seed: int = 0):
+        """
+        Initialize the ProductQuantizer class.
+
+        Args:
+            n_subvectors (int): The number of sub-vectors, bytes per embedding. Must divide the dimension.
+            n_iter (int): The number of k-means iterations of the training.
+            max_samples (int): The maximum number of embeddings the centroids are trained on.
+            seed (int): The seed of the sampling and of the k-means initialization.
+        """
+        self.n_subvectors = n_subvectors
+        self.n_iter = n_iter
+        self.max_samples = max_samples
+        self.seed = seed
+        self.centroids = None
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, embeddings: np.ndarray) -> None:
+        n, dim = embeddings.shape
+        if dim % self.n_subvectors:
+            raise ValueError(f"n_subvectors ({self.n_subvectors}) must divide the embedding dimension ({dim})")
+        rng = np.random.default_rng(self.seed)
+        sample = embeddings if n <= self.max_samples else embeddings[np.sort(rng.choice(n, self.max_samples, replace=False))]
+        sample = np.ascontiguousarray(sample, dtype=np.float32)
+        n_centroids = min(256, sample.shape[0])
+
+        sub_dim = dim // self.n_subvectors
+        self.centroids = np.empty((self.n_subvectors, n_centroids, sub_dim), dtype=np.float32)
+        for m in range(self.n_subvectors):
+            self.centroids[m] = _kmeans(sample[:, m * sub_dim:(m + 1) * sub_dim], n_centroids, self.n_iter, rng)
+        logger.info(f"Trained product quantizer with {self.n_subvectors} sub-vectors on {sample.shape[0]} embeddings")
+
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        sub_dim = self.centroids.shape[2]
+        codes = np.empty((embeddings.shape[0], self.n_subvectors), dtype=np.uint8)
+        for m in range(self.n_subvectors):
+            codes[:, m] = _nearest(embeddings[:, m * sub_dim:(m + 1) * sub_dim], self.centroids[m])
+        return codes
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # asymmetric distance: a table of the inner products of every query sub-vector with every centroid
+        sub_dim = self.centroids.shape[2]
+        # laid out (centroid, query), so a code picks a contiguous row of scores for all queries at once
+        tables = np.einsum("qms,mcs->mcq", queries.reshape(queries.shape[0], self.n_subvectors, sub_dim), self.centroids)
+        tables = np.ascontiguousarray(tables, dtype=np.float32)
+        scores = np.zeros((codes.shape[0], queries.shape[0]), dtype=np.float32)
+        for m in range(self.n_subvectors):
+            scores += tables[m][codes[:, m]]
+        return np.ascontiguousarray(scores.T)
+
+    @classmethod
+    def load(cls, path: str) -> "ProductQuantizer":
+        quantizer = super().load(path)
+        if quantizer.centroids is not None:
+            quantizer.n_subvectors = quantizer.centroids.shape[0]
+        return quantizer
+
+    def _parameters(self) -> dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+
+def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """The index of the nearest centroid (in l2 distance) of every point."""
+    distances = points @ centroids.T
+    distances *= -2
+    distances += (centroids ** 2).sum(axis=1)
+    return np.argmin(distances, axis=1)
+
+
+def _kmeans(points: np.ndarray, k: int, n_iter: int, rng: np.random.Generator) -> np.ndarray:
+    """Cluster points with k-means, returning the centroids."""
+    centroids = points[rng.choice(points.shape[0], k, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _nearest(points, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        empty = counts == 0
+        # sum the points of every cluster over the points sorted by cluster
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[~empty]
+        centroids[~empty] = np.add.reduceat(points[order], starts, axis=0) / counts[~empty, None]
+        # re-seed empty clusters with random points
+        centroids[empty] = points[rng.integers(points.shape[0], size=int(empty.sum()))]
+    return centroids
+
+
+QUANTIZERS = {
+    "float16": Float16Quantizer,
+    "int8": Int8Quantizer,
+    "pq": ProductQuantizer,
+}
+
+
+def get_quantizer(quantization: str, **kwargs) -> Quantizer:
+    """Create the quantizer of a quantization.
+
+    Args:
+        quantization (str): The quantization. Options: float16, int8, pq
+        **kwargs: Extra arguments of the quantizer, e.g. `n_subvectors` for pq.
+
+    Returns:
+        Quantizer: The quantizer.
+    """
+    if quantization not in QUANTIZERS:
+        raise ValueError(f"Unsupported quantization: {quantization}. Supported quantizations are: {list(QUANTIZERS.keys())}")
+    return QUANTIZERS[quantization](**kwargs)
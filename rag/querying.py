@@ -1,13 +1,27 @@
-import bm25s
+import json
+import time
+import asyncio
 import logging
-import Stemmer
+import threading
+import numpy as np
 
+from .cache import LRUCache
 from .database import ChromaDatabase
+from .vector_store import VectorStore
+from .embedding_cache import EmbeddingCache
+from .keyword_index import KeywordIndex
 from .llm_config import LLMConfig
+from .metrics import metrics
+from .reranking import Reranker
+from .vector_index import VectorIndex, reciprocal_rank_fusion
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s [%(filename)s]: %(message)s')
 logger = logging.getLogger(__name__)
 
+# number of candidates taken from each ranking in hybrid retrieval, per requested result
+HYBRID_CANDIDATES_PER_RESULT = 4
+RRF_K = 60
+
 
 class Retriever:
     """Retrieve the data from the database"""
@@ -16,9 +30,17 @@ class Retriever:
             self, 
             method: str = "similarity",
             top_k: int = 5,
-            llm_client: LLMConfig = LLMConfig(client_name="openai"),
+            llm_client: LLMConfig = None,
             embedding_model: str = "text-embedding-3-small",
-            db_client: ChromaDatabase = ChromaDatabase()
+            db_client: VectorStore = None,
+            keyword_index: KeywordIndex = None,
+            vector_index: VectorIndex = None,
+            cache_size: int = 1024,
+            cache_ttl: float = 3600,
+            query_embedding_cache: EmbeddingCache = None,
+            reranker: Reranker = None,
+            rerank_candidates: int = 20,
+            rerank_budget: float = None
     ):
         """
         Initialize the Retriever class.
@@ -26,78 +48,439 @@ class Retriever:
         Args:  
             method (str): The method to use for retrieval. Options: keyword_based, semantic_search, hybrid
             top_k (int): The number of results to retrieve.
-            llm_client (LLMConfig): The LLM client to use.
+            llm_client (LLMConfig): The LLM client to use, defaults to the openai client created on first use.
             embedding_model (str): The embedding model to use.
-            db_client (ChromaDatabase): The database client to use.
+            db_client (VectorStore): The vector store to retrieve from, defaults to the chroma database.
+            keyword_index (KeywordIndex): The persistent BM25 index used for keyword_based retrieval, by default
+                the index of the collection in the directory of the store, loaded on first use.
+            vector_index (VectorIndex): An in-process vector index (exact or IVFIndex) used for semantic
+                search instead of the database's nearest-neighbour query. It is rebuilt from the database
+                (see `VectorIndex.rebuild`) when the version of the collection moves after its first use.
+            cache_size (int): The number of query embeddings and of results cached in process, 0 to disable.
+            cache_ttl (float): The number of seconds cached query embeddings and results stay valid.
+            query_embedding_cache (EmbeddingCache): An on-disk cache of query embeddings, shared across processes.
+            reranker (Reranker): A second stage re-scoring the retrieved candidates (see `rag.reranking`),
+                None to return the retrieval ranking.
+            rerank_candidates (int): The number of candidates retrieved per query and re-scored by the reranker.
+            rerank_budget (float): The number of seconds re-ranking may take per batch of queries, None for no limit.
+                Candidates not scored within the budget follow the scored ones in their retrieval order.
         """
         self.retrieval_method = method
         self.top_k = top_k
-        self.llm_client = llm_client
+        self._llm_client = llm_client
         self.embedding_model = embedding_model
-        self.db_client = db_client
+        self.db_client = db_client if db_client is not None else ChromaDatabase()
+        self._keyword_index = keyword_index
+        self.vector_index = vector_index
+        # the version of the collection the vector index holds, None before its first use
+        self._vector_index_version = None
+        self.query_embedding_cache = query_embedding_cache
+        self._embedding_cache = LRUCache(max_entries=cache_size, ttl=cache_ttl) if cache_size else None
+        self._result_cache = LRUCache(max_entries=cache_size, ttl=cache_ttl) if cache_size else None
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget = rerank_budget
+        # rerank scores per (query, chunk ID, collection version)
+        self._rerank_cache = LRUCache(max_entries=cache_size * rerank_candidates, ttl=cache_ttl) if cache_size and reranker else None
+        self._keyword_index_ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def llm_client(self) -> LLMConfig:
+        """The LLM client embedding the queries, created on first use."""
+        if self._llm_client is None:
+            self._llm_client = LLMConfig(client_name="openai")
+        return self._llm_client
+
+    @property
+    def keyword_index(self) -> KeywordIndex:
+        """The BM25 index, loaded on first use and built from the database if it is empty."""
+        with self._lock:
+            if not self._keyword_index_ready:
+                if self._keyword_index is None:
+                    self._keyword_index = KeywordIndex(self.db_client.keyword_index_dir)
+                self._ensure_keyword_index()
+                self._keyword_index_ready = True
+        return self._keyword_index
+
+    def _ensure_keyword_index(self):
+        """Build the keyword index from the database once, if it has not been built yet."""
+        self._keyword_index.build_from(self.db_client)
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Normalize the case and whitespace of a query, so trivial variants share cache entries."""
+        return " ".join(query.lower().split())
+
+    def _cache_keys(self, queries: list[str]) -> tuple[list[str], dict[str, str]]:
+        """The normalized cache keys of the queries, and the query searched for every key.
+
+        The keys are only used to look up the caches: the queries are searched, embedded and re-ranked
+        as they were written, the first of several queries sharing a key standing for all of them.
+        """
+        keys = [self._normalize_query(query) for query in queries]
+        texts = {}
+        for key, query in zip(keys, queries):
+            texts.setdefault(key, query)
+        return keys, texts
+
+    def _needs_embeddings(self) -> bool:
+        """Whether the retrieval method scores the queries against their embeddings."""
+        return self.retrieval_method in ("semantic_search", "hybrid")
 
-    def _keyword_based(self, all_data, query, query_embeddings):
+    def _cached_query_embeddings(self, queries: list[str]) -> tuple[list[list[float] | None], list[str]]:
+        """Look up the embeddings of queries by their cache keys in the in-process and on-disk caches.
+
+        Returns:
+            tuple[list[list[float] | None], list[str]]: The embedding of every query (None on a miss)
+                and the distinct queries that still need to be embedded.
+        """
+        embeddings = [None] * len(queries)
+        if self._embedding_cache is not None:
+            embeddings = [self._embedding_cache.get((self.embedding_model, query)) for query in queries]
+
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        if missing and self.query_embedding_cache is not None:
+            found = dict(zip(missing, self.query_embedding_cache.get_many(self.embedding_model, missing)))
+            embeddings = [embedding if embedding is not None else found[query] for query, embedding in zip(queries, embeddings)]
+            missing = [query for query in missing if found[query] is None]
+            self._remember_query_embeddings({query: embedding for query, embedding in found.items() if embedding is not None})
+
+        return embeddings, missing
+
+    def _remember_query_embeddings(self, embeddings: dict[str, list[float]], persist: bool = False) -> None:
+        """Store the embeddings of queries by their cache keys in the in-process cache, and on disk if `persist`."""
+        if self._embedding_cache is not None:
+            for query, embedding in embeddings.items():
+                self._embedding_cache.put((self.embedding_model, query), embedding)
+        if persist and embeddings and self.query_embedding_cache is not None:
+            self.query_embedding_cache.put_many(self.embedding_model, list(embeddings), list(embeddings.values()))
+
+    def _embed_queries(self, queries: list[str], keys: list[str] = None) -> list[list[float]]:
+        """Get the embeddings of queries, embedding all cache misses in a single request.
+
+        Args:
+            queries (list[str]): The queries, embedded as they are.
+            keys (list[str]): The cache keys of the queries, the queries themselves by default.
+        """
+        keys = keys if keys is not None else queries
+        embeddings, missing = self._cached_query_embeddings(keys)
+        if missing:
+            texts = dict(zip(keys, queries))
+            metrics.increment("retriever.queries_embedded", len(missing))
+            with metrics.span("retriever.embedding_request"):
+                response = self.llm_client.client.embeddings.create(
+                    input=[texts[key] for key in missing],
+                    model=self.embedding_model
+                )
+            computed = dict(zip(missing, (item.embedding for item in sorted(response.data, key=lambda item: item.index))))
+            self._remember_query_embeddings(computed, persist=True)
+            embeddings = [embedding if embedding is not None else computed[key] for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    async def _aembed_queries(self, queries: list[str], keys: list[str] = None) -> list[list[float]]:
+        """Get the embeddings of queries like `_embed_queries`, with the asynchronous client."""
+        keys = keys if keys is not None else queries
+        embeddings, missing = await asyncio.to_thread(self._cached_query_embeddings, keys)
+        if missing:
+            texts = dict(zip(keys, queries))
+            metrics.increment("retriever.queries_embedded", len(missing))
+            with metrics.span("retriever.embedding_request"):
+                response = await self.llm_client.async_client.embeddings.create(
+                    input=[texts[key] for key in missing],
+                    model=self.embedding_model
+                )
+            computed = dict(zip(missing, (item.embedding for item in sorted(response.data, key=lambda item: item.index))))
+            await asyncio.to_thread(self._remember_query_embeddings, computed, True)
+            embeddings = [embedding if embedding is not None else computed[key] for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    def _fetch(self, hits: list[list[tuple[str, float]]]) -> list[list[dict]]:
+        """Fetch the documents and metadata of the ranked chunk IDs of several queries in a single call."""
+        unique_ids = list(dict.fromkeys(chunk_id for query_hits in hits for chunk_id, _ in query_hits))
+        if not unique_ids:
+            return [[] for _ in hits]
+
+        with metrics.span("retriever.fetch"):
+            winners = self.db_client.get(
+                ids=unique_ids,
+                include=["documents", "metadatas"]
+            )
+        metrics.increment("retriever.chunks_fetched", len(unique_ids))
+        positions = {chunk_id: i for i, chunk_id in enumerate(winners["ids"])}
+
+        all_docs = []
+        for query_hits in hits:
+            retrieved_docs = []
+            for chunk_id, score in query_hits:
+                doc_idx = positions.get(chunk_id)
+                if doc_idx is None:
+                    continue
+                retrieved_docs.append({
+                    "id": chunk_id,
+                    "document": winners["documents"][doc_idx],
+                    "metadata": winners["metadatas"][doc_idx],
+                    "score": score,
+                    "rank": len(retrieved_docs) + 1
+                })
+            all_docs.append(retrieved_docs)
+
+        return all_docs
+
+    def _current_vector_index(self) -> VectorIndex:
+        """The vector index, rebuilt from the database if the collection changed since it was last used."""
+        version = self.db_client.version
+        with self._lock:
+            if self._vector_index_version is None:
+                self._vector_index_version = version
+            elif self._vector_index_version != version:
+                with metrics.span("retriever.vector_index_rebuild"):
+                    self.vector_index = self.vector_index.rebuild(self.db_client)
+                logger.info(f"Rebuilt the vector index at version {version}")
+                self._vector_index_version = version
+            return self.vector_index
+
+    def _filter_ids(self, where: dict | None) -> list[str] | None:
+        """The IDs of the chunks matching a metadata filter, looked up by the store, None without a filter."""
+        if not where:
+            return None
+        with metrics.span("retriever.filter"):
+            ids = self.db_client.get(where=where, include=[])["ids"]
+        metrics.increment("retriever.filter_matches", len(ids))
+        return ids
+
+    def _vector_hits(self, query_embeddings: list[list[float]], top_k: int, where: dict = None) -> list[list[tuple[str, float]]]:
+        """Get the (chunk ID, score) pairs nearest to each query embedding, scoring all queries at once.
+
+        Filtered queries are answered by the store, which only scores the chunks matching the filter.
+        """
+        if self.vector_index is not None and not where:
+            with metrics.span("retriever.vector_search"):
+                ids, scores = self._current_vector_index().search(np.asarray(query_embeddings, dtype=np.float32), top_k)
+            return [
+                [(chunk_id, float(score)) for chunk_id, score in zip(row_ids, row_scores) if np.isfinite(score)]
+                for row_ids, row_scores in zip(ids, scores)
+            ]
+
+        with metrics.span("retriever.vector_search"):
+            results = self.db_client.query(query_embeddings, top_k, where=where, include=[])
+        return [list(zip(row_ids, row_scores)) for row_ids, row_scores in zip(results["ids"], results["scores"])]
+
+    def _keyword_based(self, queries: list[str], where: dict = None) -> list[list[dict]]:
         """Retrieve the data from the database using keyword-based retrieval."""
-        documents = all_data["documents"]
-        metadatas = all_data["metadatas"]
-    
-        # Preprocess documents (tokenization + stemming)
-        stemmer = Stemmer.Stemmer("english")
-    
-        def _preprocess_text(text):
-            # Tokenize and stem
-            tokens = text.lower().split()
-            stemmed_tokens = stemmer.stemWords(tokens)
-            return stemmed_tokens
-    
-        # Preprocess all documents
-        corpus_tokens = [_preprocess_text(doc) for doc in documents]
-        
-        # Preprocess the query (BM25 needs tokens, not embeddings)
-        query_tokens = _preprocess_text(query)
-
-        # Create and index the BM25 retriever
-        retriever = bm25s.BM25()
-        retriever.index(corpus_tokens)
-        
-        results, scores = retriever.retrieve(bm25s.tokenize([query], stopwords="en"), k=self.top_k)
-
-        retrieved_docs = []
-        for i, (doc_idx, score) in enumerate(zip(results[0], scores[0])):
-            retrieved_docs.append({
-                "document": documents[doc_idx],
-                "metadata": metadatas[doc_idx],
-                "score": float(score),
-                "rank": i + 1
-            })
-    
-        return retrieved_docs
-
-    def _semantic_search(self, all_data, query_embeddings):
+        ids = self._filter_ids(where)
+        with metrics.span("retriever.keyword_search"):
+            hits = self.keyword_index.search_many(queries, self._n_candidates(), ids=ids)
+        return self._fetch(hits)
+
+    def _semantic_search(self, query_embeddings: list[list[float]], where: dict = None) -> list[list[dict]]:
         """Retrieve the data from the database using semantic search."""
-        pass
-    
-    def _hybrid(self, all_data, query_embeddings):
-        """Retrieve the data from the database using hybrid retrieval."""
-        pass
-    
-    def retrieve(self, query: str):
-        """Retrieve the data from the database using the retrieval method."""
-
-        # vectorize the query
-        query_embeddings = self.llm_client.client.embeddings.create(
-            input=query,
-            model=self.embedding_model
-        )
-
-        all_data = self.db_client.collection.get(include=["documents", "metadatas"])
-        print(len(all_data["documents"]))
+        if self.vector_index is not None and not where:
+            return self._fetch(self._vector_hits(query_embeddings, self._n_candidates()))
+
+        # the store returns the documents along with the neighbours in a single call
+        with metrics.span("retriever.vector_search"):
+            results = self.db_client.query(query_embeddings, self._n_candidates(), where=where, include=["documents", "metadatas"])
+
+        all_docs = []
+        for ids, documents, metadatas, scores in zip(results["ids"], results["documents"], results["metadatas"], results["scores"]):
+            all_docs.append([
+                {
+                    "id": chunk_id,
+                    "document": document,
+                    "metadata": metadata,
+                    "score": score,
+                    "rank": i + 1
+                }
+                for i, (chunk_id, document, metadata, score) in enumerate(zip(ids, documents, metadatas, scores))
+            ])
+
+        return all_docs
 
+    def _hybrid(self, queries: list[str], query_embeddings: list[list[float]], where: dict = None) -> list[list[dict]]:
+        """Retrieve the data from the database using hybrid retrieval.
+
+        The keyword and vector rankings are fused with reciprocal-rank fusion.
+        """
+        n_results = self._n_candidates()
+        n_candidates = n_results * HYBRID_CANDIDATES_PER_RESULT
+        ids = self._filter_ids(where)
+        with metrics.span("retriever.keyword_search"):
+            keyword_hits = self.keyword_index.search_many(queries, n_candidates, ids=ids)
+        vector_hits = self._vector_hits(query_embeddings, n_candidates, where=where)
+
+        fused = []
+        for query_keyword_hits, query_vector_hits in zip(keyword_hits, vector_hits):
+            rankings = [[chunk_id for chunk_id, _ in query_keyword_hits], [chunk_id for chunk_id, _ in query_vector_hits]]
+            fused.append(reciprocal_rank_fusion(rankings, k=RRF_K)[:n_results])
+        return self._fetch(fused)
+
+    def _search(
+            self,
+            queries: list[str],
+            query_embeddings: list[list[float]] | None,
+            where: dict = None,
+            keys: list[str] = None
+        ) -> list[list[dict]]:
+        """Run the retrieval method over a batch of queries, then the reranker (caching by `keys`) if there is one."""
         if self.retrieval_method == "keyword_based":
-            return self._keyword_based(all_data, query, query_embeddings)
+            results = self._keyword_based(queries, where)
         elif self.retrieval_method == "semantic_search":
-            return self._semantic_search(all_data, query_embeddings)
+            results = self._semantic_search(query_embeddings, where)
         elif self.retrieval_method == "hybrid":
-            return self._hybrid(all_data, query_embeddings)
+            results = self._hybrid(queries, query_embeddings, where)
         else:
             raise ValueError(f"Invalid retrieval method: {self.retrieval_method}")
+        return self._rerank(queries, results, keys)
+
+    def _n_candidates(self) -> int:
+        """The number of results retrieved per query, more than top_k when they are re-ranked."""
+        return max(self.top_k, self.rerank_candidates) if self.reranker is not None else self.top_k
+
+    def _rerank(self, queries: list[str], results: list[list[dict]], keys: list[str] = None) -> list[list[dict]]:
+        """Re-score the candidates of every query with the reranker and keep the best top_k.
+
+        The uncached (query, candidate) pairs of all queries are scored in batches of the reranker's
+        batch size until the re-ranking budget is spent. Scores are cached by the `keys` of the queries,
+        the queries themselves by default.
+        """
+        if self.reranker is None:
+            return results
+        keys = keys if keys is not None else queries
+
+        with metrics.span("retriever.rerank"):
+            version = self.db_client.version if self._rerank_cache is not None else None
+            scores, pending = {}, []
+            for i, (key, docs) in enumerate(zip(keys, results)):
+                for j, doc in enumerate(docs):
+                    score = self._rerank_cache.get((key, doc["id"], version)) if self._rerank_cache is not None else None
+                    if score is not None:
+                        scores[i, j] = score
+                    else:
+                        pending.append((i, j))
+            metrics.increment("retriever.rerank_cache_hits", len(scores))
+
+            deadline = time.perf_counter() + self.rerank_budget if self.rerank_budget is not None else None
+            for start in range(0, len(pending), self.reranker.batch_size):
+                if deadline is not None and time.perf_counter() >= deadline:
+                    logger.warning(f"Re-ranking budget spent, {len(pending) - start} candidates keep their retrieval order")
+                    metrics.increment("retriever.rerank_budget_exceeded")
+                    break
+                batch = pending[start:start + self.reranker.batch_size]
+                batch_scores = self.reranker.score([(queries[i], results[i][j]["document"]) for i, j in batch])
+                metrics.increment("retriever.pairs_reranked", len(batch))
+                for (i, j), score in zip(batch, batch_scores):
+                    if score is None:
+                        continue
+                    scores[i, j] = score
+                    if self._rerank_cache is not None:
+                        self._rerank_cache.put((keys[i], results[i][j]["id"], version), score)
+
+        reranked = []
+        for i, docs in enumerate(results):
+            # sorted is stable, so ties and unscored candidates keep their retrieval order
+            scored = sorted((j for j in range(len(docs)) if (i, j) in scores), key=lambda j: -scores[i, j])
+            unscored = [j for j in range(len(docs)) if (i, j) not in scores]
+            reranked.append([
+                {**docs[j], "rerank_score": scores.get((i, j)), "rank": rank}
+                for rank, j in enumerate((scored + unscored)[:self.top_k], start=1)
+            ])
+        return reranked
+
+    def _cached_results(self, queries: list[str], where: dict = None) -> tuple[list[list[dict] | None], list, list[str]]:
+        """Look up the results of queries by their normalized cache keys under a metadata filter in the result cache.
+
+        Returns:
+            tuple[list[list[dict] | None], list, list[str]]: The cached results of every query (None on a miss),
+                their cache keys and the distinct queries that still need to be searched.
+        """
+        keys = [None] * len(queries)
+        results = [None] * len(queries)
+        metrics.increment("retriever.queries", len(queries))
+        if self._result_cache is not None:
+            version = self.db_client.version
+            filter_key = json.dumps(where, sort_keys=True) if where else None
+            keys = [(query, self.retrieval_method, self.top_k, filter_key, version) for query in queries]
+            results = [self._result_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(query for query, cached in zip(queries, results) if cached is None))
+        metrics.increment("retriever.result_cache_hits", len(queries) - sum(cached is None for cached in results))
+        return results, keys, missing
+
+    def _merge_results(self, queries: list[str], cached: list, keys: list, missing: list[str], found: list[list[dict]]) -> list[list[dict]]:
+        """Cache the results of the searched queries and combine them with the cached ones."""
+        found = dict(zip(missing, found))
+        results = []
+        for query, key, docs in zip(queries, keys, cached):
+            if docs is None:
+                docs = found[query]
+                if key is not None:
+                    self._result_cache.put(key, [dict(doc) for doc in docs])
+            # callers get their own copies, so they cannot alter the cache
+            results.append([dict(doc) for doc in docs])
+        return results
+
+    def retrieve(self, query: str, where: dict = None):
+        """Retrieve the data from the database using the retrieval method.
+
+        Results are cached per (query, method, top_k, filter, collection version), so they are invalidated
+        as soon as the Vectorizer writes to the collection.
+
+        Args:
+            query (str): The query.
+            where (dict): A metadata filter the results must match, e.g. {"file_name": "notes.md"} or
+                {"file_type": {"$in": ["md", "txt"]}}, in the filter syntax of the store.
+        """
+        return self.retrieve_many([query], where=where)[0]
+
+    def retrieve_many(self, queries: list[str], where: dict = None) -> list[list[dict]]:
+        """Retrieve the data of a batch of queries.
+
+        The uncached queries are embedded in a single request and scored against the index in a
+        single pass, which is much cheaper than retrieving them one by one.
+
+        A metadata filter is pushed down to the store: semantic search only scores the matching chunks,
+        and keyword search masks the BM25 scores of the rest.
+
+        Args:
+            queries (list[str]): The queries.
+            where (dict): A metadata filter the results of every query must match, see `retrieve`.
+
+        Returns:
+            list[list[dict]]: The retrieved documents of every query, in the order of the queries.
+        """
+        with metrics.request("retriever.retrieve_many", method=self.retrieval_method):
+            query_keys, texts = self._cache_keys(queries)
+            cached, keys, missing = self._cached_results(query_keys, where)
+
+            found = []
+            if missing:
+                missing_queries = [texts[key] for key in missing]
+                with metrics.span("retriever.embed_queries"):
+                    embeddings = self._embed_queries(missing_queries, missing) if self._needs_embeddings() else None
+                found = self._search(missing_queries, embeddings, where, keys=missing)
+            return self._merge_results(query_keys, cached, keys, missing, found)
+
+    async def aretrieve(self, query: str, where: dict = None) -> list[dict]:
+        """Retrieve the data from the database without blocking the event loop.
+
+        The query is embedded with the asynchronous client and the index and database calls run in
+        a worker thread, so a server can handle many queries concurrently from a single thread.
+        """
+        return (await self.aretrieve_many([query], where=where))[0]
+
+    async def aretrieve_many(self, queries: list[str], where: dict = None) -> list[list[dict]]:
+        """Retrieve the data of a batch of queries without blocking the event loop, see `retrieve_many`.
+
+        A profiled request (see `Metrics.configure`) profiles the event loop thread, not the worker threads.
+        """
+        with metrics.request("retriever.aretrieve_many", method=self.retrieval_method):
+            query_keys, texts = self._cache_keys(queries)
+            cached, keys, missing = await asyncio.to_thread(self._cached_results, query_keys, where)
+
+            found = []
+            if missing:
+                missing_queries = [texts[key] for key in missing]
+                with metrics.span("retriever.embed_queries"):
+                    embeddings = await self._aembed_queries(missing_queries, missing) if self._needs_embeddings() else None
+                found = await asyncio.to_thread(self._search, missing_queries, embeddings, where, missing)
+            return self._merge_results(query_keys, cached, keys, missing, found)
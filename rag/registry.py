@@ -0,0 +1,198 @@
+"""
+This module holds the clients shared by every LLMConfig, Vectorizer and Retriever of a process.
+
+LLM clients are keyed by (base URL, API key) and share one HTTP connection pool each, database
+clients are keyed by the absolute path of the database. The clients are created on first use,
+and again in a forked process, which must not reuse the connections of its parent.
+"""
+
+import os
+import logging
+import threading
+import weakref
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .schemas import HTTPPoolSchema
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """Process-wide, thread-safe registry of shared LLM and database clients"""
+
+    def __init__(self, http: "HTTPPoolSchema" = None):
+        """
+        Initialize the ClientRegistry class.
+
+        Args:
+            http (HTTPPoolSchema): The connection pool and timeouts of the LLM clients.
+        """
+        self._http = http
+        self._lock = threading.RLock()
+        self._reset()
+
+    @property
+    def http(self) -> "HTTPPoolSchema":
+        """The connection pool and timeouts of the LLM clients."""
+        if self._http is None:
+            # pydantic is slow to import, the settings are only needed when a client is created
+            from .schemas import HTTPPoolSchema
+            self._http = HTTPPoolSchema()
+        return self._http
+
+    def _reset(self) -> None:
+        """Forget every client, without closing them."""
+        self._pid = os.getpid()
+        self._llm_clients = {}
+        # async clients are bound to the event loop they are used in
+        self._async_llm_clients = weakref.WeakKeyDictionary()
+        self._unbound_async_llm_clients = {}
+        self._chroma_clients = {}
+        self._collections = {}
+
+    def _check_pid(self) -> None:
+        """Drop the clients inherited from a parent process."""
+        if self._pid != os.getpid():
+            logger.info("Process was forked, creating new clients")
+            self._reset()
+
+    def configure(self, **settings) -> None:
+        """Change the connection pool and timeouts of the LLM clients.
+
+        The clients created so far are closed, new clients are created with the new settings.
+
+        Args:
+            **settings: The fields of HTTPPoolSchema to change, e.g. `max_connections` or `timeout`.
+        """
+        with self._lock:
+            self._http = self.http.model_copy(update=settings)
+            self.close()
+
+    def llm_client(self, base_url: str, api_key: str):
+        """Get the shared OpenAI-compatible client of an endpoint.
+
+        Args:
+            base_url (str): The base URL of the API.
+            api_key (str): The API key.
+
+        Returns:
+            OpenAI: The client.
+        """
+        with self._lock:
+            self._check_pid()
+            key = (base_url, api_key)
+            if key not in self._llm_clients:
+                # openai is slow to import, so it is only imported when a client is needed
+                from openai import OpenAI, DefaultHttpxClient
+
+                pool = self._pool()
+                self._llm_clients[key] = OpenAI(
+                    base_url=base_url,
+                    api_key=api_key,
+                    timeout=pool["timeout"],
+                    max_retries=self.http.max_retries,
+                    http_client=DefaultHttpxClient(**pool),
+                )
+                logger.info(f"Created LLM client for {base_url}")
+            return self._llm_clients[key]
+
+    def async_llm_client(self, base_url: str, api_key: str):
+        """Get the shared asynchronous client of an endpoint, for the running event loop.
+
+        Args:
+            base_url (str): The base URL of the API.
+            api_key (str): The API key.
+
+        Returns:
+            AsyncOpenAI: The client.
+        """
+        import asyncio
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        with self._lock:
+            self._check_pid()
+            if loop is None:
+                clients = self._unbound_async_llm_clients
+            else:
+                clients = self._async_llm_clients.setdefault(loop, {})
+            key = (base_url, api_key)
+            if key not in clients:
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+                pool = self._pool()
+                clients[key] = AsyncOpenAI(
+                    base_url=base_url,
+                    api_key=api_key,
+                    timeout=pool["timeout"],
+                    max_retries=self.http.max_retries,
+                    http_client=DefaultAsyncHttpxClient(**pool),
+                )
+            return clients[key]
+
+    def chroma_client(self, path: str):
+        """Get the shared persistent chroma client of a database.
+
+        Args:
+            path (str): The path of the database.
+
+        Returns:
+            chromadb.ClientAPI: The client.
+        """
+        with self._lock:
+            self._check_pid()
+            path = os.path.abspath(path)
+            if path not in self._chroma_clients:
+                # chromadb is slow to import, so it is only imported when the database is used
+                import chromadb
+
+                self._chroma_clients[path] = chromadb.PersistentClient(path=path)
+                logger.info(f"Opened chroma database at {path}")
+            return self._chroma_clients[path]
+
+    def chroma_collection(self, path: str, name: str):
+        """Get the shared handle of a collection, creating the collection if it does not exist.
+
+        Args:
+            path (str): The path of the database.
+            name (str): The name of the collection.
+
+        Returns:
+            chromadb.Collection: The collection.
+        """
+        with self._lock:
+            client = self.chroma_client(path)
+            key = (os.path.abspath(path), name)
+            if key not in self._collections:
+                self._collections[key] = client.get_or_create_collection(name=name)
+            return self._collections[key]
+
+    def close(self) -> None:
+        """Close the HTTP connections of the LLM clients and forget every client."""
+        with self._lock:
+            if self._pid == os.getpid():
+                for client in self._llm_clients.values():
+                    client.close()
+            # async clients can only be closed from their event loop, their connections are dropped
+            self._reset()
+
+    def _pool(self) -> dict:
+        """The connection limits and timeouts of the HTTP clients."""
+        import httpx
+
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.http.max_connections,
+                max_keepalive_connections=self.http.max_keepalive_connections,
+                keepalive_expiry=self.http.keepalive_expiry,
+            ),
+            "timeout": httpx.Timeout(self.http.timeout, connect=self.http.connect_timeout),
+        }
+
+
+# the registry of the process
+registry = ClientRegistry()
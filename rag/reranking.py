@@ -0,0 +1,190 @@
+"""
+This module re-scores retrieved chunks against their query, as a second stage after retrieval.
+It supports the following rerankers: cross_encoder, llm.
+
+A reranker scores (query, document) pairs in batches. The Retriever over-fetches candidates,
+re-scores them within a latency budget and keeps the best top_k.
+"""
+
+import re
+import json
+import logging
+import threading
+
+from .llm_config import LLMConfig
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+LLM_RERANK_PROMPT = """Rate how relevant each passage is to the query, from 0 (irrelevant) to 10 (answers it).
+Answer with a JSON array of {n} numbers, one per passage, in the order of the passages, and nothing else.
+
+Query: {query}
+
+{passages}"""
+
+
+class Reranker:
+    """Scores the relevance of documents to queries, higher is more relevant"""
+
+    name = None
+
+    def __init__(self, batch_size: int = 32):
+        """
+        Initialize the Reranker class.
+
+        Args:
+            batch_size (int): The number of (query, document) pairs scored together.
+        """
+        self.batch_size = batch_size
+
+    def score(self, pairs: list[tuple[str, str]]) -> list[float | None]:
+        """Score a batch of (query, document) pairs.
+
+        Args:
+            pairs (list[tuple[str, str]]): The queries and documents, at most `batch_size` pairs.
+
+        Returns:
+            list[float | None]: The score of every pair, None for the pairs that could not be scored.
+        """
+        raise NotImplementedError
+
+
+class CrossEncoderReranker(Reranker):
+    """A local cross-encoder model reading the query and the document together"""
+
+    name = "cross_encoder"
+
+    def __init__(
+            self,
+            model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+            batch_size: int = 32,
+            device: str = None,
+            encoder=None
+        ):
+        """
+        Initialize the CrossEncoderReranker class.
+
+        Args:
+            model (str): The cross-encoder model, requires the optional `sentence-transformers` package.
+            batch_size (int): The number of pairs scored together.
+            device (str): The device the model runs on, e.g. "cpu" or "cuda", chosen automatically by default.
+            encoder: A model with the `predict(pairs)` method of sentence-transformers' CrossEncoder,
+                used instead of loading `model`.
+        """
+        super().__init__(batch_size)
+        self.model = model
+        self.device = device
+        self._encoder = encoder
+        self._lock = threading.Lock()
+
+    @property
+    def encoder(self):
+        """The cross-encoder, loaded on first use."""
+        with self._lock:
+            if self._encoder is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError as e:
+                    raise ImportError(
+                        "The cross_encoder reranker requires sentence-transformers: pip install sentence-transformers"
+                    ) from e
+                self._encoder = CrossEncoder(self.model, device=self.device)
+        return self._encoder
+
+    def score(self, pairs: list[tuple[str, str]]) -> list[float | None]:
+        if not pairs:
+            return []
+        return [float(score) for score in self.encoder.predict([list(pair) for pair in pairs], batch_size=self.batch_size)]
+
+
+class LLMReranker(Reranker):
+    """The chat model of an LLMConfig, rating all candidates of a query in a single request"""
+
+    name = "llm"
+
+    def __init__(
+            self,
+            llm_client: LLMConfig = None,
+            model: str = None,
+            batch_size: int = 20,
+            max_document_chars: int = 2000
+        ):
+        """
+        Initialize the LLMReranker class.
+
+        Args:
+            llm_client (LLMConfig): The LLM client, defaults to the openai client created on first use.
+            model (str): The chat model, defaults to the model of the client's configuration.
+            batch_size (int): The number of documents rated per request.
+            max_document_chars (int): Documents are truncated to this many characters in the prompt.
+        """
+        super().__init__(batch_size)
+        self._llm_client = llm_client
+        self._model = model
+        self.max_document_chars = max_document_chars
+
+    @property
+    def llm_client(self) -> LLMConfig:
+        if self._llm_client is None:
+            self._llm_client = LLMConfig(client_name="openai")
+        return self._llm_client
+
+    @property
+    def model(self) -> str:
+        return self._model or self.llm_client.config["model"]
+
+    def score(self, pairs: list[tuple[str, str]]) -> list[float | None]:
+        # the documents of a query are rated together, in one request per query of the batch
+        by_query: dict[str, list[int]] = {}
+        for i, (query, _) in enumerate(pairs):
+            by_query.setdefault(query, []).append(i)
+
+        scores = [None] * len(pairs)
+        for query, positions in by_query.items():
+            documents = [pairs[i][1] for i in positions]
+            for i, score in zip(positions, self._rate(query, documents)):
+                scores[i] = score
+        return scores
+
+    def _rate(self, query: str, documents: list[str]) -> list[float | None]:
+        """Rate the documents of a query in a single request, None for all of them if the answer is unusable."""
+        passages = "\n\n".join(
+            f"Passage {i + 1}:\n{document[:self.max_document_chars]}" for i, document in enumerate(documents)
+        )
+        try:
+            response = self.llm_client.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": LLM_RERANK_PROMPT.format(n=len(documents), query=query, passages=passages)}],
+                temperature=0,
+            )
+            answer = response.choices[0].message.content or ""
+            match = re.search(r"\[.*?\]", answer, re.DOTALL)
+            ratings = json.loads(match.group(0)) if match else None
+            if not isinstance(ratings, list) or len(ratings) != len(documents):
+                raise ValueError(f"expected {len(documents)} ratings, got: {answer[:200]!r}")
+            return [float(rating) for rating in ratings]
+        except Exception as e:
+            logger.error(f"Error re-ranking {len(documents)} documents with {self.model}: {e}")
+            return [None] * len(documents)
+
+
+RERANKERS = {
+    "cross_encoder": CrossEncoderReranker,
+    "llm": LLMReranker,
+}
+
+
+def get_reranker(name: str, **kwargs) -> Reranker:
+    """Create a reranker.
+
+    Args:
+        name (str): The reranker. Options: cross_encoder, llm
+        **kwargs: The arguments of the reranker, e.g. `model` or `batch_size`.
+
+    Returns:
+        Reranker: The reranker.
+    """
+    if name not in RERANKERS:
+        raise ValueError(f"Unsupported reranker: {name}. Supported rerankers are: {list(RERANKERS.keys())}")
+    return RERANKERS[name](**kwargs)
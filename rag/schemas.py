@@ -1,11 +1,38 @@
 from pydantic import BaseModel, Field
-from typing import Any
 
-class DocumentSchema(BaseModel):
+class FileRecordSchema(BaseModel):
     """
-    Schema for the document provided by the user.
+    Schema for the manifest record of an ingested file.
     """
-    file_name: str = Field(..., description="The name of the file")
-    metadata: dict[str, Any] = Field(..., description="The metadata of the file")
-    chunks: list[str] = Field(..., description="The chunks of the file")
-    embeddings: list[list[float]] = Field(..., description="Embeddings generated by the embedding model")
+    path: str = Field(..., description="The path of the file")
+    size: int = Field(..., description="The size of the file in bytes")
+    mtime: float = Field(..., description="The modification time of the file")
+    content_hash: str = Field(..., description="The sha256 hash of the file content")
+    chunk_count: int = Field(0, description="The number of chunks stored for the file")
+
+
+class ManifestDiffSchema(BaseModel):
+    """
+    Schema for the changes between the data directory and the manifest.
+    """
+    added: list[str] = Field(default_factory=list, description="The files not ingested yet")
+    modified: list[str] = Field(default_factory=list, description="The files whose content changed")
+    deleted: list[str] = Field(default_factory=list, description="The ingested files that no longer exist")
+    unchanged: list[str] = Field(default_factory=list, description="The files whose content did not change")
+
+    @property
+    def changed(self) -> list[str]:
+        """The files that need to be (re-)ingested."""
+        return self.added + self.modified
+
+
+class HTTPPoolSchema(BaseModel):
+    """
+    Schema for the connection pool and timeouts of the shared LLM clients.
+    """
+    max_connections: int = Field(100, description="The maximum number of concurrent connections per client")
+    max_keepalive_connections: int = Field(20, description="The maximum number of idle connections kept open")
+    keepalive_expiry: float = Field(30.0, description="The number of seconds an idle connection is kept open")
+    timeout: float = Field(60.0, description="The timeout of a request in seconds")
+    connect_timeout: float = Field(5.0, description="The timeout of establishing a connection in seconds")
+    max_retries: int = Field(2, description="The number of retries of the client on connection errors and rate limits")
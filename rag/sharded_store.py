@@ -0,0 +1,310 @@
+"""
+Sharded vector store: the chunks of a collection are spread over several collections of a
+backend (the shards), by a hash of the chunk ID or by a metadata field such as the tenant or
+the file type.
+
+A query runs on every shard in parallel and the per-shard top_k are merged into the global
+top_k. A metadata filter on the shard key (e.g. {"tenant": "acme"}) only runs on the matching
+shards, and every shard is a regular collection that can be rebuilt on its own.
+"""
+
+import os
+import re
+import json
+import heapq
+import hashlib
+import logging
+import threading
+import numpy as np
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from .vector_store import VectorStore, DEFAULT_COLLECTION_NAME, get_vector_store
+from .metrics import metrics
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+# the shard of the chunks without the metadata field sharded by
+DEFAULT_SHARD = "default"
+
+_SHARD_NAME = re.compile(r"[^A-Za-z0-9_-]")
+# the collection names chroma accepts: 3 to 63 characters, starting and ending with a letter or digit
+_COLLECTION_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{1,61}[A-Za-z0-9]")
+_MAX_NAME_LENGTH = 63
+_HASH_LENGTH = 8
+
+
+def hash_shard(chunk_id: str, n_shards: int) -> int:
+    """The shard of a chunk ID, stable across processes and runs."""
+    return int.from_bytes(hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest(), "little") % n_shards
+
+
+def shard_name(collection_name: str, key: str) -> str:
+    """The name of the collection of a shard.
+
+    A key that is not a valid name as it is, e.g. "a b" or a long file type, is sanitized and suffixed
+    with a short hash of the key, so keys that sanitize alike (such as "a b" and "a_b") get their own shard.
+
+    Raises:
+        ValueError: If the collection name leaves no valid name for the shards.
+    """
+    name = f"{collection_name}_{key}"
+    if _SHARD_NAME.search(key) is None and _COLLECTION_NAME.fullmatch(name):
+        return name
+
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=_HASH_LENGTH // 2).hexdigest()
+    room = _MAX_NAME_LENGTH - len(collection_name) - len(digest) - 2
+    name = f"{collection_name}_{_SHARD_NAME.sub('_', key)[:max(room, 0)]}_{digest}"
+    if room < 0 or ".." in name or not _COLLECTION_NAME.fullmatch(name):
+        raise ValueError(
+            f"Invalid collection name {collection_name!r} for a sharded store: the shards are named after it, "
+            f"it must start with a letter or digit, contain only letters, digits, '.', '_' and '-' "
+            f"and have at most {_MAX_NAME_LENGTH - _HASH_LENGTH - 2} characters"
+        )
+    return name
+
+
+def shard_values(where: dict | None, field: str) -> set[str] | None:
+    """The values of a metadata field a filter restricts the chunks to.
+
+    Returns:
+        set[str] | None: The values, None if the filter does not restrict the field.
+    """
+    if not where:
+        return None
+
+    restrictions = []
+    for key, value in where.items():
+        if key == "$and":
+            restrictions.extend(values for values in (shard_values(condition, field) for condition in value) if values is not None)
+        elif key == "$or":
+            values = [shard_values(condition, field) for condition in value]
+            if values and all(v is not None for v in values):
+                restrictions.append(set().union(*values))
+        elif key == field:
+            operator, operand = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+            if operator == "$eq":
+                restrictions.append({str(operand)})
+            elif operator == "$in":
+                restrictions.append({str(v) for v in operand})
+    return set.intersection(*restrictions) if restrictions else None
+
+
+class ShardedVectorStore(VectorStore):
+    """Vector store spreading a collection over shards of a backend, searched in parallel"""
+
+    def __init__(
+            self,
+            backend: str = "local",
+            path: str = None,
+            collection_name: str = DEFAULT_COLLECTION_NAME,
+            shard_by: str = "hash",
+            n_shards: int = 4,
+            max_workers: int = None
+        ):
+        """
+        Initialize the ShardedVectorStore class.
+
+        Args:
+            backend (str): The backend of the shards. Options: chroma, local
+            path (str): The directory of the shards, defaults to the backend's directory.
+            collection_name (str): The name of the collection, the shards are named after it (see `shard_name`).
+            shard_by (str): "hash" to spread the chunks evenly by chunk ID, or a metadata field, e.g. "tenant"
+                (see `Vectorizer(tenant=...)`) or "file_type", for one shard per value.
+            n_shards (int): The number of shards when sharding by hash.
+            max_workers (int): The number of shards searched at the same time, one per shard by default.
+        """
+        self.backend = backend
+        self.shard_by = shard_by
+        self.n_shards = n_shards
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._shards: dict[str, VectorStore] = {}
+        self._executor = None
+        # the shards written since the last version bump
+        self._dirty: set[str] = set()
+        # the shard keys of a collection sharded by a metadata field, reloaded when the version changes
+        self._keys: list[str] = []
+        self._keys_version = None
+        # fail before the first shard is created
+        shard_name(collection_name, DEFAULT_SHARD)
+        if path is None:
+            path = get_vector_store(backend, collection_name=collection_name).path
+        super().__init__(path, collection_name)
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.path, f"{self.collection_name}.shards.json")
+
+    def shard_keys(self) -> list[str]:
+        """The keys of the shards: their index when sharding by hash, their metadata value otherwise."""
+        if self.shard_by == "hash":
+            return [str(i) for i in range(self.n_shards)]
+
+        version = self.version
+        with self._lock:
+            if self._keys_version != version:
+                try:
+                    with open(self._keys_path, "r") as f:
+                        keys = json.load(f)
+                except FileNotFoundError:
+                    keys = []
+                # shards created by this process and not saved yet are kept
+                self._keys = sorted(set(keys) | set(self._keys))
+                self._keys_version = version
+            return list(self._keys)
+
+    def shard(self, key: str) -> VectorStore:
+        """The store of a shard, e.g. to rebuild it or to query a single tenant.
+
+        Args:
+            key (str): The key of the shard, see `shard_keys`.
+        """
+        key = str(key)
+        with self._lock:
+            store = self._shards.get(key)
+            if store is None:
+                store = self._shards[key] = get_vector_store(
+                    self.backend, path=self.path, collection_name=shard_name(self.collection_name, key)
+                )
+            if self.shard_by != "hash" and key not in self._keys:
+                self._keys = sorted([*self._keys, key])
+                self._dirty.add(key)
+        return store
+
+    def _key(self, chunk_id: str, metadata: dict) -> str:
+        if self.shard_by == "hash":
+            return str(hash_shard(chunk_id, self.n_shards))
+        value = (metadata or {}).get(self.shard_by)
+        return DEFAULT_SHARD if value is None else str(value)
+
+    def _route(self, where: dict = None) -> list[str]:
+        """The keys of the shards a filter can match."""
+        keys = self.shard_keys()
+        if self.shard_by == "hash":
+            return keys
+        values = shard_values(where, self.shard_by)
+        return keys if values is None else [key for key in keys if key in values]
+
+    def _map(self, fn, keys: list[str]) -> list:
+        """Call `fn(key)` on the shard keys in parallel, the results in the order of the keys."""
+        if len(keys) <= 1:
+            return [fn(key) for key in keys]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers or max(len(keys), self.n_shards), thread_name_prefix="shard"
+                )
+            executor = self._executor
+        return list(executor.map(fn, keys))
+
+    def count(self) -> int:
+        return sum(self._map(lambda key: self.shard(key).count(), self.shard_keys()))
+
+    def upsert(self, ids: list[str], documents: list[str], embeddings, metadatas: list[dict]) -> None:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        positions: dict[str, list[int]] = {}
+        for i, (chunk_id, metadata) in enumerate(zip(ids, metadatas)):
+            positions.setdefault(self._key(chunk_id, metadata), []).append(i)
+
+        def upsert_shard(key: str) -> None:
+            rows = positions[key]
+            self.shard(key).upsert(
+                ids=[ids[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                embeddings=embeddings[rows],
+                metadatas=[metadatas[i] for i in rows],
+            )
+
+        keys = list(positions)
+        self._map(upsert_shard, keys)
+        with self._lock:
+            self._dirty.update(keys)
+
+    def delete(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        if self.shard_by == "hash":
+            by_shard: dict[str, list[str]] = {}
+            for chunk_id in ids:
+                by_shard.setdefault(self._key(chunk_id, None), []).append(chunk_id)
+            keys = list(by_shard)
+            self._map(lambda key: self.shard(key).delete(by_shard[key]), keys)
+        else:
+            # the shard of a chunk is only known from its metadata, every shard deletes the IDs it holds
+            keys = self.shard_keys()
+            self._map(lambda key: self.shard(key).delete(ids), keys)
+        with self._lock:
+            self._dirty.update(keys)
+
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = ("documents", "metadatas")) -> dict:
+        keys = self._route(where)
+        if ids is not None and self.shard_by == "hash":
+            requested = {self._key(chunk_id, None) for chunk_id in ids}
+            keys = [key for key in keys if key in requested]
+
+        parts = [part for part in self._map(lambda key: self.shard(key).get(ids=ids, where=where, include=include), keys) if part["ids"]]
+        results = {"ids": [chunk_id for part in parts for chunk_id in part["ids"]]}
+        for field in include:
+            if field == "embeddings":
+                arrays = [np.asarray(part["embeddings"], dtype=np.float32) for part in parts]
+                results[field] = np.concatenate(arrays) if arrays else np.empty((0, 0), dtype=np.float32)
+            else:
+                results[field] = [value for part in parts for value in part[field]]
+
+        if ids is not None:
+            # in the order of the requested IDs
+            positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+            order = sorted(range(len(results["ids"])), key=lambda i: positions[results["ids"][i]])
+            for field, values in results.items():
+                results[field] = values[order] if isinstance(values, np.ndarray) else [values[i] for i in order]
+        return results
+
+    def query(
+            self,
+            query_embeddings,
+            top_k: int,
+            where: dict = None,
+            include: list[str] = ("documents", "metadatas")
+        ) -> dict:
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        keys = self._route(where)
+        with metrics.span("sharded_store.query", shards=len(keys)):
+            parts = self._map(lambda key: self.shard(key).query(query_embeddings, top_k, where=where, include=include), keys)
+        metrics.increment("sharded_store.shards_queried", len(keys) * len(query_embeddings))
+
+        results = {"ids": [], "scores": [], **{field: [] for field in include}}
+        for q in range(len(query_embeddings)):
+            # every shard ranks its results best first, a heap merges them into the global ranking
+            rankings = [
+                [(-score, p, i) for i, score in enumerate(part["scores"][q])]
+                for p, part in enumerate(parts)
+            ]
+            merged = list(islice(heapq.merge(*rankings), top_k))
+            results["ids"].append([parts[p]["ids"][q][i] for _, p, i in merged])
+            results["scores"].append([-score for score, _, _ in merged])
+            for field in include:
+                results[field].append([parts[p][field][q][i] for _, p, i in merged])
+        return results
+
+    def bump_version(self) -> int:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            keys = list(self._keys)
+        # the readers of a written shard reload it
+        for key in dirty:
+            self.shard(key).bump_version()
+        if self.shard_by != "hash":
+            os.makedirs(self.path, exist_ok=True)
+            with open(self._keys_path + ".tmp", "w") as f:
+                json.dump(keys, f)
+            os.replace(self._keys_path + ".tmp", self._keys_path)
+        return super().bump_version()
+
+    def close(self) -> None:
+        """Stop the threads searching the shards."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,138 @@
+"""
+This module turns texts into the terms of the BM25 index, the same way for the corpus and the queries.
+
+Texts are tokenized in batches: their words are lowercased and split, and every distinct word of
+the batch is stemmed once, in a single call to the stemmer. The stems are memoized by the Tokenizer
+across batches, so once the vocabulary of a corpus has been seen, tokenizing is a dictionary lookup
+per word. The memo belongs to the Tokenizer instance: indexes and retrievers sharing one share it.
+"""
+
+import logging
+import threading
+import Stemmer
+import numpy as np
+from itertools import chain, repeat
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+# the English stopwords of bm25s, which is slow to import
+ENGLISH_STOPWORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "if", "in", "into", "is", "it", "no", "not",
+    "of", "on", "or", "such", "that", "the", "their", "then", "there", "these", "they", "this", "to", "was",
+    "will", "with",
+])
+
+
+class Tokenizer:
+    """Lowercases, splits, removes stopwords and stems texts in batches, with memoized stems"""
+
+    def __init__(
+            self,
+            language: str = "english",
+            stopwords: frozenset[str] = ENGLISH_STOPWORDS,
+            max_cached_words: int = 1_000_000
+        ):
+        """
+        Initialize the Tokenizer class.
+
+        Args:
+            language (str): The language of the Snowball stemmer.
+            stopwords (frozenset[str]): The lowercase words dropped from the texts.
+            max_cached_words (int): The number of memoized stems, the cache is cleared when it is full.
+        """
+        self.language = language
+        self.stemmer = Stemmer.Stemmer(language)
+        self.stopwords = stopwords
+        self.max_cached_words = max_cached_words
+        # word -> stem, None for stopwords
+        self._stems: dict[str, str | None] = {}
+        # word -> ID in the vocabulary of the last `encode`, -1 for stopwords
+        self._vocab = None
+        self._word_ids: dict[str, int] = {}
+        # the stemmer is not thread-safe
+        self._lock = threading.Lock()
+
+    @property
+    def config(self) -> dict:
+        """The settings the terms depend on, saved with an index to detect a change of tokenizer."""
+        return {"language": self.language, "stopwords": sorted(self.stopwords)}
+
+    def _split(self, texts: list[str]) -> tuple[list[str], np.ndarray]:
+        """The lowercase words of the texts, flattened, and the number of words of every text."""
+        words_per_text = [text.lower().split() for text in texts]
+        lengths = np.fromiter(map(len, words_per_text), dtype=np.int64, count=len(texts))
+        return list(chain.from_iterable(words_per_text)), lengths
+
+    def _stem(self, words: list[str]) -> list[str | None]:
+        """Stem distinct words in a single call, None for stopwords."""
+        stopwords = self.stopwords
+        return [None if word in stopwords else stem for word, stem in zip(words, self.stemmer.stemWords(words))]
+
+    def terms(self, texts: list[str]) -> tuple[list[str | None], np.ndarray]:
+        """The terms of a batch of texts, flattened.
+
+        Returns:
+            tuple[list[str | None], np.ndarray]: The stem of every word of the texts (None for stopwords),
+                and the number of words of every text.
+        """
+        words, lengths = self._split(texts)
+        with self._lock:
+            stems = self._stems
+            new_words = [word for word in dict.fromkeys(words) if word not in stems]
+            if new_words:
+                if len(stems) + len(new_words) > self.max_cached_words:
+                    stems.clear()
+                    new_words = list(dict.fromkeys(words))
+                stems.update(zip(new_words, self._stem(new_words)))
+            return list(map(stems.__getitem__, words)), lengths
+
+    def tokenize(self, text: str) -> list[str]:
+        """The terms of a text, without stopwords."""
+        return self.tokenize_many([text])[0]
+
+    def tokenize_many(self, texts: list[str]) -> list[list[str]]:
+        """The terms of every text, without stopwords."""
+        terms, lengths = self.terms(texts)
+        ends = np.cumsum(lengths).tolist()
+        return [[term for term in terms[start:end] if term is not None] for start, end in zip([0, *ends], ends)]
+
+    def encode(self, texts: list[str], vocab: dict[str, int], add: bool = True) -> list[np.ndarray]:
+        """The vocabulary IDs of the terms of every text, without stopwords.
+
+        Args:
+            texts (list[str]): The texts.
+            vocab (dict[str, int]): The vocabulary mapping terms to IDs.
+            add (bool): Whether to add the new terms to the vocabulary, in their order of appearance,
+                rather than dropping them.
+
+        Returns:
+            list[np.ndarray]: The int32 term IDs of every text.
+        """
+        if not texts:
+            return []
+
+        if add:
+            words, lengths = self._split(texts)
+            with self._lock:
+                # the IDs of the words are memoized for the vocabulary they were added to
+                if self._vocab is not vocab:
+                    self._vocab, self._word_ids = vocab, {}
+                word_ids = self._word_ids
+                new_words = [word for word in dict.fromkeys(words) if word not in word_ids]
+                if new_words:
+                    if len(word_ids) + len(new_words) > self.max_cached_words:
+                        word_ids.clear()
+                        new_words = list(dict.fromkeys(words))
+                    for word, term in zip(new_words, self._stem(new_words)):
+                        word_ids[word] = -1 if term is None else vocab.setdefault(term, len(vocab))
+                ids = np.fromiter(map(word_ids.__getitem__, words), dtype=np.int32, count=len(words))
+        else:
+            terms, lengths = self.terms(texts)
+            ids = np.fromiter(map(vocab.get, terms, repeat(-1)), dtype=np.int32, count=len(terms))
+
+        # stopwords and unknown terms are dropped, the remaining IDs are split by text
+        kept = ids >= 0
+        text_of = np.repeat(np.arange(len(texts)), lengths)
+        counts = np.bincount(text_of[kept], minlength=len(texts))
+        return np.split(ids[kept], np.cumsum(counts)[:-1])
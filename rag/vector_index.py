@@ -0,0 +1,440 @@
+import os
+import copy
+import json
+import logging
+import numpy as np
+
+from .quantization import get_quantizer
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Normalize the rows of a matrix to unit length, as a contiguous float32 array."""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Select the k best scores of every row, sorted best first.
+
+    Args:
+        scores (np.ndarray): The (n_queries, n_candidates) score matrix.
+        k (int): The number of results per row.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The column positions and scores of the results.
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64), np.empty((scores.shape[0], 0), dtype=np.float32)
+
+    if k < scores.shape[1]:
+        positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        positions = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    top_scores = np.take_along_axis(scores, positions, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(positions, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _blocked_top_k(score_block, n: int, k: int, n_queries: int, block_rows: int = 65536) -> tuple[np.ndarray, np.ndarray]:
+    """Select the k best scores of every query over n candidates scored block by block.
+
+    Args:
+        score_block: A function scoring the candidates [start, end), returning a (n_queries, end - start) matrix.
+        n (int): The number of candidates.
+        k (int): The number of results per query.
+        n_queries (int): The number of queries.
+        block_rows (int): The number of candidates scored at once, bounding the memory used.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The candidate positions and scores of the results, best first.
+    """
+    all_positions, all_scores = [], []
+    for start in range(0, n, block_rows):
+        end = min(start + block_rows, n)
+        positions, scores = _top_k(score_block(start, end), k)
+        all_positions.append(positions + start)
+        all_scores.append(scores)
+
+    if not all_positions:
+        return np.empty((n_queries, 0), dtype=np.int64), np.empty((n_queries, 0), dtype=np.float32)
+    if len(all_positions) == 1:
+        return all_positions[0], all_scores[0]
+    order, scores = _top_k(np.concatenate(all_scores, axis=1), k)
+    return np.take_along_axis(np.concatenate(all_positions, axis=1), order, axis=1), scores
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Fuse several rankings of chunk IDs with reciprocal-rank fusion.
+
+    Args:
+        rankings (list[list[str]]): The rankings to fuse, best first.
+        k (int): The RRF constant, damping the weight of the top ranks.
+
+    Returns:
+        list[tuple[str, float]]: The fused (chunk ID, score) pairs, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class VectorIndex:
+    """Exact in-process nearest-neighbour index over normalized embeddings"""
+
+    def __init__(self, ids: list[str] = None, embeddings: np.ndarray = None):
+        """
+        Initialize the VectorIndex class.
+
+        The embeddings are normalized once into a contiguous float32 matrix, so a search
+        is a single matrix product followed by a top-k selection.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+            embeddings (np.ndarray): The embeddings of the chunks, one row per ID.
+        """
+        self.ids: list[str] = []
+        self.embeddings = np.empty((0, 0), dtype=np.float32)
+        if ids:
+            self.add(ids, embeddings)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_collection(cls, collection, **kwargs) -> "VectorIndex":
+        """Build the index from every embedding stored in a collection.
+
+        Args:
+            collection: The vector store (or chroma collection) to read the embeddings from.
+
+        Returns:
+            VectorIndex: The index.
+        """
+        all_data = collection.get(include=["embeddings"])
+        return cls(all_data["ids"], np.asarray(all_data["embeddings"], dtype=np.float32), **kwargs)
+
+    def add(self, ids: list[str], embeddings: np.ndarray) -> None:
+        """Add chunks to the index.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+            embeddings (np.ndarray): The embeddings of the chunks, one row per ID.
+        """
+        embeddings = _normalize(np.atleast_2d(embeddings))
+        if len(ids) != embeddings.shape[0]:
+            raise ValueError(f"Got {len(ids)} IDs for {embeddings.shape[0]} embeddings")
+
+        self.embeddings = embeddings if not self.ids else np.concatenate([self.embeddings, embeddings])
+        self.ids.extend(ids)
+
+    def rebuild(self, collection) -> "VectorIndex":
+        """Build a new index with the settings of this one from every embedding stored in a collection.
+
+        An index is a snapshot of the collection it was built from, it has to be rebuilt when the
+        collection changes (the Retriever does when the version of its store moves).
+
+        Args:
+            collection: The vector store (or chroma collection) to read the embeddings from.
+
+        Returns:
+            VectorIndex: The new index, this one is left unchanged.
+        """
+        index = copy.copy(self)
+        index._reset()
+        all_data = collection.get(include=["embeddings"])
+        if all_data["ids"]:
+            index.add(all_data["ids"], np.asarray(all_data["embeddings"], dtype=np.float32))
+        return index
+
+    def _reset(self) -> None:
+        """Empty the index, keeping its settings."""
+        self.ids = []
+        self.embeddings = np.empty((0, 0), dtype=np.float32)
+
+    def search(self, queries: np.ndarray, top_k: int) -> tuple[list[list[str]], np.ndarray]:
+        """Find the nearest chunks of a batch of queries.
+
+        Args:
+            queries (np.ndarray): The query embeddings, one row per query (a single vector is accepted).
+            top_k (int): The number of results per query.
+
+        Returns:
+            tuple[list[list[str]], np.ndarray]: The chunk IDs and cosine similarities per query, best first.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        if not self.ids:
+            return [[] for _ in range(queries.shape[0])], np.empty((queries.shape[0], 0), dtype=np.float32)
+
+        positions, scores = _top_k(queries @ self.embeddings.T, top_k)
+        return [[self.ids[pos] for pos in row] for row in positions], scores
+
+    def save(self, index_dir: str) -> None:
+        """Persist the index to disk.
+
+        Args:
+            index_dir (str): The directory the index is saved to.
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "embeddings.npy"), self.embeddings)
+        with open(os.path.join(index_dir, "ids.json"), "w") as f:
+            json.dump(self.ids, f)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True) -> "VectorIndex":
+        """Load an index saved with `save`.
+
+        Args:
+            index_dir (str): The directory the index was saved to.
+            mmap (bool): Whether to memory-map the embedding matrix instead of reading it.
+
+        Returns:
+            VectorIndex: The index.
+        """
+        index = cls()
+        with open(os.path.join(index_dir, "ids.json"), "r") as f:
+            index.ids = json.load(f)
+        index.embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r" if mmap else None)
+        return index
+
+
+class IVFIndex(VectorIndex):
+    """Approximate nearest-neighbour index using an inverted file over k-means clusters"""
+
+    def __init__(
+            self,
+            ids: list[str] = None,
+            embeddings: np.ndarray = None,
+            n_lists: int = None,
+            n_probe: int = 8,
+            seed: int = 0
+        ):
+        """
+        Initialize the IVFIndex class.
+
+        The embeddings are clustered with spherical k-means. A search only scores the
+        chunks of the `n_probe` clusters closest to the query.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+            embeddings (np.ndarray): The embeddings of the chunks, one row per ID.
+            n_lists (int): The number of clusters, defaults to sqrt of the number of chunks.
+            n_probe (int): The number of clusters scanned per query.
+            seed (int): The seed of the k-means initialization.
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+        self.centroids = None
+        self.lists: list[np.ndarray] = []
+        super().__init__(ids, embeddings)
+
+    def add(self, ids: list[str], embeddings: np.ndarray) -> None:
+        """Add chunks to the index and retrain the clusters.
+
+        The clusters are trained again over all the chunks of the index, not only the added ones,
+        so add the chunks in a few large batches rather than many small ones.
+        """
+        super().add(ids, embeddings)
+        self._train()
+
+    def _reset(self) -> None:
+        super()._reset()
+        self.centroids = None
+        self.lists = []
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True, **kwargs) -> "IVFIndex":
+        """Load an index saved with `save` and rebuild its clusters."""
+        index = super().load(index_dir, mmap=mmap)
+        for name, value in kwargs.items():
+            setattr(index, name, value)
+        if index.ids:
+            index._train()
+        return index
+
+    def search(self, queries: np.ndarray, top_k: int) -> tuple[list[list[str]], np.ndarray]:
+        """Find the approximate nearest chunks of a batch of queries.
+
+        Args:
+            queries (np.ndarray): The query embeddings, one row per query (a single vector is accepted).
+            top_k (int): The number of results per query.
+
+        Returns:
+            tuple[list[list[str]], np.ndarray]: The chunk IDs and cosine similarities per query, best first.
+                Rows are padded with -inf scores if the probed clusters hold fewer than top_k chunks.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        if self.centroids is None:
+            return super().search(queries, top_k)
+
+        probes, _ = _top_k(queries @ self.centroids.T, self.n_probe)
+
+        all_ids, all_scores = [], np.full((queries.shape[0], min(top_k, len(self.ids))), -np.inf, dtype=np.float32)
+        for i, (query, probe) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self.lists[cluster] for cluster in probe])
+            positions, scores = _top_k((self.embeddings[candidates] @ query)[None, :], top_k)
+            all_ids.append([self.ids[candidates[pos]] for pos in positions[0]])
+            all_scores[i, :scores.shape[1]] = scores[0]
+
+        return all_ids, all_scores
+
+    def _train(self, n_iter: int = 10, max_samples_per_list: int = 256) -> None:
+        """Cluster the embeddings with spherical k-means and build the inverted lists."""
+        n = len(self.ids)
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+
+        sample = self.embeddings
+        if n > n_lists * max_samples_per_list:
+            sample = self.embeddings[rng.choice(n, n_lists * max_samples_per_list, replace=False)]
+
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = sample[assignments == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+                else:
+                    # re-seed empty clusters with a random point
+                    centroids[cluster] = sample[rng.integers(sample.shape[0])]
+            centroids = _normalize(centroids)
+
+        assignments = np.argmax(self.embeddings @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+        self.centroids = centroids
+        self.lists = [order[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        logger.info(f"Trained IVF index with {n_lists} lists over {n} chunks")
+
+
+class QuantizedIndex(VectorIndex):
+    """Nearest-neighbour index over compressed embeddings, re-ranked with the full-precision embeddings"""
+
+    def __init__(
+            self,
+            ids: list[str] = None,
+            embeddings: np.ndarray = None,
+            quantization: str = "int8",
+            rerank_factor: int = 4,
+            block_rows: int = 65536,
+            **quantizer_kwargs
+        ):
+        """
+        Initialize the QuantizedIndex class.
+
+        A search scores the compressed codes, which are held in memory, and re-ranks the
+        top_k * rerank_factor best candidates exactly. The full-precision embeddings are only
+        read for the candidates: once the index is saved and loaded with `mmap`, they stay on disk.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+            embeddings (np.ndarray): The embeddings of the chunks, one row per ID.
+            quantization (str): The compression of the embeddings. Options: float16, int8, pq
+            rerank_factor (int): The number of candidates re-ranked per result, 0 to keep no
+                full-precision embeddings and return the approximate scores.
+            block_rows (int): The number of codes scored at once, bounding the memory of a search.
+            **quantizer_kwargs: Extra arguments of the quantizer, e.g. `n_subvectors` for pq.
+        """
+        self.quantization = quantization
+        self.quantizer = get_quantizer(quantization, **quantizer_kwargs)
+        self.rerank_factor = rerank_factor
+        self.block_rows = block_rows
+        self.codes = None
+        super().__init__(ids, embeddings)
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of the index held in memory (memory-mapped embeddings excluded)."""
+        codes = self.codes.nbytes if self.codes is not None else 0
+        embeddings = 0 if isinstance(self.embeddings, np.memmap) else self.embeddings.nbytes
+        return codes + embeddings
+
+    def add(self, ids: list[str], embeddings: np.ndarray) -> None:
+        """Add chunks to the index, training the quantizer on the first chunks added."""
+        embeddings = _normalize(np.atleast_2d(embeddings))
+        if len(ids) != embeddings.shape[0]:
+            raise ValueError(f"Got {len(ids)} IDs for {embeddings.shape[0]} embeddings")
+
+        if not self.quantizer.trained:
+            self.quantizer.train(embeddings)
+        codes = self.quantizer.encode(embeddings)
+        self.codes = codes if self.codes is None else np.concatenate([self.codes, codes])
+        if self.rerank_factor:
+            self.embeddings = embeddings if not self.ids else np.concatenate([self.embeddings, embeddings])
+        self.ids.extend(ids)
+
+    def _reset(self) -> None:
+        # the quantizer stays trained
+        super()._reset()
+        self.codes = None
+
+    def search(self, queries: np.ndarray, top_k: int) -> tuple[list[list[str]], np.ndarray]:
+        """Find the nearest chunks of a batch of queries.
+
+        Args:
+            queries (np.ndarray): The query embeddings, one row per query (a single vector is accepted).
+            top_k (int): The number of results per query.
+
+        Returns:
+            tuple[list[list[str]], np.ndarray]: The chunk IDs and cosine similarities per query, best first.
+                The similarities are approximate if the index keeps no full-precision embeddings.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        if not self.ids:
+            return [[] for _ in range(queries.shape[0])], np.empty((queries.shape[0], 0), dtype=np.float32)
+
+        rerank = self.rerank_factor and self.embeddings.shape[0] == len(self.ids)
+        positions, scores = _blocked_top_k(
+            lambda start, end: self.quantizer.scores(queries, self.codes[start:end]),
+            len(self.ids), top_k * self.rerank_factor if rerank else top_k, queries.shape[0], self.block_rows
+        )
+
+        if rerank:
+            # score the candidates of all queries exactly, reading each embedding once
+            rows = np.unique(positions)
+            exact = queries @ np.asarray(self.embeddings[rows]).T
+            scores = np.take_along_axis(exact, np.searchsorted(rows, positions), axis=1)
+            order, scores = _top_k(scores, top_k)
+            positions = np.take_along_axis(positions, order, axis=1)
+
+        return [[self.ids[pos] for pos in row] for row in positions], scores
+
+    def save(self, index_dir: str) -> None:
+        """Persist the index to disk: the codes, the quantizer and the full-precision embeddings."""
+        super().save(index_dir)
+        np.save(os.path.join(index_dir, "codes.npy"), self.codes)
+        self.quantizer.save(os.path.join(index_dir, "quantizer.npz"))
+        with open(os.path.join(index_dir, "quantization.json"), "w") as f:
+            json.dump({"quantization": self.quantization, "rerank_factor": self.rerank_factor}, f)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True) -> "QuantizedIndex":
+        """Load an index saved with `save`.
+
+        Args:
+            index_dir (str): The directory the index was saved to.
+            mmap (bool): Whether to memory-map the full-precision embeddings instead of reading them.
+                The codes are always read into memory.
+
+        Returns:
+            QuantizedIndex: The index.
+        """
+        with open(os.path.join(index_dir, "quantization.json"), "r") as f:
+            settings = json.load(f)
+
+        index = cls(quantization=settings["quantization"], rerank_factor=settings["rerank_factor"])
+        with open(os.path.join(index_dir, "ids.json"), "r") as f:
+            index.ids = json.load(f)
+        index.embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r" if mmap else None)
+        index.codes = np.load(os.path.join(index_dir, "codes.npy"))
+        index.quantizer = type(index.quantizer).load(os.path.join(index_dir, "quantizer.npz"))
+        return index
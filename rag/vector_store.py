@@ -0,0 +1,151 @@
+"""
+This module defines the interface of the vector stores the Vectorizer writes to and the
+Retriever reads from. The backends are:
+
+- chroma: the chroma database (`ChromaDatabase`)
+- local: memory-mapped float32 embeddings with a SQLite table of IDs, documents and metadata (`LocalVectorStore`)
+
+Either backend can be split into shards searched in parallel with `rag.sharded_store.ShardedVectorStore`.
+"""
+
+import os
+import logging
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION_NAME = "rag_collection"
+
+
+class VectorStore:
+    """Stores chunks with their embeddings and metadata, and finds the nearest chunks of queries"""
+
+    def __init__(self, path: str, collection_name: str = DEFAULT_COLLECTION_NAME):
+        """
+        Initialize the VectorStore class.
+
+        Args:
+            path (str): The directory the store is persisted to.
+            collection_name (str): The name of the collection, several collections can share a path.
+        """
+        self.path = path
+        self.collection_name = collection_name
+
+    def count(self) -> int:
+        """The number of chunks in the collection."""
+        raise NotImplementedError
+
+    def upsert(self, ids: list[str], documents: list[str], embeddings, metadatas: list[dict]) -> None:
+        """Add or replace chunks.
+
+        Args:
+            ids (list[str]): The chunk IDs.
+            documents (list[str]): The chunk texts.
+            embeddings (list[list[float]] | np.ndarray): The embeddings of the chunks, one row per ID.
+            metadatas (list[dict]): The metadata of the chunks.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: list[str]) -> None:
+        """Remove chunks.
+
+        Args:
+            ids (list[str]): The chunk IDs to remove.
+        """
+        raise NotImplementedError
+
+    def get(self, ids: list[str] = None, where: dict = None, include: list[str] = ("documents", "metadatas")) -> dict:
+        """Get chunks by ID or metadata.
+
+        Args:
+            ids (list[str]): The chunk IDs to get, None for every chunk.
+            where (dict): A chroma-style metadata filter, e.g. {"file_name": "a.md"}.
+            include (list[str]): The fields to return, among documents, metadatas and embeddings.
+
+        Returns:
+            dict: The "ids" of the chunks found and the included fields, in the same order.
+        """
+        raise NotImplementedError
+
+    def query(
+            self,
+            query_embeddings,
+            top_k: int,
+            where: dict = None,
+            include: list[str] = ("documents", "metadatas")
+        ) -> dict:
+        """Find the nearest chunks of a batch of query embeddings.
+
+        Args:
+            query_embeddings (list[list[float]] | np.ndarray): The query embeddings, one row per query.
+            top_k (int): The number of results per query.
+            where (dict): A chroma-style metadata filter the results must match.
+            include (list[str]): The fields to return, among documents and metadatas.
+
+        Returns:
+            dict: The "ids" and similarity "scores" (higher is better) of the results of every query, best
+                first, and the included fields.
+        """
+        raise NotImplementedError
+
+    @property
+    def version(self) -> int:
+        """The version of the collection, incremented by every write. Shared across processes."""
+        try:
+            with open(self._version_path, "r") as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def bump_version(self) -> int:
+        """Mark the collection as changed, invalidating the results cached by readers.
+
+        Returns:
+            int: The new version.
+        """
+        version = self.version + 1
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._version_path + ".tmp", "w") as f:
+            f.write(str(version))
+        os.replace(self._version_path + ".tmp", self._version_path)
+        return version
+
+    @property
+    def keyword_index_dir(self) -> str:
+        """The default directory of the BM25 index of the collection, next to the store."""
+        return os.path.join(self.path, f"{self.collection_name}.bm25")
+
+    @property
+    def embedding_cache_path(self) -> str:
+        """The default path of the embedding cache, shared by the collections of the store's directory."""
+        return os.path.join(self.path, "embedding_cache.db")
+
+    @property
+    def _version_path(self) -> str:
+        return os.path.join(self.path, f"{self.collection_name}.version")
+
+
+def get_vector_store(backend: str = "chroma", path: str = None, collection_name: str = DEFAULT_COLLECTION_NAME) -> VectorStore:
+    """Create the vector store of a backend.
+
+    Args:
+        backend (str): The backend. Options: chroma, local
+        path (str): The directory the store is persisted to, defaults to the backend's directory.
+        collection_name (str): The name of the collection.
+
+    Returns:
+        VectorStore: The vector store.
+    """
+    if backend == "chroma":
+        from .database import ChromaDatabase
+        store_class = ChromaDatabase
+    elif backend == "local":
+        from .local_store import LocalVectorStore
+        store_class = LocalVectorStore
+    else:
+        raise ValueError(f"Unsupported vector store backend: {backend}. Supported backends are: ['chroma', 'local']")
+
+    kwargs = {"collection_name": collection_name}
+    if path is not None:
+        kwargs["path"] = path
+    return store_class(**kwargs)
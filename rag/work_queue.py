@@ -0,0 +1,148 @@
+"""
+Persistent queue of the files waiting to be ingested, in a SQLite table.
+
+A file is queued at most once: queuing it again while it waits only updates the action, and
+queuing it while it is processed makes it wait again once the current processing ends. The files
+being processed when the process stops are queued again on the next start.
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+
+logging.basicConfig(level=logging.ERROR, format='%(levelname)s [%(filename)s]: %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = "./ingest_queue.db"
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+class WorkQueue:
+    """Persistent, deduplicated queue of (file name, action) items"""
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_attempts: int = 3):
+        """
+        Initialize the WorkQueue class.
+
+        Args:
+            path (str): The path of the SQLite database of the queue, ":memory:" for a queue lost on exit.
+            max_attempts (int): The number of times a file is processed before it is marked as failed.
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS queue (
+                    file_name TEXT PRIMARY KEY,
+                    action TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS queue_pending ON queue (state, enqueued_at)")
+            # the items of a previous process that stopped while processing them
+            self._conn.execute("UPDATE queue SET state = 'pending' WHERE state = 'processing'")
+            self._conn.commit()
+        except Exception as e:
+            logger.error(f"Error opening work queue at {path}: {e}")
+            raise e
+
+    def put(self, file_names: list[str], action: str = UPSERT) -> None:
+        """Queue files.
+
+        Args:
+            file_names (list[str]): The names of the files.
+            action (str): "upsert" to (re-)ingest the files, "delete" to remove them.
+        """
+        if not file_names:
+            return
+        now = time.time()
+        with self._lock:
+            # a waiting file keeps its place and its enqueue time, so the lag counts from the first change
+            self._conn.executemany(
+                """INSERT INTO queue (file_name, action, state, enqueued_at) VALUES (?, ?, 'pending', ?)
+                ON CONFLICT (file_name) DO UPDATE SET
+                    action = excluded.action,
+                    enqueued_at = CASE WHEN state = 'pending' THEN enqueued_at ELSE excluded.enqueued_at END,
+                    state = 'pending',
+                    attempts = 0,
+                    error = NULL""",
+                [(file_name, action, now) for file_name in file_names]
+            )
+            self._conn.commit()
+
+    def claim(self, n: int) -> list[tuple[str, str, float]]:
+        """Take the oldest waiting files for processing.
+
+        Args:
+            n (int): The maximum number of files.
+
+        Returns:
+            list[tuple[str, str, float]]: The (file name, action, enqueue time) of the files.
+        """
+        with self._lock:
+            items = self._conn.execute(
+                "SELECT file_name, action, enqueued_at FROM queue WHERE state = 'pending' ORDER BY enqueued_at LIMIT ?",
+                (n,)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE queue SET state = 'processing' WHERE file_name = ?", [(file_name,) for file_name, _, _ in items]
+            )
+            self._conn.commit()
+        return items
+
+    def done(self, items: list[tuple[str, str, float]]) -> None:
+        """Remove processed files, unless they were queued again while they were processed."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM queue WHERE file_name = ? AND enqueued_at = ? AND state = 'processing'",
+                [(file_name, enqueued_at) for file_name, _, enqueued_at in items]
+            )
+            self._conn.commit()
+
+    def fail(self, items: list[tuple[str, str, float]], error: str) -> None:
+        """Queue files whose processing failed again, or mark them as failed after `max_attempts`."""
+        with self._lock:
+            self._conn.executemany(
+                """UPDATE queue SET
+                    attempts = attempts + 1,
+                    state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                    error = ?
+                WHERE file_name = ? AND enqueued_at = ? AND state = 'processing'""",
+                [(self.max_attempts, error, file_name, enqueued_at) for file_name, _, enqueued_at in items]
+            )
+            self._conn.commit()
+
+    def failed(self) -> dict[str, str]:
+        """The files that failed `max_attempts` times, with their last error."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT file_name, error FROM queue WHERE state = 'failed'").fetchall())
+
+    def stats(self) -> dict:
+        """The number of files waiting, being processed and failed, and the lag of the oldest waiting file.
+
+        Returns:
+            dict: The "pending", "processing" and "failed" counts, the "depth" (pending and processing) and
+                the "lag_seconds" since the oldest file of the depth was queued.
+        """
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall())
+            (oldest,) = self._conn.execute(
+                "SELECT MIN(enqueued_at) FROM queue WHERE state IN ('pending', 'processing')"
+            ).fetchone()
+        stats = {state: counts.get(state, 0) for state in ("pending", "processing", "failed")}
+        stats["depth"] = stats["pending"] + stats["processing"]
+        stats["lag_seconds"] = max(time.time() - oldest, 0.0) if oldest is not None else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
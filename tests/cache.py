@@ -0,0 +1,27 @@
+import time
+from rag.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None, "The least recently used entry should be evicted"
+    assert cache.get("c") == 3
+    assert cache.stats["hits"] == 3 and cache.stats["misses"] == 1
+
+
+def test_lru_cache_ttl():
+
+    cache = LRUCache(max_entries=2, ttl=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+
+    time.sleep(0.1)
+    assert cache.get("a") is None, "Expired entries should not be returned"
+    assert len(cache) == 0
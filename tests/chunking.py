@@ -0,0 +1,72 @@
+import pytest
+from rag.chunking import get_chunker, TokenChunker
+
+
+class WhitespaceTokenizer:
+    """Stand-in for a tiktoken encoding: every word with its leading whitespace is a token."""
+
+    def encode(self, text):
+        import re
+        self._offsets = [match.start() for match in re.finditer(r"\s*\S+", text)]
+        return list(range(len(self._offsets)))
+
+    def decode_with_offsets(self, tokens):
+        return None, [self._offsets[token] for token in tokens]
+
+
+@pytest.mark.parametrize("strategy", ["word", "sentence", "markdown"])
+def test_chunk_offsets_match_text(strategy):
+    """Every chunk should be the slice of the original text at its offsets."""
+    text = "# Title\n\nFirst sentence here. Second one!\n\n## Part\n\n" + " ".join(f"w{i}" for i in range(100))
+    chunker = get_chunker(strategy, chunk_size=12, chunk_overlap=4)
+
+    chunks = chunker.split(text)
+
+    assert len(chunks) > 1
+    for chunk, start, end in chunks:
+        assert chunk == text[start:end]
+        assert len(chunk.split()) <= 12, "Chunks should not exceed the chunk size"
+
+
+def test_word_chunker_has_no_trailing_overlap_chunk():
+
+    words = [f"w{i}" for i in range(190)]
+    chunks = get_chunker("word", chunk_size=50, chunk_overlap=10).split("\n".join(words))
+
+    # windows start at 0, 40, 80, 120, 160, and the one starting at 120 ends at word 170
+    assert len(chunks) == 5
+    assert chunks[-1][0].split() == words[160:190]
+
+
+def test_sentence_chunker_keeps_sentences_whole():
+
+    text = "One two three. Four five six. Seven eight nine. Ten eleven twelve."
+    chunks = [chunk for chunk, _, _ in get_chunker("sentence", chunk_size=6, chunk_overlap=3).split(text)]
+
+    assert chunks == ["One two three. Four five six.", "Four five six. Seven eight nine.", "Seven eight nine. Ten eleven twelve."]
+
+
+def test_token_chunker():
+
+    text = "a b c d e f g"
+    chunker = TokenChunker(chunk_size=3, chunk_overlap=1, tokenizer=WhitespaceTokenizer())
+
+    assert [chunk for chunk, _, _ in chunker.split(text)] == ["a b c", " c d e", " e f g"]
+
+
+def test_invalid_chunking_strategy():
+
+    with pytest.raises(ValueError):
+        get_chunker("random")
+    with pytest.raises(ValueError):
+        get_chunker("word", chunk_size=10, chunk_overlap=10)
+
+def test_word_offsets_whitespace():
+    import numpy as np
+    from rag.chunking import _WHITESPACE, word_offsets
+
+    # the listed whitespace is the whitespace of str.split
+    assert set(_WHITESPACE.tolist()) == {c for c in range(0x110000) if chr(c).isspace()}
+    text = "a　b c  d"
+    starts, ends = word_offsets(text)
+    assert [text[start:end] for start, end in zip(starts, ends)] == text.split()
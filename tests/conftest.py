@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+import pytest
+
+
+class FakeStore:
+    """Stand-in for a vector store holding documents only"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.get_calls = 0
+        self.version = 0
+
+    def count(self):
+        return len(self.documents)
+
+    def get(self, ids=None, where=None, include=None):
+        self.get_calls += 1
+        ids = [chunk_id for chunk_id in (ids or self.documents) if chunk_id in self.documents]
+        return {
+            "ids": ids,
+            "documents": [self.documents[chunk_id] for chunk_id in ids],
+            "metadatas": [{"file_name": chunk_id.split("_chunk_")[0]} for chunk_id in ids],
+        }
+
+
+@pytest.fixture
+def fake_store():
+    """Build a FakeStore from a dict of chunk IDs and documents."""
+    return FakeStore
+
+
+@pytest.fixture
+def fake_llm_client():
+    """Build an LLM client embedding every text as (number of characters, 1), or with `embed`,
+    recording the texts of every request in `requests`."""
+
+    def make(requests: list = None, embed=lambda text: [float(len(text)), 1.0]):
+        def create(input, model):
+            if requests is not None:
+                requests.append(input)
+            return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=embed(text)) for i, text in enumerate(input)])
+        return SimpleNamespace(client=SimpleNamespace(embeddings=SimpleNamespace(create=create)))
+
+    return make
@@ -0,0 +1,114 @@
+import types
+import threading
+import httpx
+import openai
+import numpy as np
+from rag.embedder import Embedder
+from rag.embedding_cache import EmbeddingCache
+
+
+class FakeEmbeddings:
+    """Returns the length of every input as its embedding, failing the first call with a rate limit."""
+
+    def __init__(self, fail_first=False):
+        self.calls = []
+        self.fail_first = fail_first
+        self.lock = threading.Lock()
+
+    def create(self, input, model):
+        with self.lock:
+            self.calls.append(list(input))
+            if self.fail_first and len(self.calls) == 1:
+                response = httpx.Response(429, request=httpx.Request("POST", "http://test"))
+                raise openai.RateLimitError("rate limited", response=response, body=None)
+
+        data = [types.SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+        # the API does not guarantee the order of the returned items
+        return types.SimpleNamespace(data=data[::-1])
+
+
+def _embedder(embeddings, **kwargs):
+    llm_client = types.SimpleNamespace(client=types.SimpleNamespace(embeddings=embeddings))
+    return Embedder(llm_client, **kwargs)
+
+
+def test_embedder_packs_batches_and_preserves_order():
+
+    fake = FakeEmbeddings()
+    texts = ["x" * i for i in range(1, 101)]
+    embedder = _embedder(fake, max_batch_items=8, max_workers=4)
+
+    embeddings = embedder.embed(texts)
+
+    assert embeddings == [[float(i)] for i in range(1, 101)], "Embeddings should follow the order of the texts"
+    assert max(len(call) for call in fake.calls) <= 8, "Batches should respect the item limit"
+    assert len(fake.calls) == 13
+
+
+def test_embedder_respects_token_limit():
+
+    fake = FakeEmbeddings()
+    embedder = _embedder(fake, max_batch_tokens=100, max_workers=1)
+
+    embedder.embed(["x" * 200] * 5)
+
+    assert all(len(call) == 1 for call in fake.calls), "Each text uses half of the token budget"
+
+
+def test_embedder_retries_on_rate_limit():
+
+    fake = FakeEmbeddings(fail_first=True)
+    embedder = _embedder(fake, initial_backoff=0.01)
+
+    assert embedder.embed(["a", "bb"]) == [[1.0], [2.0]]
+    assert len(fake.calls) == 2, "The rate limited request should be retried"
+
+
+def test_embedder_only_embeds_cache_misses():
+
+    fake = FakeEmbeddings()
+    embedder = _embedder(fake, cache=EmbeddingCache(":memory:"))
+
+    embedder.embed(["a", "bb"])
+    embeddings = embedder.embed(["a", "bb", "ccc", "ccc"])
+
+    assert embeddings == [[1.0], [2.0], [3.0], [3.0]]
+    assert fake.calls[-1] == ["ccc"], "Only the uncached, deduplicated texts should be embedded"
+    assert embedder.cache.stats["hits"] == 2
+
+
+def test_embedder_embed_array_matches_embed():
+
+    fake = FakeEmbeddings()
+    embedder = _embedder(fake, cache=EmbeddingCache(":memory:"))
+
+    embedder.embed(["a", "bb"])
+    embeddings = embedder.embed_array(["a", "ccc", "bb", "ccc"])
+
+    assert embeddings.dtype == np.float32 and embeddings.shape == (4, 1)
+    assert embeddings[:, 0].tolist() == [1.0, 3.0, 2.0, 3.0], "Cached and computed embeddings should keep the order of the texts"
+    assert fake.calls[-1] == ["ccc"]
+    assert embedder.embed_array(["ccc"]).tolist() == [[3.0]], "Computed embeddings should be cached"
+
+
+def test_embedding_cache_evicts_least_recently_used():
+
+    cache = EmbeddingCache(":memory:", max_entries=2)
+    cache.put_many("model", ["a", "b"], [[1.0], [2.0]])
+    cache.get_many("model", ["a"])
+    cache.put_many("model", ["c"], [[3.0]])
+
+    assert len(cache) == 2
+    assert cache.get_many("model", ["a", "b", "c"]) == [[1.0], None, [3.0]], "The least recently used entry should be evicted"
+    assert cache.get_many("other-model", ["a"]) == [None], "Entries should be keyed by model"
+
+
+def test_embedder_disables_sdk_retries():
+
+    client = openai.OpenAI(base_url="http://localhost:1/v1", api_key="key", max_retries=2)
+    embedder = Embedder(types.SimpleNamespace(client=client))
+
+    assert embedder.client.max_retries == 0, "The SDK should not retry the requests the Embedder retries"
+    assert client.max_retries == 2, "The shared client should keep its retries"
+    assert embedder.client is embedder.client and embedder.client._client is client._client, \
+        "The copy should be reused and share the connection pool"
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from rag.generation import AnswerGenerator, pack_context
+
+TEXT = "cricket is played with a bat and a ball between two teams of eleven players"
+
+
+def make_doc(chunk_id, start, end, file_name="cricket.md", tenant=None):
+    metadata = {"file_name": file_name, "start": start, "end": end, **({"tenant": tenant} if tenant else {})}
+    return {"id": chunk_id, "document": TEXT[start:end], "metadata": metadata}
+
+
+def test_pack_context_merges_overlapping_chunks():
+
+    docs = [make_doc("c_1", 20, 51), make_doc("c_0", 0, 30), make_doc("c_1_again", 25, 45), make_doc("c_2", 52, len(TEXT))]
+    passages = pack_context(docs, max_tokens=1000)
+
+    assert len(passages) == 1, "Overlapping and adjacent chunks should form a single passage"
+    assert passages[0]["text"] == TEXT
+    assert passages[0]["ids"] == ["c_0", "c_1", "c_2"], "A chunk without new text should be dropped"
+
+
+def test_pack_context_keeps_tenants_apart():
+
+    docs = [
+        make_doc("acme/c_0", 0, 30, tenant="acme"),
+        make_doc("globex/c_0", 0, 30, tenant="globex"),
+        make_doc("globex/c_1", 25, 51, tenant="globex"),
+    ]
+    passages = pack_context(docs, max_tokens=1000)
+
+    assert [(passage["tenant"], passage["ids"]) for passage in passages] == [
+        ("acme", ["acme/c_0"]), ("globex", ["globex/c_0", "globex/c_1"])
+    ], "The same file of two tenants should neither be deduplicated nor merged"
+    assert passages[1]["text"] == TEXT[0:51]
+
+
+def test_pack_context_budget():
+
+    docs = [
+        make_doc("a", 0, 30, "a.md"),
+        {"id": "b", "document": "x" * 400, "metadata": {"file_name": "b.md"}},
+        make_doc("c", 0, 30, "c.md"),
+        {"id": "d", "document": TEXT[0:30], "metadata": {"file_name": "d.md"}},
+    ]
+    passages = pack_context(docs, max_tokens=20)
+
+    assert [passage["file_name"] for passage in passages] == ["a.md", "c.md"], \
+        "Chunks over the budget and repeated texts should be skipped"
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeCompletions:
+    """Streams a fixed answer and records the requests"""
+
+    def __init__(self):
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return iter([chunk(None), chunk("Eleven"), chunk(" players [1]"), SimpleNamespace(choices=[])])
+
+
+class FakeRetriever:
+    def __init__(self):
+        self.queries = []
+        self.retrieved = {"first": threading.Event(), "second": threading.Event()}
+
+    def retrieve(self, query, where=None):
+        self.queries.append(query)
+        if query in self.retrieved:
+            self.retrieved[query].set()
+        return [make_doc("c_0", 0, 30)]
+
+    async def aretrieve(self, query, where=None):
+        return self.retrieve(query, where)
+
+
+def make_generator():
+    completions = FakeCompletions()
+    llm_client = SimpleNamespace(config={"model": "test"}, client=SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return AnswerGenerator(retriever=FakeRetriever(), llm_client=llm_client), completions
+
+
+def test_stream_answer():
+
+    generator, completions = make_generator()
+
+    assert list(generator.stream("how many players?")) == ["Eleven", " players [1]"]
+    request = completions.requests[0]
+    assert request["stream"] and request["model"] == "test"
+    assert TEXT[0:30] in request["messages"][0]["content"], "The passages should be in the prompt"
+    assert request["messages"][1] == {"role": "user", "content": "how many players?"}
+
+
+def test_stream_many_prefetches_next_question():
+
+    generator, _ = make_generator()
+    streams = generator.stream_many(["first", "second"])
+
+    first = next(streams)
+    assert generator.retriever.retrieved["second"].wait(timeout=5), "The next question should be retrieved before the answer ends"
+    assert "".join(first) == "Eleven players [1]"
+    assert "".join(next(streams)) == "Eleven players [1]"
+    assert generator.retriever.queries == ["first", "second"]
+
+
+def test_astream_answer():
+
+    generator, completions = make_generator()
+
+    async def acreate(**kwargs):
+        async def chunks():
+            for item in completions.create(**kwargs):
+                yield item
+        return chunks()
+
+    generator.llm_client.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=acreate)))
+    assert asyncio.run(generator.aanswer("how many players?")) == "Eleven players [1]"
@@ -1,14 +1,18 @@
+import os
 import pytest
 from rag import Vectorizer, Loader
 
+
 @pytest.fixture
-def vectorizer_instance():
+def vectorizer_instance(tmp_path):
     """Fixture for Vectorizer instance."""
+    from rag.database import ChromaDatabase
+
     loader = Loader(data_dir="data", exclude_file_types=["csv"])
     data = loader.load_files()
     
     # Using small chunk size for testing purposes
-    return Vectorizer(data=data, chunk_size=100, chunk_overlap=20)
+    return Vectorizer(data=data, chunk_size=100, chunk_overlap=20, db_client=ChromaDatabase(path=str(tmp_path / "chroma_db")))
 
 
 def test_vectorize_docs(vectorizer_instance):
@@ -32,12 +36,14 @@ def test_get_file_chunks_not_found(vectorizer_instance):
     with pytest.raises(ValueError, match="File non_existent_file.txt not found in data"):
         vectorizer_instance.get_file_chunks("non_existent_file.txt")
 
-def test_chunking_logic():
+def test_chunking_logic(tmp_path):
     """Test the chunking logic with a sample text."""
+    from rag.database import ChromaDatabase
+
     file_name = "sample.txt"
     text = ("word " * 200).strip()
     data = {file_name: text}
-    vectorizer = Vectorizer(data, chunk_size=50, chunk_overlap=10)
+    vectorizer = Vectorizer(data, chunk_size=50, chunk_overlap=10, db_client=ChromaDatabase(path=str(tmp_path / "chroma_db")))
     vectorizer.vectorize_docs()
     chunks = vectorizer.get_file_chunks(file_name)
     
@@ -61,3 +67,140 @@ def test_chunking_logic():
     chunk1_words = chunks[0].split()
     chunk2_words = chunks[1].split()
     assert chunk1_words[-10:] == chunk2_words[:10]
+
+def test_vectorize_docs_stores_batches(tmp_path, fake_llm_client):
+    """Test that files embedded together in a batch are stored with their own chunks, embeddings and offsets."""
+    import numpy as np
+    from rag.local_store import LocalVectorStore
+    from rag.keyword_index import KeywordIndex
+    from rag.embedding_cache import EmbeddingCache
+
+    store = LocalVectorStore(path=str(tmp_path / "store"), collection_name="test")
+    data = {"a.md": "alpha beta gamma delta", "b.txt": "epsilon zeta"}
+    vectorizer = Vectorizer(
+        data, chunk_size=2, chunk_overlap=0, db_client=store, batch_size=100, llm_client=fake_llm_client(),
+        keyword_index=KeywordIndex(str(tmp_path / "bm25")), embedding_cache=EmbeddingCache(":memory:")
+    )
+    vectorizer.vectorize_docs()
+
+    stored = store.get(include=["documents", "metadatas", "embeddings"])
+    by_id = dict(zip(stored["ids"], zip(stored["documents"], stored["metadatas"], stored["embeddings"])))
+    assert set(by_id) == {"a.md_chunk_0", "a.md_chunk_1", "b.txt_chunk_0"}
+
+    document, metadata, embedding = by_id["a.md_chunk_1"]
+    assert document == "gamma delta"
+    assert metadata == {"file_name": "a.md", "file_type": "md", "start": 11, "end": 22}
+    assert np.allclose(embedding, np.array([11.0, 1.0]) / np.linalg.norm([11.0, 1.0]), atol=1e-6)
+    assert by_id["b.txt_chunk_0"][1]["file_type"] == "txt"
+
+    assert vectorizer.get_file_chunks("a.md") == ["alpha beta", "gamma delta"]
+    assert len(vectorizer.get_file_embeddings("b.txt")) == 1
+    with pytest.raises(ValueError, match="not found in database"):
+        vectorizer.get_file_chunks("missing.md")
+
+@pytest.mark.parametrize("backend", ["chroma", "local"])
+def test_vectorize_docs_empties_file(tmp_path, backend, fake_llm_client):
+    """Test that the chunks of a file emptied since its last ingestion are deleted."""
+    from rag.vector_store import get_vector_store
+    from rag.keyword_index import KeywordIndex
+    from rag.embedding_cache import EmbeddingCache
+    from rag.manifest import Manifest
+
+    (tmp_path / "a.md").write_text("alpha beta gamma")
+    store = get_vector_store(backend, path=str(tmp_path / "store"), collection_name="test")
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    vectorizer = Vectorizer(
+        {}, chunk_size=2, chunk_overlap=0, db_client=store, manifest=manifest, llm_client=fake_llm_client(),
+        keyword_index=KeywordIndex(str(tmp_path / "bm25")), embedding_cache=EmbeddingCache(":memory:")
+    )
+    manifest.diff({"a.md": str(tmp_path / "a.md")})
+    vectorizer.data = {"a.md": "alpha beta gamma"}
+    vectorizer.vectorize_docs()
+    assert store.count() == 2
+
+    (tmp_path / "a.md").write_text("")
+    assert manifest.diff({"a.md": str(tmp_path / "a.md")}).modified == ["a.md"]
+    vectorizer.data = {"a.md": ""}
+    vectorizer.vectorize_docs()
+
+    assert store.count() == 0, "The chunks of an emptied file should be deleted"
+    assert vectorizer.keyword_index.search("alpha", top_k=2) == []
+    assert not manifest.is_pending("a.md") and manifest.records["a.md"].chunk_count == 0, \
+        "An emptied file should be recorded as ingested"
+
+def test_vectorize_docs_splits_large_files(tmp_path, fake_llm_client):
+    """Test that a file with more chunks than the batch size is stored in batches, numbered across them."""
+    from rag.local_store import LocalVectorStore
+    from rag.keyword_index import KeywordIndex
+    from rag.embedding_cache import EmbeddingCache
+    from rag.manifest import Manifest
+
+    (tmp_path / "a.md").write_text("x")
+    store = LocalVectorStore(path=str(tmp_path / "store"), collection_name="test")
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    words = [f"word{i}" for i in range(20)]
+    # a stream of two pieces of 5 chunks each
+    data = [("a.md", " ".join(words[:10]) + " "), ("a.md", " ".join(words[10:]))]
+    requests = []
+    vectorizer = Vectorizer(
+        data, chunk_size=2, chunk_overlap=0, db_client=store, manifest=manifest, batch_size=3,
+        llm_client=fake_llm_client(requests), keyword_index=KeywordIndex(str(tmp_path / "bm25")),
+        embedding_cache=EmbeddingCache(":memory:")
+    )
+    manifest.diff({"a.md": str(tmp_path / "a.md")})
+    vectorizer.vectorize_docs()
+
+    assert max(map(len, requests)) <= 3, "No more than batch_size chunks should be embedded together"
+    assert vectorizer.get_file_chunks("a.md") == [" ".join(words[i:i + 2]) for i in range(0, 20, 2)]
+    assert sorted(store.get(include=[])["ids"]) == sorted(f"a.md_chunk_{i}" for i in range(10))
+    assert manifest.records["a.md"].chunk_count == 10
+
+def test_vectorizer_default_paths_follow_the_store(tmp_path, fake_llm_client):
+    """Test that the default keyword index and embedding cache are kept next to the store, per collection."""
+    from rag.local_store import LocalVectorStore
+
+    vectorizers = [
+        Vectorizer({"a.md": "alpha beta"}, chunk_size=2, chunk_overlap=0, llm_client=fake_llm_client(),
+                   db_client=LocalVectorStore(path=str(tmp_path / "store"), collection_name=name))
+        for name in ("first", "second")
+    ]
+    vectorizers[0].vectorize_docs()
+
+    assert vectorizers[0].keyword_index.index_dir == str(tmp_path / "store" / "first.bm25")
+    assert vectorizers[1].keyword_index.index_dir != vectorizers[0].keyword_index.index_dir, \
+        "Every collection should have its own keyword index"
+    assert vectorizers[0].embedder.cache.path == str(tmp_path / "store" / "embedding_cache.db")
+    assert os.path.exists(tmp_path / "store" / "first.bm25" / "CURRENT")
+
+def test_vectorize_docs_keeps_file_failing_midway(tmp_path, fake_llm_client):
+    """Test that a file the loader cannot read to the end keeps its chunks and stays pending."""
+    from rag.local_store import LocalVectorStore
+    from rag.keyword_index import KeywordIndex
+    from rag.embedding_cache import EmbeddingCache
+    from rag.manifest import Manifest
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    lines = b"".join(b"line %d\n" % i for i in range(5000))
+    (data_dir / "a.txt").write_bytes(lines)
+    loader = Loader(data_dir=str(data_dir), block_size=4096)
+    store = LocalVectorStore(path=str(tmp_path / "store"), collection_name="test")
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    vectorizer = Vectorizer(
+        [], chunk_size=100, chunk_overlap=0, db_client=store, manifest=manifest, batch_size=10,
+        llm_client=fake_llm_client(), keyword_index=KeywordIndex(str(tmp_path / "bm25")),
+        embedding_cache=EmbeddingCache(":memory:")
+    )
+    manifest.diff(loader.scan())
+    vectorizer.data = loader.iter_documents(pieces=True)
+    vectorizer.vectorize_docs()
+    n_chunks = store.count()
+    assert n_chunks > 50 and not manifest.is_pending("a.txt")
+
+    (data_dir / "a.txt").write_bytes(lines[:len(lines) // 2] + b"\xff\xfe" + lines[len(lines) // 2:])
+    assert manifest.diff(loader.scan()).modified == ["a.txt"]
+    vectorizer.data = loader.iter_documents(pieces=True)
+    vectorizer.vectorize_docs()
+
+    assert store.count() == n_chunks, "The chunks past the failure should not be deleted as orphans"
+    assert manifest.is_pending("a.txt"), "A file cut short should be ingested again"
@@ -0,0 +1,97 @@
+import os
+import time
+from rag import Loader, Vectorizer, Retriever
+from rag.ingestion import IngestionService
+from rag.embedding_cache import EmbeddingCache
+from rag.keyword_index import KeywordIndex
+from rag.local_store import LocalVectorStore
+from rag.manifest import Manifest
+from rag.work_queue import WorkQueue
+
+
+def make_service(tmp_path, fake_llm_client):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    store = LocalVectorStore(path=str(tmp_path / "store"), collection_name="test")
+    requests = []
+    vectorizer = Vectorizer(
+        [], chunk_size=2, chunk_overlap=0, db_client=store, manifest=Manifest(str(tmp_path / "manifest.json")),
+        keyword_index=KeywordIndex(str(tmp_path / "bm25")), embedding_cache=EmbeddingCache(":memory:"),
+        llm_client=fake_llm_client(requests)
+    )
+    service = IngestionService(
+        Loader(data_dir=str(data_dir)), vectorizer, queue=WorkQueue(str(tmp_path / "queue.db")), poll_interval=0.05
+    )
+    return service, data_dir, store, requests
+
+
+def stored_files(store):
+    return sorted({metadata["file_name"] for metadata in store.get(include=["metadatas"])["metadatas"]})
+
+
+def test_ingestion_service_processes_changes(tmp_path, fake_llm_client):
+
+    service, data_dir, store, requests = make_service(tmp_path, fake_llm_client)
+    (data_dir / "a.md").write_text("alpha beta gamma")
+    (data_dir / "b.md").write_text("delta epsilon")
+
+    assert service.poll() == 2
+    assert service.stats()["depth"] == 2
+    assert service.process_once() == 2
+    assert stored_files(store) == ["a.md", "b.md"]
+    assert service.stats()["depth"] == 0
+    assert service.poll() == 0, "Unchanged files should not be queued again"
+
+    (data_dir / "a.md").write_text("alpha beta gamma delta zeta")
+    (data_dir / "b.md").unlink()
+    assert service.poll() == 2
+    service.process_once()
+    assert stored_files(store) == ["a.md"]
+    assert store.count() == 3
+
+    # touched without a change of content
+    n_requests = len(requests)
+    stat = os.stat(data_dir / "a.md")
+    os.utime(data_dir / "a.md", (stat.st_atime, stat.st_mtime + 10))
+    assert service.poll() == 1
+    service.process_once()
+    assert len(requests) == n_requests and service.stats()["depth"] == 0, "An unchanged file should not be re-embedded"
+
+
+def test_ingestion_service_background(tmp_path, fake_llm_client):
+
+    service, data_dir, store, _ = make_service(tmp_path, fake_llm_client)
+    service.start()
+    try:
+        (data_dir / "a.md").write_text("alpha beta gamma")
+        deadline = time.time() + 10
+        while not stored_files(store) and time.time() < deadline:
+            time.sleep(0.05)
+        assert stored_files(store) == ["a.md"], "A new file should be ingested in the background"
+    finally:
+        service.stop(timeout=10)
+
+
+def test_ingestion_service_serves_queries_while_ingesting(tmp_path, fake_llm_client):
+
+    service, data_dir, store, _ = make_service(tmp_path, fake_llm_client)
+    # a reader of its own, with the keyword index the service saves memory-mapped
+    retriever = Retriever(
+        method="keyword_based", top_k=100, db_client=store, keyword_index=KeywordIndex(str(tmp_path / "bm25")), cache_size=0
+    )
+    service.start()
+    try:
+        for i in range(20):
+            (data_dir / f"file_{i}.md").write_text(f"cricket word{i}")
+            results = retriever.retrieve("cricket")
+            assert all(result["document"].startswith("cricket") for result in results)
+            time.sleep(0.02)
+
+        deadline = time.time() + 10
+        while len(retriever.retrieve("cricket")) < 20 and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        service.stop(timeout=10)
+
+    assert len(retriever.retrieve("cricket")) == 20, "Every ingested file should become searchable"
+    assert retriever.retrieve("word19")[0]["metadata"]["file_name"] == "file_19.md"
@@ -0,0 +1,138 @@
+import os
+import threading
+from types import SimpleNamespace
+
+from rag.keyword_index import KeywordIndex
+from rag.tokenization import Tokenizer
+
+
+def test_keyword_index_search(tmp_path):
+
+    index = KeywordIndex(index_dir=str(tmp_path))
+    index.upsert(
+        ["a_chunk_0", "a_chunk_1", "b_chunk_0"],
+        ["the history of cricket", "bowlers and batsmen", "a recipe for bread"]
+    )
+    results = index.search("cricket history", top_k=2)
+
+    assert results[0][0] == "a_chunk_0", "The matching chunk should be ranked first"
+    assert index.search("unknownword", top_k=2) == [], "Unknown query terms should return no results"
+
+
+def test_keyword_index_persistence(tmp_path):
+
+    index = KeywordIndex(index_dir=str(tmp_path))
+    index.upsert(["a_chunk_0", "b_chunk_0"], ["the history of cricket", "a recipe for bread"])
+    index.save()
+
+    loaded = KeywordIndex(index_dir=str(tmp_path))
+    assert len(loaded) == 2, "The index should be loaded from disk"
+    assert loaded.search("bread", top_k=1)[0][0] == "b_chunk_0"
+
+
+def test_keyword_index_incremental_update(tmp_path):
+
+    index = KeywordIndex(index_dir=str(tmp_path))
+    index.upsert(["a_chunk_0", "b_chunk_0"], ["the history of cricket", "a recipe for bread"])
+    index.save()
+
+    loaded = KeywordIndex(index_dir=str(tmp_path))
+    loaded.upsert(["b_chunk_0", "c_chunk_0"], ["a guide to football", "more about bread"])
+    loaded.delete(["a_chunk_0"])
+    loaded.save()
+
+    reloaded = KeywordIndex(index_dir=str(tmp_path))
+    assert sorted(reloaded.ids) == ["b_chunk_0", "c_chunk_0"]
+    assert reloaded.search("bread", top_k=2)[0][0] == "c_chunk_0", "Replaced chunks should be re-indexed"
+    assert reloaded.search("cricket", top_k=2) == [], "Deleted chunks should not be returned"
+
+
+def test_keyword_index_search_many(tmp_path):
+
+    index = KeywordIndex(index_dir=str(tmp_path))
+    index.upsert(["a_chunk_0", "b_chunk_0"], ["the history of cricket", "a recipe for bread"])
+    results = index.search_many(["bread", "unknownword", "cricket history"], top_k=1)
+
+    assert results == [index.search("bread", 1), [], index.search("cricket history", 1)], \
+        "A batch search should match searching the queries one by one"
+
+
+def test_keyword_index_stopwords(tmp_path):
+
+    index = KeywordIndex(index_dir=str(tmp_path))
+    index.upsert(["a_chunk_0", "b_chunk_0"], ["the history of cricket", "a recipe for bread"])
+
+    assert "the" not in index.vocab and "histori" in index.vocab, "Stopwords should not be indexed"
+    assert index.search("the", top_k=2) == [], "A query of stopwords should return no results"
+    assert index.search("The Histories", top_k=2)[0][0] == "a_chunk_0", "Queries should be stemmed like the chunks"
+
+
+def test_keyword_index_search_while_saving(tmp_path):
+
+    writer = KeywordIndex(index_dir=str(tmp_path))
+    writer.upsert([f"a_chunk_{i}" for i in range(500)], [f"cricket match {i}" for i in range(500)])
+    writer.save()
+    reader = KeywordIndex(index_dir=str(tmp_path))
+
+    def save_batches():
+        for batch in range(10):
+            writer.upsert([f"b{batch}_chunk_{i}" for i in range(100)], [f"cricket bread {i}" for i in range(100)])
+            writer.save()
+
+    thread = threading.Thread(target=save_batches)
+    thread.start()
+    while thread.is_alive():
+        # the memory-mapped files of the version being read are never rewritten
+        assert len(reader.search("cricket", top_k=5)) == 5
+    thread.join()
+
+    assert len(reader.search("bread", top_k=2000)) == 1000, "The reader should load the last saved version"
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("version-")]) == 1, \
+        "The replaced versions should be removed"
+
+
+def test_keyword_index_rebuilt_for_another_tokenizer(tmp_path):
+
+    index = KeywordIndex(index_dir=str(tmp_path))
+    index.upsert(["a_chunk_0", "b_chunk_0"], ["the history of cricket", "a recipe for bread"])
+    index.save()
+    assert len(KeywordIndex(index_dir=str(tmp_path))) == 2
+
+    tokenizer = Tokenizer(stopwords=frozenset())
+    other = KeywordIndex(index_dir=str(tmp_path), tokenizer=tokenizer)
+    assert len(other) == 0, "An index saved with another tokenizer should not be loaded"
+
+    store = SimpleNamespace(
+        count=lambda: 2,
+        get=lambda include: {"ids": ["a_chunk_0", "b_chunk_0"], "documents": ["the history of cricket", "a recipe for bread"]}
+    )
+    other.build_from(store)
+    reloaded = KeywordIndex(index_dir=str(tmp_path), tokenizer=Tokenizer(stopwords=frozenset()))
+    assert len(reloaded) == 2 and reloaded.search("the", top_k=1)[0][0] == "a_chunk_0", \
+        "The index should be rebuilt with the new tokenizer"
+
+
+def test_keyword_index_search_while_updating(tmp_path):
+
+    index = KeywordIndex(index_dir=str(tmp_path))
+    index.upsert([f"a_chunk_{i}" for i in range(100)], ["the history of cricket"] * 100)
+    errors = []
+
+    def update():
+        try:
+            for i in range(200):
+                index.upsert([f"b_chunk_{j}" for j in range(20)], [f"cricket bread {i}"] * 20)
+                index.delete([f"b_chunk_{j}" for j in range(0, 20, 2)])
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=update)
+    thread.start()
+    while thread.is_alive():
+        for hits in index.search_many(["cricket", "bread"], top_k=200):
+            # every hit is a chunk of the index, at one point or another
+            assert {chunk_id.split("_chunk_")[0] for chunk_id, _ in hits} <= {"a", "b"}
+    thread.join()
+
+    assert not errors
+    assert len(index.search("bread", top_k=200)) == 10
@@ -1,3 +1,6 @@
+import os
+import time
+
 from rag import Loader
 
 
@@ -26,4 +29,118 @@ def test_loader_load_files_with_exclude_file_names():
     loader = Loader(data_dir="data", exclude_file_names=["history_of_cricker.md"])
     data = loader.load_files()
 
-    assert "history_of_cricker.md" not in data.keys(), "history_of_cricker.md should not be in data"
\ No newline at end of file
+    assert "history_of_cricker.md" not in data.keys(), "history_of_cricker.md should not be in data"
+
+def test_loader_iter_documents_recursive_with_patterns(tmp_path):
+
+    (tmp_path / "notes").mkdir()
+    (tmp_path / "a.md").write_text("top level")
+    (tmp_path / "notes" / "b.md").write_text("nested")
+    (tmp_path / "notes" / "c.txt").write_text("not matching")
+
+    loader = Loader(data_dir=str(tmp_path), recursive=True, include_patterns=["*.md"])
+    documents = loader.iter_documents()
+
+    assert not isinstance(documents, dict), "Documents should be yielded lazily"
+    assert list(documents) == [("a.md", "top level"), ("notes/b.md", "nested")]
+
+
+def test_loader_iter_documents_text_blocks(tmp_path):
+
+    lines = [f"line {i}\n" for i in range(1000)]
+    (tmp_path / "big.txt").write_text("".join(lines))
+
+    loader = Loader(data_dir=str(tmp_path), block_size=100)
+    pieces = list(loader.iter_documents(pieces=True))
+
+    assert len(pieces) > 1, "The file should be split into blocks"
+    assert all(content.endswith("\n") for _, content in pieces), "Blocks should be split at line ends"
+    assert "".join(content for _, content in pieces) == "".join(lines)
+
+
+def test_loader_parallel_matches_serial(tmp_path):
+
+    for i in range(8):
+        (tmp_path / f"file_{i}.txt").write_text(f"content of file {i}")
+    (tmp_path / "broken.pdf").write_text("not a pdf")
+
+    serial = list(Loader(data_dir=str(tmp_path)).iter_documents())
+    ordered = list(Loader(data_dir=str(tmp_path), num_workers=2).iter_documents())
+    unordered = list(Loader(data_dir=str(tmp_path), num_workers=2).iter_documents(ordered=False))
+
+    assert len(serial) == 8, "The broken file should be skipped"
+    assert ordered == serial, "Ordered parallel loading should match serial loading"
+    assert sorted(unordered) == sorted(serial)
+
+
+def test_loader_parallel_splits_large_pdfs(tmp_path):
+
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(7):
+        writer.add_blank_page(width=100, height=100)
+    with open(tmp_path / "big.pdf", "wb") as f:
+        writer.write(f)
+
+    loader = Loader(data_dir=str(tmp_path), num_workers=2, pdf_pages_per_task=3)
+
+    assert len(list(loader.iter_documents(pieces=True))) == 7, "Every page should be yielded once"
+    assert len(list(loader.iter_documents())) == 1, "Page ranges should be joined into one document"
+
+
+def test_loader_pieces_of_empty_file(tmp_path):
+
+    (tmp_path / "empty.md").write_text("")
+    (tmp_path / "full.md").write_text("some text")
+
+    serial = list(Loader(data_dir=str(tmp_path), block_size=4).iter_documents(pieces=True))
+    parallel = list(Loader(data_dir=str(tmp_path), block_size=4, num_workers=2).iter_documents(pieces=True))
+
+    assert serial[0] == ("empty.md", ""), "An empty file should be yielded as a single empty piece"
+    assert parallel == serial
+
+
+def test_loader_pieces_of_file_failing_midway(tmp_path):
+
+    lines = b"".join(b"line %d\n" % i for i in range(5000))
+    (tmp_path / "broken.txt").write_bytes(lines + b"\xff\xfe" + lines)
+    (tmp_path / "full.txt").write_text("some text")
+
+    serial = list(Loader(data_dir=str(tmp_path), block_size=4096).iter_documents(pieces=True))
+    broken = [content for file, content in serial if file == "broken.txt"]
+    assert len(broken) > 1 and broken[-1] is None, "A file cut short should end with a None piece"
+    assert all(broken[:-1]) and serial[-1] == ("full.txt", "some text")
+
+    parallel = list(Loader(data_dir=str(tmp_path), block_size=4096, num_workers=2).iter_documents(pieces=True))
+    assert parallel == [("full.txt", "some text")], "A file cut short should be skipped by the workers"
+
+
+class SlowFirstFileLoader(Loader):
+    """Records the files parsed by the workers, and parses the first file slowly."""
+
+    def __init__(self, marker_dir: str, **kwargs):
+        super().__init__(**kwargs)
+        self.marker_dir = marker_dir
+
+    def _read_task(self, file, path, pieces, page_range):
+        open(os.path.join(self.marker_dir, file), "w").close()
+        if file == "file_00.txt":
+            time.sleep(1)
+        return super()._read_task(file, path, pieces, page_range)
+
+
+def test_loader_parallel_bounds_parsed_files(tmp_path):
+
+    data_dir, marker_dir = tmp_path / "data", tmp_path / "markers"
+    data_dir.mkdir()
+    marker_dir.mkdir()
+    for i in range(20):
+        (data_dir / f"file_{i:02d}.txt").write_text(f"content of file {i}")
+
+    loader = SlowFirstFileLoader(str(marker_dir), data_dir=str(data_dir), num_workers=2)
+    documents = loader.iter_documents()
+    assert next(documents)[0] == "file_00.txt"
+    assert len(os.listdir(marker_dir)) <= 4, \
+        "Files parsed while waiting for the first one should count towards the bound"
+    assert len(list(documents)) == 19
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from rag.local_store import LocalVectorStore, where_to_sql
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalVectorStore(path=str(tmp_path), collection_name="test", block_rows=4)
+    embeddings = np.eye(6, dtype=np.float32)
+    store.upsert(
+        [f"{name}_chunk_{i}" for i, name in enumerate("aabbcc")],
+        [f"document {i}" for i in range(6)],
+        embeddings,
+        [{"file_name": name, "start": i} for i, name in enumerate("aabbcc")]
+    )
+    return store
+
+
+def test_local_store_query(store):
+
+    results = store.query(np.eye(6, dtype=np.float32)[[1, 4]], top_k=2)
+
+    assert [ids[0] for ids in results["ids"]] == ["a_chunk_1", "c_chunk_4"], "The identical chunk should rank first"
+    assert results["scores"][0][0] == pytest.approx(1.0)
+    assert results["documents"][0][0] == "document 1"
+    assert store.query(np.eye(6, dtype=np.float32)[[1]], top_k=2, where={"file_name": "b"})["ids"] == [["b_chunk_2", "b_chunk_3"]]
+
+
+def test_local_store_get_and_delete(store):
+
+    assert store.get(where={"file_name": "b"}, include=[])["ids"] == ["b_chunk_2", "b_chunk_3"]
+    assert store.get(ids=["c_chunk_5", "a_chunk_0"])["documents"] == ["document 5", "document 0"]
+
+    store.delete(["a_chunk_0", "a_chunk_1"])
+    assert store.count() == 4
+    assert "a_chunk_1" not in store.query(np.eye(6, dtype=np.float32)[[1]], top_k=6)["ids"][0]
+
+    # the freed rows are reused
+    store.upsert(["d_chunk_0"], ["document 6"], np.ones((1, 6)), [{"file_name": "d"}])
+    assert len(store._alive) == 6
+
+
+def test_local_store_persistence(store, tmp_path):
+
+    store.bump_version()
+    reopened = LocalVectorStore(path=str(tmp_path), collection_name="test")
+
+    assert reopened.count() == 6
+    np.testing.assert_allclose(reopened.get(ids=["b_chunk_3"], include=["embeddings"])["embeddings"], np.eye(6)[[3]])
+
+
+def test_where_to_sql():
+
+    sql, params = where_to_sql({"$and": [{"file_name": "a"}, {"start": {"$gte": 2}}]})
+    assert "json_extract(metadata, '$.file_name') = ?" in sql and params == ["a", 2]
+    with pytest.raises(ValueError):
+        where_to_sql({"file_name; DROP TABLE chunks": "a"})
@@ -0,0 +1,47 @@
+import os
+from rag import Loader
+from rag.manifest import Manifest
+
+
+def test_manifest_diff(tmp_path):
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.txt").write_text("first file")
+    (data_dir / "b.txt").write_text("second file")
+    loader = Loader(data_dir=str(data_dir))
+    manifest_path = str(tmp_path / "manifest.json")
+
+    manifest = Manifest(path=manifest_path)
+    changes = manifest.diff(loader.scan())
+    assert sorted(changes.added) == ["a.txt", "b.txt"]
+    for file_name in changes.changed:
+        manifest.commit(file_name, chunk_count=1)
+    manifest.save()
+
+    (data_dir / "a.txt").write_text("first file, edited")
+    os.utime(data_dir / "b.txt", (0, 0))
+    (data_dir / "c.txt").write_text("third file")
+    changes = Manifest(path=manifest_path).diff(loader.scan())
+
+    assert changes.added == ["c.txt"]
+    assert changes.modified == ["a.txt"]
+    assert changes.unchanged == ["b.txt"], "A touched file with the same content should be unchanged"
+    assert changes.deleted == []
+
+
+def test_manifest_detects_deleted_files(tmp_path):
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.txt").write_text("first file")
+    loader = Loader(data_dir=str(data_dir))
+
+    manifest = Manifest(path=str(tmp_path / "manifest.json"))
+    manifest.diff(loader.scan())
+    manifest.commit("a.txt", chunk_count=3)
+    (data_dir / "a.txt").unlink()
+
+    changes = manifest.diff(loader.scan())
+    assert changes.deleted == ["a.txt"]
+    assert manifest.records["a.txt"].chunk_count == 3
@@ -0,0 +1,61 @@
+import json
+from types import SimpleNamespace
+from rag.metrics import Metrics, metrics
+from rag.keyword_index import KeywordIndex
+from rag.querying import Retriever
+
+
+def test_metrics_aggregates_and_exports():
+
+    collector = Metrics()
+    events = []
+    collector.add_hook(events.append)
+
+    with collector.span("retriever.fetch", method="hybrid"):
+        pass
+    collector.increment("embedder.texts", 3)
+    collector.increment("embedder.texts", 2)
+
+    snapshot = json.loads(collector.to_json())
+    assert snapshot["spans"]["retriever.fetch"]["count"] == 1
+    assert snapshot["counters"]["embedder.texts"] == 5
+    assert events[0]["type"] == "span" and events[0]["labels"] == {"method": "hybrid"}
+
+    exported = collector.to_prometheus()
+    assert 'rag_stage_seconds_count{stage="retriever.fetch"} 1' in exported
+    assert "rag_embedder_texts_total 5" in exported
+
+
+def test_metrics_hook_errors_do_not_propagate():
+
+    collector = Metrics()
+    collector.add_hook(lambda event: 1 / 0)
+    collector.increment("loader.files")
+
+    assert collector.snapshot()["counters"]["loader.files"] == 1
+
+
+def test_metrics_profiles_requests(tmp_path):
+
+    collector = Metrics(profile_dir=str(tmp_path))
+    with collector.request("retriever.retrieve_many"):
+        # nested requests are not profiled on their own
+        with collector.request("loader.load_files"):
+            sum(range(1000))
+
+    assert [path.name.split("-")[0] for path in tmp_path.iterdir()] == ["retriever.retrieve_many"]
+    assert collector.snapshot()["spans"]["loader.load_files"]["count"] == 1
+
+
+def test_retrieve_records_stages(tmp_path, fake_store):
+
+    store = fake_store({"a_chunk_0": "the history of cricket"})
+    retriever = Retriever(method="keyword_based", top_k=1, llm_client=SimpleNamespace(), db_client=store,
+                          keyword_index=KeywordIndex(index_dir=str(tmp_path)))
+    metrics.reset()
+    retriever.retrieve("cricket")
+
+    snapshot = metrics.snapshot()
+    for stage in ["retriever.retrieve_many", "retriever.keyword_search", "keyword_index.score", "retriever.fetch"]:
+        assert snapshot["spans"][stage]["count"] == 1, f"{stage} should be timed"
+    assert snapshot["counters"]["retriever.chunks_fetched"] == 1
@@ -0,0 +1,149 @@
+import os
+import sys
+import asyncio
+import subprocess
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from rag.keyword_index import KeywordIndex
+from rag.local_store import LocalVectorStore
+from rag.querying import Retriever
+from rag.vector_index import VectorIndex, IVFIndex
+
+
+def make_retriever(tmp_path, fake_store):
+    store = fake_store({
+        "a_chunk_0": "the history of cricket",
+        "b_chunk_0": "a recipe for bread",
+    })
+    retriever = Retriever(
+        method="keyword_based",
+        top_k=1,
+        llm_client=SimpleNamespace(),
+        db_client=store,
+        keyword_index=KeywordIndex(index_dir=str(tmp_path)),
+    )
+    return retriever, store
+
+
+def test_retrieve_many(tmp_path, fake_store):
+
+    retriever, store = make_retriever(tmp_path, fake_store)
+    # the keyword index is built from the store on first use
+    assert len(retriever.keyword_index) == 2
+    store.get_calls = 0
+    results = retriever.retrieve_many(["bread", "cricket history", "BREAD"])
+
+    assert [[doc["document"] for doc in docs] for docs in results] == [
+        ["a recipe for bread"], ["the history of cricket"], ["a recipe for bread"]
+    ]
+    assert store.get_calls == 1, "The documents of all queries should be fetched in a single call"
+    assert retriever.retrieve("cricket history") == results[1]
+
+
+def test_aretrieve(tmp_path, fake_store):
+
+    retriever, _ = make_retriever(tmp_path, fake_store)
+
+    async def retrieve_concurrently():
+        return await asyncio.gather(retriever.aretrieve("bread"), retriever.aretrieve("cricket"))
+
+    results = asyncio.run(retrieve_concurrently())
+    assert [docs[0]["document"] for docs in results] == ["a recipe for bread", "the history of cricket"]
+
+
+def test_aretrieve_is_profiled(tmp_path, fake_store):
+    from rag.metrics import metrics
+
+    retriever, _ = make_retriever(tmp_path / "bm25", fake_store)
+    metrics.configure(profile_dir=str(tmp_path / "profiles"))
+    try:
+        asyncio.run(retriever.aretrieve("bread"))
+    finally:
+        metrics.configure(profile_dir=None)
+
+    assert [path.name.split("-")[0] for path in (tmp_path / "profiles").iterdir()] == ["retriever.aretrieve_many"]
+
+
+def test_retrieve_with_metadata_filter(tmp_path, fake_llm_client):
+
+    store = LocalVectorStore(path=str(tmp_path / "store"), collection_name="test")
+    store.upsert(
+        ["a.md_chunk_0", "b.txt_chunk_0", "c.md_chunk_0"],
+        ["a recipe for bread", "the history of bread", "the history of cricket"],
+        np.eye(3, dtype=np.float32),
+        [{"file_name": name, "file_type": name.split(".")[-1]} for name in ("a.md", "b.txt", "c.md")]
+    )
+    # every query is embedded close to the first chunk
+    llm_client = fake_llm_client(embed=lambda text: [1.0, 0.5, 0.1])
+
+    keyword = Retriever(method="keyword_based", top_k=3, llm_client=llm_client, db_client=store,
+                        keyword_index=KeywordIndex(index_dir=str(tmp_path / "bm25")))
+    assert {doc["document"] for doc in keyword.retrieve("bread")} == {"a recipe for bread", "the history of bread"}
+    assert [doc["document"] for doc in keyword.retrieve("bread", where={"file_type": "txt"})] == ["the history of bread"]
+
+    semantic = Retriever(method="semantic_search", top_k=3, llm_client=llm_client, db_client=store)
+    assert semantic.retrieve("bread")[0]["metadata"]["file_name"] == "a.md"
+    filtered = semantic.retrieve("bread", where={"file_name": {"$in": ["b.txt", "c.md"]}})
+    assert [doc["metadata"]["file_name"] for doc in filtered] == ["b.txt", "c.md"], "Only the matching chunks should be scored"
+
+
+def test_import_does_not_open_clients():
+
+    code = (
+        "import sys; from rag import Retriever; Retriever(method='keyword_based'); "
+        "print(','.join(m for m in ('chromadb', 'openai', 'pandas', 'pypdf') if m in sys.modules))"
+    )
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "", "Heavy dependencies should only be imported when they are used"
+
+
+def test_queries_are_searched_as_written(tmp_path, fake_llm_client):
+
+    from rag.reranking import Reranker
+
+    class RecordingReranker(Reranker):
+        def __init__(self):
+            super().__init__(batch_size=8)
+            self.queries = set()
+
+        def score(self, pairs):
+            self.queries.update(query for query, _ in pairs)
+            return [float(len(document)) for _, document in pairs]
+
+    store = LocalVectorStore(path=str(tmp_path / "store"), collection_name="test")
+    store.upsert(["a.md_chunk_0", "b.md_chunk_0"], ["Retrieval-augmented generation", "a recipe for bread"],
+                 np.eye(2, dtype=np.float32), [{"file_name": "a.md"}, {"file_name": "b.md"}])
+    requests = []
+    reranker = RecordingReranker()
+    retriever = Retriever(method="semantic_search", top_k=1, db_client=store, reranker=reranker, rerank_candidates=2,
+                          llm_client=fake_llm_client(requests, embed=lambda text: [1.0, 0.0]))
+    results = retriever.retrieve_many(["What is RAG?", "what is  rag?"])
+
+    assert requests == [["What is RAG?"]], "The query should be embedded as written, once per cache key"
+    assert reranker.queries == {"What is RAG?"}, "The query should be re-ranked as written"
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize("index_class", [VectorIndex, IVFIndex])
+def test_vector_index_follows_the_store(tmp_path, index_class, fake_llm_client):
+
+    store = LocalVectorStore(path=str(tmp_path / "store"), collection_name="test")
+    store.upsert(["a.md_chunk_0", "b.md_chunk_0"], ["a recipe for bread", "the history of bread"],
+                 np.eye(3, dtype=np.float32)[:2], [{"file_name": "a.md"}, {"file_name": "b.md"}])
+    store.bump_version()
+    retriever = Retriever(method="semantic_search", top_k=2, db_client=store,
+                          llm_client=fake_llm_client(embed=lambda text: [0.1, 0.5, 1.0]),
+                          vector_index=index_class.from_collection(store))
+    assert [doc["id"] for doc in retriever.retrieve("bread")] == ["b.md_chunk_0", "a.md_chunk_0"]
+
+    store.upsert(["c.md_chunk_0"], ["the history of cricket"], np.eye(3, dtype=np.float32)[2:], [{"file_name": "c.md"}])
+    store.bump_version()
+    assert [doc["id"] for doc in retriever.retrieve("bread")] == ["c.md_chunk_0", "b.md_chunk_0"], \
+        "The chunks added to the store should be searched"
+
+    store.delete(["c.md_chunk_0"])
+    store.bump_version()
+    assert [doc["id"] for doc in retriever.retrieve("bread")] == ["b.md_chunk_0", "a.md_chunk_0"], \
+        "The chunks deleted from the store should not take the place of others"
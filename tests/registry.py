@@ -0,0 +1,47 @@
+from rag.llm_config import LLMConfig
+from rag.registry import ClientRegistry
+
+
+def test_llm_clients_are_shared_per_endpoint():
+
+    registry = ClientRegistry()
+    client = registry.llm_client("http://localhost:1/v1", "key")
+
+    assert registry.llm_client("http://localhost:1/v1", "key") is client, "The same endpoint should share a client"
+    assert registry.llm_client("http://localhost:2/v1", "key") is not client
+
+
+def test_llm_config_uses_shared_client():
+
+    assert LLMConfig(client_name="ollama").client is LLMConfig(client_name="ollama").client
+
+
+def test_configure_replaces_clients():
+
+    registry = ClientRegistry()
+    client = registry.llm_client("http://localhost:1/v1", "key")
+    registry.configure(max_connections=7, timeout=3.0)
+
+    new_client = registry.llm_client("http://localhost:1/v1", "key")
+    assert new_client is not client, "Clients should be re-created with the new settings"
+    assert new_client.timeout.read == 3.0
+    assert registry.http.max_connections == 7
+
+
+def test_forked_process_gets_new_clients():
+
+    registry = ClientRegistry()
+    client = registry.llm_client("http://localhost:1/v1", "key")
+    # pretend the registry was inherited from a parent process
+    registry._pid = -1
+
+    assert registry.llm_client("http://localhost:1/v1", "key") is not client
+
+
+def test_chroma_collections_are_shared_per_path(tmp_path):
+
+    registry = ClientRegistry()
+    collection = registry.chroma_collection(str(tmp_path / "db"), "test")
+
+    assert registry.chroma_collection(str(tmp_path / "db"), "test") is collection
+    assert registry.chroma_client(str(tmp_path / "db")) is registry.chroma_client(str(tmp_path / "." / "db"))
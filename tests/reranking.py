@@ -0,0 +1,81 @@
+import pytest
+from types import SimpleNamespace
+from rag.keyword_index import KeywordIndex
+from rag.querying import Retriever
+from rag.reranking import CrossEncoderReranker, LLMReranker, Reranker, get_reranker
+
+DOCUMENTS = {
+    "a_chunk_0": "cricket cricket cricket scores",
+    "b_chunk_0": "the history of cricket",
+    "c_chunk_0": "cricket bats are made of willow",
+}
+
+
+class LengthReranker(Reranker):
+    """Prefers longer documents, recording the pairs it scored"""
+
+    def __init__(self, batch_size=2):
+        super().__init__(batch_size)
+        self.calls = []
+
+    def score(self, pairs):
+        self.calls.append(pairs)
+        return [float(len(document)) for _, document in pairs]
+
+
+def make_retriever(tmp_path, fake_store, reranker, **kwargs):
+    return Retriever(
+        method="keyword_based", top_k=2, llm_client=SimpleNamespace(), db_client=fake_store(DOCUMENTS),
+        keyword_index=KeywordIndex(index_dir=str(tmp_path)), reranker=reranker, rerank_candidates=3, **kwargs
+    )
+
+
+def test_retriever_reranks_candidates(tmp_path, fake_store):
+
+    reranker = LengthReranker()
+    retriever = make_retriever(tmp_path, fake_store, reranker)
+    docs = retriever.retrieve("cricket")
+
+    assert [doc["id"] for doc in docs] == ["c_chunk_0", "a_chunk_0"], "The best re-scored candidates should be kept"
+    assert [doc["rank"] for doc in docs] == [1, 2]
+    assert docs[0]["rerank_score"] == len(DOCUMENTS["c_chunk_0"])
+    assert [len(pairs) for pairs in reranker.calls] == [2, 1], "Candidates should be scored in batches"
+
+    retriever._result_cache.clear()
+    retriever.retrieve("cricket")
+    assert len(reranker.calls) == 2, "Scores should be cached per (query, chunk)"
+
+
+def test_retriever_rerank_budget(tmp_path, fake_store):
+
+    reranker = LengthReranker()
+    retriever = make_retriever(tmp_path, fake_store, reranker, rerank_budget=0)
+    docs = retriever.retrieve("cricket")
+
+    assert reranker.calls == [], "No batch should start once the budget is spent"
+    assert [doc["rerank_score"] for doc in docs] == [None, None]
+    assert docs[0]["id"] == "a_chunk_0", "Unscored candidates should keep their retrieval order"
+
+
+def test_llm_reranker_parses_ratings():
+
+    answers = iter(["Ratings: [2, 9.5]", "not a list"])
+    completions = SimpleNamespace(create=lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=next(answers)))]
+    ))
+    llm_client = SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=completions)), config={"model": "test"})
+    reranker = LLMReranker(llm_client=llm_client)
+
+    assert reranker.score([("q", "a"), ("q", "b")]) == [2.0, 9.5]
+    assert reranker.score([("q", "a"), ("q", "b")]) == [None, None], "An unusable answer should leave the pairs unscored"
+
+
+def test_cross_encoder_reranker_with_encoder():
+
+    encoder = SimpleNamespace(predict=lambda pairs, batch_size: [len(document) for _, document in pairs])
+    reranker = get_reranker("cross_encoder", encoder=encoder)
+
+    assert isinstance(reranker, CrossEncoderReranker)
+    assert reranker.score([("q", "ab"), ("q", "abc")]) == [2.0, 3.0]
+    with pytest.raises(ValueError):
+        get_reranker("unknown")
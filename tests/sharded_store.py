@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from rag import Vectorizer
+from rag.keyword_index import KeywordIndex
+from rag.embedding_cache import EmbeddingCache
+from rag.local_store import LocalVectorStore
+from rag.sharded_store import ShardedVectorStore, shard_name, shard_values
+
+EMBEDDINGS = np.random.default_rng(0).normal(size=(8, 8)).astype(np.float32)
+
+
+def fill(store):
+    store.upsert(
+        [f"{name}_chunk_{i}" for i, name in enumerate("aabbccdd")],
+        [f"document {i}" for i in range(8)],
+        EMBEDDINGS,
+        [{"file_name": name, "tenant": "acme" if i < 4 else "globex", "start": i} for i, name in enumerate("aabbccdd")]
+    )
+    store.bump_version()
+
+
+@pytest.mark.parametrize("shard_by", ["hash", "tenant"])
+def test_sharded_store_matches_single_store(tmp_path, shard_by):
+
+    single = LocalVectorStore(path=str(tmp_path / "single"), collection_name="test")
+    sharded = ShardedVectorStore(backend="local", path=str(tmp_path / "sharded"), collection_name="test", shard_by=shard_by, n_shards=3)
+    fill(single)
+    fill(sharded)
+
+    queries = EMBEDDINGS[[1, 6]]
+    expected, results = single.query(queries, top_k=3), sharded.query(queries, top_k=3)
+    assert results["ids"] == expected["ids"], "The merged shard rankings should match the single collection"
+    assert np.allclose(results["scores"], expected["scores"])
+    assert results["documents"] == expected["documents"]
+
+    assert sharded.count() == 8
+    assert sharded.get(ids=["d_chunk_7", "a_chunk_0"])["documents"] == ["document 7", "document 0"]
+    assert sorted(sharded.get(where={"file_name": "b"}, include=[])["ids"]) == ["b_chunk_2", "b_chunk_3"]
+    np.testing.assert_allclose(
+        sharded.get(ids=["c_chunk_5"], include=["embeddings"])["embeddings"],
+        single.get(ids=["c_chunk_5"], include=["embeddings"])["embeddings"]
+    )
+
+    sharded.delete(["a_chunk_0", "d_chunk_7"])
+    sharded.bump_version()
+    assert sharded.count() == 6
+    assert "a_chunk_0" not in sharded.query(EMBEDDINGS[[0]], top_k=8)["ids"][0]
+
+
+def test_sharded_store_routes_filters(tmp_path):
+
+    store = ShardedVectorStore(backend="local", path=str(tmp_path), collection_name="test", shard_by="tenant")
+    fill(store)
+
+    # a new process finds the shards of the collection
+    reopened = ShardedVectorStore(backend="local", path=str(tmp_path), collection_name="test", shard_by="tenant")
+    assert reopened.shard_keys() == ["acme", "globex"]
+    assert reopened.shard("acme").count() == 4
+
+    results = reopened.query(EMBEDDINGS[[6]], top_k=2, where={"tenant": "acme"})
+    assert all(chunk_id[0] in "ab" for chunk_id in results["ids"][0]), "Only the shard of the tenant should be searched"
+    assert reopened._route({"$and": [{"tenant": {"$in": ["acme", "other"]}}, {"start": {"$gte": 1}}]}) == ["acme"]
+    assert shard_values({"$or": [{"tenant": "acme"}, {"file_name": "a"}]}, "tenant") is None
+
+
+def test_shard_names_are_valid_and_distinct():
+    import re
+
+    keys = ["acme", "0", "a b", "a_b", "a/b", "", "-", "x" * 100, "x" * 101, "tenant.com", "école"]
+    names = [shard_name("test", key) for key in keys]
+    assert names[:2] == ["test_acme", "test_0"], "Valid keys should keep their name"
+    assert len(set(names)) == len(keys), "Keys sanitized alike should get their own shard"
+    assert all(re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9._-]{1,61}[A-Za-z0-9]", name) for name in names), names
+
+    for collection_name in ["bad name", "_test", "x" * 60]:
+        with pytest.raises(ValueError, match="Invalid collection name"):
+            ShardedVectorStore(backend="local", path="unused", collection_name=collection_name, shard_by="tenant")
+
+
+def test_vectorizer_tenants_share_a_store(tmp_path, fake_llm_client):
+
+    store = ShardedVectorStore(backend="local", path=str(tmp_path / "store"), collection_name="test", shard_by="tenant")
+    keyword_index = KeywordIndex(str(tmp_path / "bm25"))
+    vectorizers = {}
+    for tenant, content in [("acme", "alpha beta gamma"), ("globex", "delta epsilon")]:
+        vectorizer = Vectorizer(
+            {"notes.md": content}, chunk_size=2, chunk_overlap=0, db_client=store, tenant=tenant,
+            keyword_index=keyword_index, embedding_cache=EmbeddingCache(":memory:"),
+            llm_client=fake_llm_client()
+        )
+        vectorizer.vectorize_docs()
+        vectorizers[tenant] = vectorizer
+
+    assert sorted(store.shard("acme").get(include=[])["ids"]) == ["acme/notes.md_chunk_0", "acme/notes.md_chunk_1"]
+    assert vectorizers["globex"].get_file_chunks("notes.md") == ["delta epsilon"]
+
+    vectorizers["acme"].delete_docs(["notes.md"])
+    assert store.get(include=[])["ids"] == ["globex/notes.md_chunk_0"], "Deleting a file should only affect its tenant"
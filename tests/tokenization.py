@@ -0,0 +1,44 @@
+import numpy as np
+from rag.tokenization import Tokenizer
+
+
+def test_tokenizer_removes_stopwords_and_stems():
+
+    tokenizer = Tokenizer()
+
+    assert tokenizer.tokenize("The Running of the Bulls") == ["run", "bull"]
+    assert tokenizer.tokenize_many(["cricket matches", "", "the and of"]) == [["cricket", "match"], [], []]
+
+
+def test_tokenizer_encode_matches_tokenize():
+
+    tokenizer = Tokenizer()
+    texts = ["the history of cricket", "Cricket bats", "a recipe for bread", "the"]
+    vocab = {}
+    ids = tokenizer.encode(texts, vocab)
+
+    inverse = {i: term for term, i in vocab.items()}
+    assert [[inverse[i] for i in text_ids] for text_ids in ids] == [tokenizer.tokenize(text) for text in texts]
+    assert all(text_ids.dtype == np.int32 for text_ids in ids)
+    assert list(vocab) == ["histori", "cricket", "bat", "recip", "bread"], "Terms should be added in order of appearance"
+
+    # unknown terms are dropped when the vocabulary is not extended
+    assert tokenizer.encode(["cricket umpires"], vocab, add=False)[0].tolist() == [vocab["cricket"]]
+
+    # the memoized IDs belong to the vocabulary they were added to
+    other = {}
+    assert tokenizer.encode(["bread"], other)[0].tolist() == [0]
+    assert other == {"bread": 0}
+
+
+def test_tokenizer_cache_limit():
+
+    tokenizer = Tokenizer(max_cached_words=3)
+    vocab = {}
+    first = tokenizer.encode(["alpha beta", "gamma delta"], vocab)
+
+    # the memo is cleared when it is full, the words keep their IDs
+    again = tokenizer.encode(["gamma delta", "alpha beta", "epsilon"], vocab)
+    assert [ids.tolist() for ids in again] == [first[1].tolist(), first[0].tolist(), [4]]
+    assert tokenizer.encode(["delta alpha"], vocab)[0].tolist() == [vocab["delta"], vocab["alpha"]]
+    assert len(vocab) == 5
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from rag.vector_index import VectorIndex, IVFIndex, QuantizedIndex, reciprocal_rank_fusion
+
+
+def _random_embeddings(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_vector_index_exact_search():
+
+    embeddings = _random_embeddings(100)
+    ids = [f"chunk_{i}" for i in range(100)]
+    index = VectorIndex(ids, embeddings)
+
+    result_ids, scores = index.search(embeddings[[3, 42]], top_k=5)
+
+    assert result_ids[0][0] == "chunk_3", "A stored embedding should be its own nearest neighbour"
+    assert result_ids[1][0] == "chunk_42"
+    assert np.all(np.diff(scores, axis=1) <= 0), "Scores should be sorted best first"
+    assert np.isclose(scores[0][0], 1.0, atol=1e-5), "Scores should be cosine similarities"
+
+
+def test_vector_index_save_load(tmp_path):
+
+    embeddings = _random_embeddings(20)
+    index = VectorIndex([f"chunk_{i}" for i in range(20)], embeddings)
+    index.save(str(tmp_path))
+
+    loaded = VectorIndex.load(str(tmp_path))
+    assert loaded.search(embeddings[7], top_k=1)[0][0] == ["chunk_7"]
+
+
+def test_ivf_index_matches_exact_with_all_lists_probed():
+
+    embeddings = _random_embeddings(500)
+    ids = [f"chunk_{i}" for i in range(500)]
+    queries = _random_embeddings(10, seed=1)
+
+    exact_ids, _ = VectorIndex(ids, embeddings).search(queries, top_k=5)
+    ivf = IVFIndex(ids, embeddings, n_lists=10, n_probe=10)
+    ivf_ids, _ = ivf.search(queries, top_k=5)
+
+    assert ivf_ids == exact_ids, "Probing every list should give the exact results"
+
+
+@pytest.mark.parametrize("quantization, kwargs", [("float16", {}), ("int8", {}), ("pq", {"n_subvectors": 8})])
+def test_quantized_index_reranks_to_exact(quantization, kwargs):
+
+    embeddings = _random_embeddings(500)
+    ids = [f"chunk_{i}" for i in range(500)]
+    queries = _random_embeddings(10, seed=1)
+
+    exact_ids, exact_scores = VectorIndex(ids, embeddings).search(queries, top_k=5)
+    index = QuantizedIndex(ids, embeddings, quantization=quantization, rerank_factor=100, **kwargs)
+    quantized_ids, quantized_scores = index.search(queries, top_k=5)
+
+    assert quantized_ids == exact_ids, "Re-ranking every candidate should give the exact results"
+    assert np.allclose(quantized_scores, exact_scores, atol=1e-5), "Re-ranked scores should be exact"
+    assert index.codes.nbytes < embeddings.nbytes
+
+
+def test_quantized_index_save_load(tmp_path):
+
+    embeddings = _random_embeddings(200)
+    index = QuantizedIndex([f"chunk_{i}" for i in range(200)], embeddings, quantization="int8")
+    index.save(str(tmp_path))
+
+    loaded = QuantizedIndex.load(str(tmp_path))
+    assert isinstance(loaded.embeddings, np.memmap), "Full-precision embeddings should stay on disk"
+    assert loaded.search(embeddings[7], top_k=1)[0][0] == ["chunk_7"]
+
+    loaded.rerank_factor = 0
+    assert loaded.search(embeddings[7], top_k=1)[0][0] == ["chunk_7"], "Codes alone should find a stored embedding"
+
+
+def test_reciprocal_rank_fusion():
+
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+
+    assert fused[0][0] == "b", "A chunk ranked high in both rankings should come first"
+    assert {chunk_id for chunk_id, _ in fused} == {"a", "b", "c", "d"}
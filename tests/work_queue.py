@@ -0,0 +1,41 @@
+from rag.work_queue import WorkQueue, UPSERT, DELETE
+
+
+def test_work_queue_deduplicates_and_persists(tmp_path):
+
+    path = str(tmp_path / "queue.db")
+    queue = WorkQueue(path)
+    queue.put(["a.md", "b.md"])
+    queue.put(["a.md"], DELETE)
+
+    assert queue.stats()["depth"] == 2, "A file should be queued once"
+    items = queue.claim(1)
+    assert [(file_name, action) for file_name, action, _ in items] == [("a.md", DELETE)]
+
+    # the process stops while a.md is processed
+    reopened = WorkQueue(path)
+    assert reopened.stats()["pending"] == 2, "Files being processed should be queued again on restart"
+
+
+def test_work_queue_requeue_while_processing(tmp_path):
+
+    queue = WorkQueue(str(tmp_path / "queue.db"))
+    queue.put(["a.md"])
+    items = queue.claim(10)
+    queue.put(["a.md"])
+    queue.done(items)
+
+    assert queue.stats()["pending"] == 1, "A file changed while it was processed should be processed again"
+    assert queue.stats()["lag_seconds"] >= 0
+
+
+def test_work_queue_failures(tmp_path):
+
+    queue = WorkQueue(str(tmp_path / "queue.db"), max_attempts=2)
+    queue.put(["a.md"], UPSERT)
+
+    queue.fail(queue.claim(10), "embedding error")
+    assert queue.stats()["pending"] == 1, "A failed file should be retried"
+    queue.fail(queue.claim(10), "embedding error")
+    assert queue.stats() | {"lag_seconds": 0} == {"pending": 0, "processing": 0, "failed": 1, "depth": 0, "lag_seconds": 0}
+    assert queue.failed() == {"a.md": "embedding error"}